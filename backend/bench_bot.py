@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the GrooveHire bot conversation engine
+"""
+
+import asyncio
+import logging
+import statistics
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from models import SessionState
+
+ITERATIONS = 2_000
+
+# Message sent in each state to move the conversation forward
+CONVERSATION = [
+    (SessionState.WELCOME, "Hi"),
+    (SessionState.SERVICE_SELECTION, "my kitchen tap is leaking"),
+    (SessionState.LOCATION_REQUEST, "Westlands"),
+    (SessionState.PROVIDER_SELECTION, "1"),
+    (SessionState.BOOKING_DETAILS, "Fix a leaking tap tomorrow morning"),
+    (SessionState.PAYMENT, "PAY"),
+]
+
+async def bench_state_latency() -> None:
+    """Per-state process_message latency"""
+    print(f"\n⏱️  process_message latency per state, {ITERATIONS:,} messages each")
+    bot = GrooveHireBot(Database())
+
+    for step, (state, message) in enumerate(CONVERSATION):
+        # Walk fresh users up to the state under test
+        phones = [f"+2547{step}{i:07d}" for i in range(ITERATIONS)]
+        for phone in phones:
+            for _, earlier in CONVERSATION[:step]:
+                await bot.process_message(phone, earlier, "Bench User")
+
+        timings = []
+        for phone in phones:
+            started = time.perf_counter()
+            await bot.process_message(phone, message, "Bench User")
+            timings.append((time.perf_counter() - started) * 1_000_000)
+
+        timings.sort()
+        print(
+            f"   {state.name:<20} p50 {statistics.median(timings):6.1f} µs"
+            f"   p99 {timings[int(len(timings) * 0.99)]:6.1f} µs"
+        )
+
+async def main():
+    print("📊 Benchmarking GrooveHire bot...")
+    logging.disable(logging.WARNING)
+    await bench_state_latency()
+    logging.disable(logging.NOTSET)
+    print("\n✅ Bot benchmarks completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the GrooveHire Database
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from services import ServiceMatcher
+from sqlite_database import SQLiteDatabase
+from models import SessionRecord, SessionState
+
+SESSION_COUNTS = [1_000, 10_000, 100_000, 1_000_000]
+LOOKUPS = 10_000
+MEMORY_SESSIONS = 1_000_000
+BACKEND_USERS = 500
+PROVIDER_COUNTS = [1_000, 10_000, 50_000]
+MATCH_QUERIES = 2_000
+
+CONVERSATION = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]
+
+async def populate(db: Database, count: int) -> None:
+    """Fill the store with sessions that each hold a pending payment"""
+    for i in range(count):
+        await db.create_user_session({
+            "phone_number": f"+2547{i:08d}",
+            "state": "completed",
+            "payment_reference": f"ws_CO_{i}"
+        })
+
+async def bench_payment_lookup() -> None:
+    """Callback lookup time should stay flat as the session count grows"""
+    print("\n💳 find_user_by_payment_reference")
+    timings = {}
+
+    for count in SESSION_COUNTS:
+        db = Database(max_sessions=count)
+        await populate(db, count)
+        refs = [f"ws_CO_{random.randrange(count)}" for _ in range(LOOKUPS)]
+
+        started = time.perf_counter()
+        for ref in refs:
+            session = await db.find_user_by_payment_reference(ref)
+            assert session is not None
+        elapsed = time.perf_counter() - started
+
+        timings[count] = elapsed / LOOKUPS * 1_000_000
+        print(f"   {count:>9,} sessions: {timings[count]:.2f} µs/lookup")
+
+    growth = timings[SESSION_COUNTS[-1]] / timings[SESSION_COUNTS[0]]
+    print(f"   growth from {SESSION_COUNTS[0]:,} to {SESSION_COUNTS[-1]:,} sessions: {growth:.2f}x")
+
+async def bench_session_churn() -> None:
+    """Memory should stay flat under a steady stream of new users"""
+    print("\n🧹 Session store under churn")
+    cap = 10_000
+    new_users = 200_000
+    db = Database(max_sessions=cap, session_ttl=3600)
+    stale = (datetime.now() - timedelta(hours=2)).isoformat()
+
+    tracemalloc.start()
+    for i in range(new_users):
+        # Every other user went idle long ago and should expire rather than be evicted
+        last_interaction = stale if i % 2 else datetime.now().isoformat()
+        await db.create_user_session({
+            "phone_number": f"+2547{i:08d}",
+            "state": "welcome",
+            "last_interaction": last_interaction
+        })
+        if i + 1 in (cap, new_users // 2, new_users):
+            current, _ = tracemalloc.get_traced_memory()
+            stats = db.session_stats()
+            print(f"   {i + 1:>7,} users: {current / 1024 / 1024:.1f} MiB, {stats}")
+    tracemalloc.stop()
+
+    assert len(db.user_sessions) <= cap
+
+def dict_session(i: int) -> dict:
+    """Session in the original free-form dict layout"""
+    now = datetime.now()
+    return {
+        "phone_number": f"+2547{i:08d}",
+        "profile_name": None,
+        "state": "location_request",
+        "created_at": now.isoformat(),
+        "last_interaction": now.isoformat(),
+        "selected_service": "Plumbing",
+    }
+
+def record_session(i: int) -> SessionRecord:
+    """Session in the compact record layout"""
+    return SessionRecord(
+        f"+2547{i:08d}",
+        state=SessionState.LOCATION_REQUEST,
+        selected_service="Plumbing"
+    )
+
+def bench_session_memory() -> None:
+    """Bytes per session for the dict and record layouts"""
+    print(f"\n📦 Session memory at {MEMORY_SESSIONS:,} sessions")
+    results = {}
+
+    for name, build in (("dict", dict_session), ("record", record_session)):
+        tracemalloc.start()
+        sessions = [build(i) for i in range(MEMORY_SESSIONS)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del sessions
+
+        results[name] = current / MEMORY_SESSIONS
+        print(f"   {name:>6}: {results[name]:.0f} bytes/session")
+
+    print(f"   saving: {1 - results['record'] / results['dict']:.0%}")
+
+async def run_conversations(db: Database, users: int) -> float:
+    """Drive concurrent conversations through the bot and return messages per second"""
+    bot = GrooveHireBot(db)
+
+    async def converse(i: int) -> None:
+        for message in CONVERSATION:
+            await bot.process_message(f"+2547{i:08d}", message, "Bench User")
+
+    started = time.perf_counter()
+    await asyncio.gather(*[converse(i) for i in range(users)])
+    elapsed = time.perf_counter() - started
+    return users * len(CONVERSATION) / elapsed
+
+async def bench_backends() -> None:
+    """Messages per second for the in-memory and SQLite stores"""
+    print(f"\n🗄️  Storage backends, {BACKEND_USERS} concurrent conversations")
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends = {
+            "memory": Database(),
+            "sqlite": SQLiteDatabase(path=os.path.join(directory, "bench.db")),
+        }
+        for name, db in backends.items():
+            rate = await run_conversations(db, BACKEND_USERS)
+            await db.close()
+            print(f"   {name:>6}: {rate:,.0f} messages/s")
+
+    logging.disable(logging.NOTSET)
+
+async def bench_nearest_providers() -> None:
+    """find_providers latency with tens of thousands of providers in one service"""
+    print("\n📍 ServiceMatcher.find_providers from a location pin")
+
+    for count in PROVIDER_COUNTS:
+        db = Database()
+        db.providers["plumbing"] = [
+            {
+                "id": f"bench{i}",
+                "name": f"Provider {i}",
+                "rating": round(random.uniform(3.5, 5.0), 1),
+                "reviews": random.randrange(500),
+                "rate": 1000,
+                "lat": random.uniform(-1.45, -1.10),
+                "lon": random.uniform(36.60, 37.10),
+                "areas": []
+            }
+            for i in range(count)
+        ]
+        db._build_provider_indexes()
+        matcher = ServiceMatcher(db)
+        pins = [(random.uniform(-1.45, -1.10), random.uniform(36.60, 37.10)) for _ in range(MATCH_QUERIES)]
+
+        started = time.perf_counter()
+        for lat, lon in pins:
+            providers = await matcher.find_providers("Plumbing", "pin", lat, lon)
+            assert len(providers) == 3
+        elapsed = time.perf_counter() - started
+        print(f"   {count:>6,} providers: {elapsed / MATCH_QUERIES * 1_000_000:.0f} µs/query")
+
+async def main():
+    print("📊 Benchmarking GrooveHire Database...")
+    await bench_payment_lookup()
+    await bench_session_churn()
+    bench_session_memory()
+    await bench_backends()
+    await bench_nearest_providers()
+    print("\n✅ Database benchmarks completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
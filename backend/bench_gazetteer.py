@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for gazetteer lookups over a large place list
+"""
+
+import random
+import statistics
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from gazetteer import PLACES, Gazetteer
+
+PLACE_COUNT = 30_000
+LOOKUPS = 5_000
+
+SYLLABLES = ["ka", "ki", "ku", "ma", "mu", "na", "ni", "nyo", "ru", "ri", "sa", "ta", "to",
+             "wa", "we", "la", "lo", "ga", "ge", "ba", "bu", "mbo", "nda", "shi", "tha"]
+
+def synthetic_places(count: int, rng: random.Random) -> dict:
+    """Swahili-like place names, some of them two words, on top of the real list"""
+    places = {place: list(aliases) for place, aliases in PLACES.items()}
+    while len(places) < count:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+        if rng.random() < 0.2:
+            name += " " + "".join(rng.choice(SYLLABLES) for _ in range(2))
+        places.setdefault(name, [])
+    return places
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1:]
+
+def bench(gazetteer, label, messages):
+    timings = []
+    found = 0
+    for message in messages:
+        started = time.perf_counter()
+        place = gazetteer.lookup(message)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+        found += place is not None
+    timings.sort()
+    print(
+        f"   {label:<8} p50 {statistics.median(timings):6.1f} µs"
+        f"   p99 {timings[int(len(timings) * 0.99)]:7.1f} µs   {found / len(messages):4.0%} found"
+    )
+
+if __name__ == "__main__":
+    print("📊 Benchmarking GrooveHire gazetteer...")
+    rng = random.Random(7)
+    places = synthetic_places(PLACE_COUNT, rng)
+    started = time.perf_counter()
+    gazetteer = Gazetteer(places)
+    print(f"\n🗺️  {len(gazetteer):,} names indexed in {time.perf_counter() - started:.1f}s")
+
+    names = [name for name in places if " " not in name and len(name) >= 7]
+    sample = [rng.choice(names) for _ in range(LOOKUPS)]
+    print(f"\n⏱️  lookup latency, {LOOKUPS:,} messages each")
+    bench(gazetteer, "exact", [f"I am in {name} today" for name in sample])
+    bench(gazetteer, "prefix", [name[:-1] for name in sample])
+    bench(gazetteer, "typo", [f"near {typo(name, rng)}" for name in sample])
+    bench(gazetteer, "none", ["fix a leaking tap tomorrow morning"] * LOOKUPS)
+    print("\n✅ Gazetteer benchmarks completed!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for logging cost on the message path
+"""
+
+import asyncio
+import logging
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from log_config import configure_logging, stop_logging
+
+USERS = 1_000
+TRIALS = 5
+
+# Conversation up to the payment step, which would call M-Pesa
+MESSAGES = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning"]
+
+logger = logging.getLogger("main")
+
+async def handle(bot: GrooveHireBot, phone: str, body: str, eager: bool) -> None:
+    """process_message with the webhook's log lines, eager as they used to be or lazy"""
+    if eager:
+        logger.info(f"Received message from {phone}: {body}")
+    else:
+        logger.info("Received message from %s", phone, extra={"body": body})
+    reply = await bot.process_message(phone, body, "Bench User")
+    if eager:
+        logger.info(f"Sending response to {phone}: {reply}")
+    else:
+        logger.info("Sending response to %s", phone, extra={"reply": reply})
+
+async def run_conversations(eager: bool) -> float:
+    """Seconds to take USERS fresh users through the conversation"""
+    bot = GrooveHireBot(Database())
+    started = time.perf_counter()
+    for i in range(USERS):
+        phone = f"+2547{i:08d}"
+        for body in MESSAGES:
+            await handle(bot, phone, body, eager)
+    return time.perf_counter() - started
+
+def synchronous_logging(stream) -> None:
+    """The previous setup: basicConfig writing from the event loop"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.basicConfig(level=logging.INFO, stream=stream)
+
+async def bench_logging(directory: str) -> None:
+    messages = USERS * len(MESSAGES)
+    print(f"\n📝 Logging cost, best of {TRIALS} trials of {messages:,} messages")
+    setups = [
+        ("logging off", False, lambda stream: synchronous_logging(stream) or logging.disable(logging.INFO)),
+        ("sync handler, f-strings", True, synchronous_logging),
+        ("queue handler, nothing sampled", False,
+         lambda stream: configure_logging(level="INFO", sample_rates={}, stream=stream)),
+        ("queue handler, json", False,
+         lambda stream: configure_logging(level="INFO", json_format=True, sample_rates={}, stream=stream)),
+        ("queue handler, defaults", False, lambda stream: configure_logging(level="INFO", stream=stream)),
+    ]
+
+    baseline = None
+    for label, eager, setup in setups:
+        timings = []
+        for trial in range(TRIALS):
+            with open(os.path.join(directory, f"bench-{trial}.log"), "w") as stream:
+                setup(stream)
+                timings.append(await run_conversations(eager))
+                stop_logging()
+                logging.disable(logging.NOTSET)
+        per_message = min(timings) / messages * 1e6
+        baseline = baseline or per_message
+        print(f"   {label:<31} {per_message:6.1f} µs/message   logging {per_message - baseline:+5.1f} µs")
+
+async def main():
+    print("📊 Benchmarking GrooveHire logging...")
+    with tempfile.TemporaryDirectory() as directory:
+        await bench_logging(directory)
+    synchronous_logging(sys.stderr)
+    print("\n✅ Logging benchmarks completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the cost of recording metrics
+"""
+
+import asyncio
+import logging
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+import bot_logic
+import main
+import metrics
+from bot_logic import GrooveHireBot
+from database import Database
+
+OPERATIONS = 200_000
+USERS = 2_000
+WEBHOOK_USERS = 200
+TRIALS = 7
+
+# Conversation up to the payment step, which would call M-Pesa
+MESSAGES = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning"]
+
+class NoopMetric:
+    """Stands in for a metric to measure the handler without recording"""
+
+    def observe(self, value, *labels):
+        pass
+
+    def inc(self, *labels, amount=1):
+        pass
+
+def bench_operations() -> None:
+    """Cost of a single observe and inc"""
+    print(f"\n⏱️  Recording cost, {OPERATIONS:,} operations each")
+    histogram = metrics.Histogram("bench_seconds", "Benchmark histogram", ["state"])
+    counter = metrics.Counter("bench_total", "Benchmark counter", ["state"])
+
+    started = time.perf_counter()
+    for i in range(OPERATIONS):
+        histogram.observe(0.0003, "WELCOME")
+    observe = (time.perf_counter() - started) / OPERATIONS * 1e9
+
+    started = time.perf_counter()
+    for i in range(OPERATIONS):
+        counter.inc("WELCOME")
+    inc = (time.perf_counter() - started) / OPERATIONS * 1e9
+
+    print(f"   Histogram.observe   {observe:6.0f} ns")
+    print(f"   Counter.inc         {inc:6.0f} ns")
+
+async def run_conversations() -> float:
+    """Seconds to take USERS fresh users through the conversation"""
+    bot = GrooveHireBot(Database())
+    started = time.perf_counter()
+    for i in range(USERS):
+        phone = f"+2547{i:08d}"
+        for message in MESSAGES:
+            await bot.process_message(phone, message, "Bench User")
+    return time.perf_counter() - started
+
+def post_conversations(client: TestClient, trial: int) -> float:
+    """Seconds to take WEBHOOK_USERS fresh users through the conversation over the webhook"""
+    started = time.perf_counter()
+    for i in range(WEBHOOK_USERS):
+        phone = f"+2548{trial:02d}{i:06d}"
+        for step, message in enumerate(MESSAGES):
+            client.post("/webhook/whatsapp", data={
+                "From": f"whatsapp:{phone}", "Body": message, "ProfileName": "Bench User",
+                "MessageSid": f"SM{phone}{step}"
+            })
+    return time.perf_counter() - started
+
+def compare(label: str, messages: int, run) -> None:
+    """Best of TRIALS interleaved runs with and without recording"""
+    recorded = (bot_logic.MESSAGE_LATENCY, bot_logic.MESSAGE_ERRORS)
+    with_metrics, without_metrics = [], []
+
+    run(0)  # warm up
+    for trial in range(TRIALS):
+        bot_logic.MESSAGE_LATENCY, bot_logic.MESSAGE_ERRORS = NoopMetric(), NoopMetric()
+        without_metrics.append(run(2 * trial + 1))
+        bot_logic.MESSAGE_LATENCY, bot_logic.MESSAGE_ERRORS = recorded
+        with_metrics.append(run(2 * trial + 2))
+
+    baseline, instrumented = min(without_metrics), min(with_metrics)
+    overhead = (instrumented - baseline) / baseline * 100
+    print(f"\n📏 {label}, best of {TRIALS} interleaved trials of {messages:,} messages")
+    print(f"   without metrics   {baseline / messages * 1e6:7.1f} µs/message")
+    print(f"   with metrics      {instrumented / messages * 1e6:7.1f} µs/message")
+    print(f"   overhead          {overhead:+7.2f}%")
+
+def bench_overhead() -> None:
+    """Cost of the per-message histogram on the webhook and on the bare handler"""
+    with TestClient(main.app) as client:
+        compare("Webhook overhead", WEBHOOK_USERS * len(MESSAGES),
+                lambda trial: post_conversations(client, trial))
+
+    # In-memory handling with no HTTP, the worst case for relative overhead
+    loop = asyncio.new_event_loop()
+    compare("Handler-only overhead", USERS * len(MESSAGES),
+            lambda trial: loop.run_until_complete(run_conversations()))
+    loop.close()
+
+def run_benchmarks():
+    print("📊 Benchmarking GrooveHire metrics...")
+    logging.disable(logging.WARNING)
+    bench_operations()
+    bench_overhead()
+    logging.disable(logging.NOTSET)
+    print("\n✅ Metrics benchmarks completed!")
+
+if __name__ == "__main__":
+    run_benchmarks()
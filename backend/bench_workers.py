@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Multi-worker benchmark for the GrooveHire bot on a shared SQLite store
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from sqlite_database import SQLiteDatabase
+
+WORKER_COUNTS = [1, 2, 4]
+USERS = 2_000
+
+CONVERSATION = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]
+
+async def serve(worker: int, workers: int, path: str, barrier) -> None:
+    """Handle this worker's share of every conversation step"""
+    bot = GrooveHireBot(SQLiteDatabase(path=path, shared=True))
+    phones = [f"+2547{i:08d}" for i in range(USERS)]
+
+    for step, message in enumerate(CONVERSATION):
+        # Every user's next message lands on a different worker than the last
+        mine = [phone for i, phone in enumerate(phones) if (i + step) % workers == worker]
+        await asyncio.to_thread(barrier.wait)
+        await asyncio.gather(*(bot.process_message(phone, message, "Bench User") for phone in mine))
+
+    await asyncio.to_thread(barrier.wait)
+    await bot.db.close()
+
+def run_worker(worker: int, workers: int, path: str, barrier) -> None:
+    logging.disable(logging.WARNING)
+    asyncio.run(serve(worker, workers, path, barrier))
+
+def bench_workers(workers: int) -> float:
+    """Messages per second with a given number of worker processes"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        # Create the schema and provider catalog before the workers race for it
+        asyncio.run(SQLiteDatabase(path=path).close())
+
+        # The coordinator joins the barrier to time the steps between the first and last wait
+        barrier = multiprocessing.Barrier(workers + 1)
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(worker, workers, path, barrier))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        barrier.wait()
+        started = time.perf_counter()
+        for _ in CONVERSATION:
+            barrier.wait()
+        elapsed = time.perf_counter() - started
+
+        for process in processes:
+            process.join()
+        return USERS * len(CONVERSATION) / elapsed
+
+def main():
+    print("📊 Benchmarking GrooveHire workers...")
+    print(f"\n👷 {USERS:,} conversations on a shared SQLite store, {os.cpu_count()} CPU(s)")
+    baseline = None
+    for workers in WORKER_COUNTS:
+        rate = bench_workers(workers)
+        baseline = baseline or rate
+        print(f"   {workers} worker(s): {rate:,.0f} messages/s ({rate / baseline:.1f}x)")
+    print("\n✅ Worker benchmarks completed!")
+
+if __name__ == "__main__":
+    main()
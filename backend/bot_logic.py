@@ -1,29 +1,60 @@
 import re
 import json
+import hashlib
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 import logging
+import time
 from database import Database
+from models import SessionRecord, SessionState
 from services import ServiceMatcher, PaymentService
+from dispatcher import MessageDispatcher
+from payment_scheduler import PaymentScheduler
+from intents import IntentMatcher
+from gazetteer import Gazetteer
+from concurrency import KeyedLock
+from unit_of_work import SessionUnitOfWork, current_unit_of_work
+from conversation import ConversationEngine, compile_templates
+from responses import RESPONSES
+from geo import AREA_CENTROIDS, haversine_km, nearest_area
+import metrics
+import tracing
 
 logger = logging.getLogger(__name__)
 
+MESSAGE_LATENCY = metrics.histogram(
+    "groovehire_message_duration_seconds",
+    "Time to handle an inbound message, by the conversation state it arrived in",
+    ["state"]
+)
+MESSAGE_ERRORS = metrics.counter(
+    "groovehire_message_errors_total",
+    "Inbound messages that raised while being handled",
+    ["state"]
+)
+# Label values by state, a dict lookup is cheaper than SessionState(state).name per message
+STATE_NAMES = {state: state.name for state in SessionState}
+
 class GrooveHireBot:
-    def __init__(self, database: Database):
+    def __init__(self, database: Database, dispatcher: MessageDispatcher = None):
         self.db = database
         self.service_matcher = ServiceMatcher(database)
         self.payment_service = PaymentService()
+        self.dispatcher = dispatcher or MessageDispatcher()
+        # Expires STK prompts and reconciles payments whose callback never arrives
+        self.payment_scheduler = PaymentScheduler(
+            self.payment_service,
+            on_paid=self.settle_payment,
+            on_failed=self.fail_payment
+        )
+        
+        # Messages from the same phone number are handled one at a time, in order
+        self.conversation_locks = KeyedLock()
+        # Session updates made by handlers, and the store writes they were merged into
+        self.session_writes = {"collected": 0, "flushed": 0}
         
         # Bot states
-        self.STATES = {
-            "WELCOME": "welcome",
-            "SERVICE_SELECTION": "service_selection",
-            "LOCATION_REQUEST": "location_request",
-            "PROVIDER_SELECTION": "provider_selection",
-            "BOOKING_DETAILS": "booking_details",
-            "PAYMENT": "payment",
-            "COMPLETED": "completed"
-        }
+        self.STATES = {state.name: state for state in SessionState}
         
         # Service categories
         self.SERVICES = {
@@ -34,62 +65,114 @@ class GrooveHireBot:
             "5": {"name": "Car Repair", "emoji": "🚗"},
             "6": {"name": "Painting", "emoji": "🎨"}
         }
-
-    async def process_message(self, phone_number: str, message: str, profile_name: str = None) -> str:
-        """Process incoming WhatsApp message and return response"""
+        
+        # Keywords per service, English and Swahili; "*" marks a stem matching any ending
+        self.SERVICE_KEYWORDS = {
+            "1": ["plumb*", "pipe", "tap", "water", "leak*", "drain", "toilet", "sink", "geyser",
+                  "bomba", "maji", "mfereji", "choo"],
+            "2": ["electric*", "wire", "wiring", "power", "light", "socket", "fuse", "switch",
+                  "stima", "umeme", "taa", "nguvu za umeme"],
+            "3": ["clean*", "house", "tidy", "laundry", "wash*", "dust*", "mop", "carpet",
+                  "usafi", "safisha", "kufua", "kufagia"],
+            "4": ["tutor*", "teach*", "lesson", "study", "studies", "homework", "exam", "revision",
+                  "mwalimu", "masomo", "funza", "somo", "kusoma"],
+            "5": ["car", "vehicle", "mechanic*", "engine", "garage", "tyre", "tire", "brake",
+                  "gari", "makanika", "injini"],
+            "6": ["paint*", "color", "colour", "wall",
+                  "rangi", "kupaka", "ukuta"]
+        }
+        
+        # Generic words that only count for half, so "house wiring" is electrical work
+        self.WEAK_KEYWORDS = {"water", "maji", "power", "light", "taa", "house", "car", "gari", "wall", "ukuta"}
+        
+        # Service names count as keywords too; compiled once into a single matcher
+        self.service_intents = IntentMatcher({
+            key: [service["name"]] + self.SERVICE_KEYWORDS.get(key, [])
+            for key, service in self.SERVICES.items()
+        }, weak=self.WEAK_KEYWORDS)
+        
+        # Known places, indexed once for exact, prefix and fuzzy lookups
+        self.gazetteer = Gazetteer()
+        
+        # Response templates, with the service menu rendered once
+        services_text = "\n".join([
+            f"{key}. {service['emoji']} {service['name']}"
+            for key, service in self.SERVICES.items()
+        ])
+        self.templates = compile_templates(
+            RESPONSES,
+            services_text=services_text,
+            service_count=len(self.SERVICES)
+        )
+        
+        # Conversation state machine
+        self.engine = ConversationEngine(default_handler=self.handle_welcome)
+        self.engine.register(SessionState.WELCOME, self.handle_welcome)
+        self.engine.register(SessionState.SERVICE_SELECTION, self.handle_service_selection)
+        self.engine.register(SessionState.LOCATION_REQUEST, self.handle_location_request)
+        self.engine.register(SessionState.PROVIDER_SELECTION, self.handle_provider_selection)
+        self.engine.register(SessionState.BOOKING_DETAILS, self.handle_booking_details)
+        self.engine.register(SessionState.PAYMENT, self.handle_payment)
+
+    @tracing.traced("bot.process_message")
+    async def process_message(self, phone_number: str, message: str, profile_name: str = None,
+                              latitude: float = None, longitude: float = None,
+                              raise_errors: bool = False) -> str:
+        """Process incoming WhatsApp message and return response
+
+        A failure returns the error reply, or with raise_errors re-raises so a
+        caller that deduplicates messages can let a retry run it again.
+        """
+        started = time.perf_counter()
+        state_name = "UNKNOWN"
         try:
-            # Get or create user session
-            user_session = await self.get_user_session(phone_number, profile_name)
-            
-            # Clean and normalize message
-            message = message.strip().lower()
-            
-            # Handle different states
-            current_state = user_session.get("state", self.STATES["WELCOME"])
-            
-            if current_state == self.STATES["WELCOME"]:
-                return await self.handle_welcome(phone_number, message, user_session)
-            elif current_state == self.STATES["SERVICE_SELECTION"]:
-                return await self.handle_service_selection(phone_number, message, user_session)
-            elif current_state == self.STATES["LOCATION_REQUEST"]:
-                return await self.handle_location_request(phone_number, message, user_session)
-            elif current_state == self.STATES["PROVIDER_SELECTION"]:
-                return await self.handle_provider_selection(phone_number, message, user_session)
-            elif current_state == self.STATES["BOOKING_DETAILS"]:
-                return await self.handle_booking_details(phone_number, message, user_session)
-            elif current_state == self.STATES["PAYMENT"]:
-                return await self.handle_payment(phone_number, message, user_session)
-            else:
-                return await self.handle_welcome(phone_number, message, user_session)
+            async with self.conversation_locks.hold(phone_number), self.db.conversation_lease(phone_number):
+                # Get or create user session
+                user_session = await self.get_user_session(phone_number, profile_name)
+                
+                # Clean and normalize message
+                message = message.strip().lower()
+                
+                # Route to the handler registered for the current state
+                current_state = user_session.get("state", self.STATES["WELCOME"])
+                state_name = STATE_NAMES.get(current_state, "UNKNOWN")
+                tracing.annotate(state=state_name)
+
+                # Collect the handler's session updates and write them in one go once it succeeds
+                unit = SessionUnitOfWork()
+                token = current_unit_of_work.set(unit)
+                try:
+                    response = await self.engine.dispatch(
+                        current_state, phone_number, message, user_session,
+                        latitude=latitude, longitude=longitude
+                    )
+                finally:
+                    current_unit_of_work.reset(token)
+                self.session_writes["collected"] += unit.collected
+                self.session_writes["flushed"] += await unit.flush(self.db)
+                return response
                 
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
-            return "Sorry, I encountered an error. Please try again or type 'start' to begin."
-
-    async def handle_welcome(self, phone_number: str, message: str, user_session: Dict) -> str:
+            MESSAGE_ERRORS.inc(state_name)
+            logger.error("Error processing message: %s", e)
+            if raise_errors:
+                raise
+            return self.templates["error"].render()
+        finally:
+            MESSAGE_LATENCY.observe(time.perf_counter() - started, state_name)
+
+    async def handle_welcome(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle welcome state"""
         name = user_session.get("profile_name", "there")
         
         # Update user session
         await self.update_user_session(phone_number, {
-            "state": self.STATES["SERVICE_SELECTION"],
-            "last_interaction": datetime.now().isoformat()
+            "state": self.STATES["SERVICE_SELECTION"]
         })
         
-        services_text = "\n".join([
-            f"{key}. {service['emoji']} {service['name']}" 
-            for key, service in self.SERVICES.items()
-        ])
-        
-        return f"""👋 Hi {name}! Welcome to GrooveHire!
-
-I'm here to help you find trusted local service providers. What service do you need today?
-
-{services_text}
+        return self.templates["welcome"].render(name=name)
 
-Just reply with the number (1-6) or tell me what you need help with."""
-
-    async def handle_service_selection(self, phone_number: str, message: str, user_session: Dict) -> str:
+    async def handle_service_selection(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle service selection"""
         selected_service = None
         
@@ -97,26 +180,10 @@ Just reply with the number (1-6) or tell me what you need help with."""
         if message in self.SERVICES:
             selected_service = self.SERVICES[message]
         else:
-            # Try to match service by keywords
-            for service_data in self.SERVICES.values():
-                if service_data["name"].lower() in message:
-                    selected_service = service_data
-                    break
-        
-        if not selected_service:
-            # Try to understand what they need
-            if any(word in message for word in ["plumb", "pipe", "tap", "water"]):
-                selected_service = self.SERVICES["1"]
-            elif any(word in message for word in ["electric", "wire", "power", "light"]):
-                selected_service = self.SERVICES["2"]
-            elif any(word in message for word in ["clean", "house", "tidy"]):
-                selected_service = self.SERVICES["3"]
-            elif any(word in message for word in ["tutor", "teach", "lesson", "study"]):
-                selected_service = self.SERVICES["4"]
-            elif any(word in message for word in ["car", "vehicle", "mechanic"]):
-                selected_service = self.SERVICES["5"]
-            elif any(word in message for word in ["paint", "color", "wall"]):
-                selected_service = self.SERVICES["6"]
+            # Score every service's keywords in one pass
+            service_key = self.service_intents.match(message)
+            if service_key:
+                selected_service = self.SERVICES[service_key]
         
         if selected_service:
             # Update session with selected service
@@ -125,112 +192,105 @@ Just reply with the number (1-6) or tell me what you need help with."""
                 "state": self.STATES["LOCATION_REQUEST"]
             })
             
-            return f"""Great choice! {selected_service['emoji']} You've selected *{selected_service['name']}*.
-
-To find the best providers near you, please share your location or tell me your area (e.g., Westlands, Karen, Kilimani, etc.)
-
-You can also share your live location using WhatsApp's location feature! 📍"""
+            return self.templates["service_selected"].render(
+                emoji=selected_service["emoji"],
+                service=selected_service["name"]
+            )
         else:
-            services_text = "\n".join([
-                f"{key}. {service['emoji']} {service['name']}" 
-                for key, service in self.SERVICES.items()
-            ])
-            
-            return f"""I didn't quite understand that. Please choose a service:
-
-{services_text}
-
-Reply with the number (1-6) or describe what you need."""
+            return self.templates["service_unknown"].render()
 
-    async def handle_location_request(self, phone_number: str, message: str, user_session: Dict) -> str:
+    async def handle_location_request(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle location request"""
-        # Extract location from message
-        location = self.extract_location(message)
+        latitude = context.get("latitude")
+        longitude = context.get("longitude")
+        
+        if latitude is not None and longitude is not None:
+            # Shared WhatsApp location pin
+            area = nearest_area(latitude, longitude)
+            location = self.gazetteer.display_name(area) if area else "your location"
+        else:
+            # Extract location from message
+            location = self.extract_location(message)
+            if location:
+                latitude, longitude = AREA_CENTROIDS.get(location.lower(), (None, None))
         
         if location:
             # Update session with location
             await self.update_user_session(phone_number, {
                 "location": location,
+                "latitude": latitude,
+                "longitude": longitude,
                 "state": self.STATES["PROVIDER_SELECTION"]
             })
             
             # Get providers for the service and location
             service_name = user_session.get("selected_service")
-            providers = await self.service_matcher.find_providers(service_name, location)
+            providers = await self.service_matcher.find_providers(service_name, location, latitude, longitude)
             
             if providers:
-                providers_text = ""
-                for i, provider in enumerate(providers[:3], 1):
-                    providers_text += f"\n{i}. *{provider['name']}*\n"
-                    providers_text += f"   ⭐ {provider['rating']}/5 ({provider['reviews']} reviews)\n"
-                    providers_text += f"   📍 {provider['distance']} away\n"
-                    providers_text += f"   💰 KES {provider['rate']}/hour\n"
+                provider_line = self.templates["provider_line"]
+                providers_text = "".join([
+                    provider_line.render(
+                        index=i,
+                        name=provider["name"],
+                        rating=provider["rating"],
+                        reviews=provider["reviews"],
+                        distance=self.format_distance(provider["distance_km"], location),
+                        rate=provider["rate"]
+                    )
+                    for i, provider in enumerate(providers[:3], 1)
+                ])
                 
-                # Store providers in session
+                # Store provider ids in session, details are looked up when rendered
                 await self.update_user_session(phone_number, {
-                    "available_providers": providers[:3]
+                    "available_provider_ids": tuple(provider["id"] for provider in providers[:3])
                 })
                 
-                return f"""Perfect! I found these top-rated {service_name.lower()} providers near {location}:
-
-{providers_text}
-
-Which provider would you like to book? Reply with 1, 2, or 3."""
+                return self.templates["providers_found"].render(
+                    service=service_name.lower(),
+                    location=location,
+                    providers_text=providers_text
+                )
             else:
-                return f"""Sorry, I couldn't find any {service_name.lower()} providers in {location} right now. 
-
-Would you like to:
-1. Try a different area
-2. Get notified when providers become available
-3. Browse other services
-
-Reply with 1, 2, or 3."""
+                return self.templates["providers_not_found"].render(
+                    service=service_name.lower(),
+                    location=location
+                )
         else:
-            return """I need your location to find providers near you. Please:
-
-1. Share your live location using WhatsApp
-2. Tell me your area (e.g., "Westlands", "Karen", "CBD")
-3. Give me nearby landmarks
-
-Where are you located? 📍"""
+            return self.templates["location_unknown"].render()
 
-    async def handle_provider_selection(self, phone_number: str, message: str, user_session: Dict) -> str:
+    async def handle_provider_selection(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle provider selection"""
         try:
             selection = int(message)
             if 1 <= selection <= 3:
-                providers = user_session.get("available_providers", [])
-                if selection <= len(providers):
-                    selected_provider = providers[selection - 1]
+                provider_ids = user_session.get("available_provider_ids", ())
+                if selection <= len(provider_ids):
+                    selected_provider = await self.db.get_provider(provider_ids[selection - 1])
+                    if not selected_provider:
+                        return self.templates["provider_unavailable"].render()
                     
                     # Update session
                     await self.update_user_session(phone_number, {
-                        "selected_provider": selected_provider,
+                        "selected_provider_id": selected_provider["id"],
                         "state": self.STATES["BOOKING_DETAILS"]
                     })
                     
-                    return f"""Excellent choice! You've selected:
-
-👨‍🔧 *{selected_provider['name']}*
-⭐ {selected_provider['rating']}/5 rating
-📍 {selected_provider['distance']} away
-💰 KES {selected_provider['rate']}/hour
-
-Now I need a few details to complete your booking:
-
-1. What's the specific issue or work needed?
-2. When would you like the service? (today, tomorrow, specific date)
-3. Preferred time? (morning, afternoon, evening)
-
-Please describe your needs and preferred timing."""
+                    return self.templates["provider_selected"].render(
+                        name=selected_provider["name"],
+                        rating=selected_provider["rating"],
+                        distance=self.format_distance(
+                            self.provider_distance(user_session, selected_provider),
+                            user_session.get("location")
+                        ),
+                        rate=selected_provider["rate"]
+                    )
         except ValueError:
             pass
         
-        return """Please select a provider by replying with 1, 2, or 3.
-
-If you'd like to see different providers, type 'back' to choose a different location."""
+        return self.templates["provider_invalid"].render()
 
-    async def handle_booking_details(self, phone_number: str, message: str, user_session: Dict) -> str:
+    async def handle_booking_details(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle booking details collection"""
         # Store the details
         await self.update_user_session(phone_number, {
@@ -238,25 +298,21 @@ If you'd like to see different providers, type 'back' to choose a different loca
             "state": self.STATES["PAYMENT"]
         })
         
-        provider = user_session.get("selected_provider")
+        provider = await self.db.get_provider(user_session.get("selected_provider_id"))
         service = user_session.get("selected_service")
         
         # Calculate estimated cost (assuming 2 hours minimum)
         estimated_hours = 2
         estimated_cost = provider["rate"] * estimated_hours
         
-        return f"""Perfect! Here's your booking summary:
-
-🔧 *Service:* {service}
-👨‍🔧 *Provider:* {provider['name']}
-📝 *Details:* {message}
-💰 *Estimated Cost:* KES {estimated_cost} (2 hours minimum)
-
-To confirm your booking, please pay KES 500 as a booking fee. The remaining amount will be paid to the provider after service completion.
-
-Reply 'PAY' to proceed with M-Pesa payment, or 'BACK' to modify details."""
-
-    async def handle_payment(self, phone_number: str, message: str, user_session: Dict) -> str:
+        return self.templates["booking_summary"].render(
+            service=service,
+            provider=provider["name"],
+            details=message,
+            estimated_cost=estimated_cost
+        )
+
+    async def handle_payment(self, phone_number: str, message: str, user_session: Dict, **context) -> str:
         """Handle payment initiation"""
         if message.lower() == 'pay':
             try:
@@ -269,35 +325,36 @@ Reply 'PAY' to proceed with M-Pesa payment, or 'BACK' to modify details."""
                 )
                 
                 if result.get("success"):
+                    checkout_request_id = result.get("checkout_request_id")
                     await self.update_user_session(phone_number, {
-                        "payment_reference": result.get("checkout_request_id"),
+                        "payment_reference": checkout_request_id,
                         "state": self.STATES["COMPLETED"]
                     })
+                    # Only poll once the reference is stored, or the status query finds no session.
+                    # Simulated pushes have no status to query and would just expire.
+                    if not result.get("simulated"):
+                        self.after_session_write(
+                            lambda: self.payment_scheduler.add(checkout_request_id, phone_number)
+                        )
                     
-                    return f"""💳 M-Pesa payment request sent!
-
-Please check your phone for the M-Pesa prompt and enter your PIN to pay KES 500.
-
-Once payment is confirmed, I'll connect you with your provider and send you the booking confirmation.
-
-⏰ The payment prompt expires in 2 minutes."""
+                    return self.templates["payment_sent"].render()
                 else:
-                    return f"""Sorry, there was an issue initiating the payment. Please try again or contact support.
-
-Error: {result.get('message', 'Unknown error')}"""
+                    return self.templates["payment_failed"].render(
+                        error=result.get("message", "Unknown error")
+                    )
                     
             except Exception as e:
-                logger.error(f"Payment initiation error: {str(e)}")
-                return "Sorry, there was an issue with the payment system. Please try again later."
+                logger.error("Payment initiation error: %s", e)
+                return self.templates["payment_error"].render()
         
         elif message.lower() == 'back':
             await self.update_user_session(phone_number, {
                 "state": self.STATES["BOOKING_DETAILS"]
             })
-            return "Please provide your booking details again:"
+            return self.templates["payment_back"].render()
         
         else:
-            return "Please reply 'PAY' to proceed with payment or 'BACK' to modify your booking details."
+            return self.templates["payment_prompt"].render()
 
     async def handle_payment_callback(self, callback_data: Dict) -> None:
         """Handle M-Pesa payment callback"""
@@ -306,104 +363,136 @@ Error: {result.get('message', 'Unknown error')}"""
             checkout_request_id = callback_data.get("CheckoutRequestID")
             result_code = callback_data.get("ResultCode")
             
-            if result_code == 0:  # Success
+            # The callback arrived, no need to poll for this payment
+            self.payment_scheduler.discard(checkout_request_id)
+            
+            if result_code != 0:
+                await self.fail_payment(checkout_request_id, callback_data.get("ResultDesc"))
+            else:
                 # Find user session by payment reference
                 user_session = await self.db.find_user_by_payment_reference(checkout_request_id)
                 
                 if user_session:
                     phone_number = user_session["phone_number"]
-                    provider = user_session.get("selected_provider")
-                    service = user_session.get("selected_service")
-                    
-                    # Create booking record
-                    booking_id = await self.create_booking(user_session)
+                    async with self.conversation_locks.hold(phone_number), self.db.conversation_lease(phone_number):
+                        # Another worker may have moved the conversation on since the lookup,
+                        # or settled this payment already through a status query
+                        user_session = await self.db.get_user_session(phone_number)
+                        if user_session is None or user_session.get("payment_reference") != checkout_request_id:
+                            return
+                        provider = await self.db.get_provider(user_session.get("selected_provider_id"))
+                        service = user_session.get("selected_service")
                     
-                    # Send confirmation to client
-                    confirmation_message = f"""✅ *Payment Confirmed!*
-
-Your booking has been confirmed:
-
-🆔 Booking ID: {booking_id}
-🔧 Service: {service}
-👨‍🔧 Provider: {provider['name']}
-📞 Provider Contact: {provider['phone']}
-
-Your provider will contact you shortly to confirm the appointment time.
-
-Thank you for using GrooveHire! 🎉"""
+                        # Create booking record
+                        booking_id = await self.create_booking(user_session, checkout_request_id)
                     
-                    # Send message to client
-                    await self.send_whatsapp_message(phone_number, confirmation_message)
+                        # Payment is settled, drop the reference from the index
+                        await self.update_user_session(phone_number, {
+                            "payment_reference": None
+                        })
                     
-                    # Notify provider
-                    provider_message = f"""🔔 *New Booking Alert!*
-
-You have a new booking request:
-
-🆔 Booking ID: {booking_id}
-🔧 Service: {service}
-👤 Client: {user_session.get('profile_name', 'Client')}
-📞 Client Contact: {phone_number}
-📝 Details: {user_session.get('booking_details')}
-
-Please contact the client to confirm the appointment time."""
+                        # Send confirmation to client
+                        await self.send_whatsapp_message(phone_number, self.templates["payment_confirmed"].render(
+                            booking_id=booking_id,
+                            service=service,
+                            provider=provider["name"],
+                            provider_phone=provider["phone"]
+                        ))
                     
-                    await self.send_whatsapp_message(provider['phone'], provider_message)
+                        # Notify provider
+                        await self.send_whatsapp_message(provider["phone"], self.templates["provider_booking_alert"].render(
+                            booking_id=booking_id,
+                            service=service,
+                            client=user_session.get("profile_name", "Client"),
+                            client_phone=phone_number,
+                            details=user_session.get("booking_details")
+                        ))
                     
         except Exception as e:
-            logger.error(f"Error handling payment callback: {str(e)}")
+            logger.error("Error handling payment callback: %s", e)
+            # Let the job queue retry the callback
+            raise
+
+    async def settle_payment(self, checkout_request_id: str) -> None:
+        """Complete a booking whose payment was confirmed by a status query"""
+        await self.handle_payment_callback({"CheckoutRequestID": checkout_request_id, "ResultCode": 0})
+
+    async def fail_payment(self, checkout_request_id: str, reason: Optional[str]) -> None:
+        """Return the session to the payment step after a failed or expired STK push"""
+        user_session = await self.db.find_user_by_payment_reference(checkout_request_id)
+        if not user_session:
+            return
+        phone_number = user_session["phone_number"]
+        async with self.conversation_locks.hold(phone_number), self.db.conversation_lease(phone_number):
+            user_session = await self.db.get_user_session(phone_number)
+            if user_session is None or user_session.get("payment_reference") != checkout_request_id:
+                return
+            await self.update_user_session(phone_number, {
+                "payment_reference": None,
+                "state": self.STATES["PAYMENT"]
+            })
+            if reason is None:
+                await self.send_whatsapp_message(phone_number, self.templates["payment_expired"].render())
+            else:
+                await self.send_whatsapp_message(phone_number, self.templates["payment_cancelled"].render(reason=reason))
+
+    def provider_distance(self, user_session: Dict, provider: Dict) -> Optional[float]:
+        """Distance in km from the user's location to a provider"""
+        latitude = user_session.get("latitude")
+        longitude = user_session.get("longitude")
+        if latitude is None or longitude is None or provider.get("lat") is None:
+            return None
+        return round(haversine_km(latitude, longitude, provider["lat"], provider["lon"]), 1)
+
+    def format_distance(self, distance_km: Optional[float], location: str) -> str:
+        """Distance line for provider listings"""
+        if distance_km is None:
+            return f"Travels to {location}"
+        return f"{distance_km} km away"
 
     def extract_location(self, message: str) -> Optional[str]:
         """Extract location from message"""
-        # Common Nairobi areas
-        areas = [
-            "westlands", "karen", "kilimani", "cbd", "upperhill", "lavington",
-            "kileleshwa", "parklands", "eastleigh", "kasarani", "thika", "ngong",
-            "runda", "muthaiga", "gigiri", "spring valley", "riverside"
-        ]
-        
-        message_lower = message.lower()
-        for area in areas:
-            if area in message_lower:
-                return area.title()
-        
-        # If no specific area found, return the message as location
-        if len(message.split()) <= 3:  # Likely a location
-            return message.title()
-        
-        return None
+        return self.gazetteer.find(message)
 
     async def get_user_session(self, phone_number: str, profile_name: str = None) -> Dict:
         """Get or create user session"""
         session = await self.db.get_user_session(phone_number)
         
         if not session:
-            session = {
-                "phone_number": phone_number,
-                "profile_name": profile_name,
-                "state": self.STATES["WELCOME"],
-                "created_at": datetime.now().isoformat(),
-                "last_interaction": datetime.now().isoformat()
-            }
+            session = SessionRecord(phone_number, profile_name)
             await self.db.create_user_session(session)
         
         return session
 
     async def update_user_session(self, phone_number: str, updates: Dict) -> None:
-        """Update user session"""
-        updates["last_interaction"] = datetime.now().isoformat()
-        await self.db.update_user_session(phone_number, updates)
+        """Update user session, deferred to the end of the message while one is being handled"""
+        updates["last_interaction"] = time.time()
+        unit = current_unit_of_work.get()
+        if unit is not None:
+            unit.add(phone_number, updates)
+        else:
+            await self.db.update_user_session(phone_number, updates)
+
+    def after_session_write(self, action) -> None:
+        """Run an action once the current message's session updates are stored"""
+        unit = current_unit_of_work.get()
+        if unit is not None:
+            unit.after_flush(action)
+        else:
+            action()
 
-    async def create_booking(self, user_session: Dict) -> str:
-        """Create booking record"""
-        booking_id = f"GH{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    async def create_booking(self, user_session: Dict, checkout_request_id: str) -> str:
+        """Create booking record, once per payment"""
+        # Derived from the payment so a retried callback finds the same booking
+        booking_id = f"GH{hashlib.sha1(checkout_request_id.encode()).hexdigest()[:10].upper()}"
         
         booking = {
             "booking_id": booking_id,
+            "payment_reference": checkout_request_id,
             "client_phone": user_session["phone_number"],
             "client_name": user_session.get("profile_name"),
             "service": user_session.get("selected_service"),
-            "provider": user_session.get("selected_provider"),
+            "provider_id": user_session.get("selected_provider_id"),
             "location": user_session.get("location"),
             "details": user_session.get("booking_details"),
             "status": "confirmed",
@@ -415,21 +504,5 @@ Please contact the client to confirm the appointment time."""
         return booking_id
 
     async def send_whatsapp_message(self, phone_number: str, message: str) -> None:
-        """Send WhatsApp message"""
-        try:
-            from twilio.rest import Client
-            import os
-            
-            client = Client(
-                os.getenv("TWILIO_ACCOUNT_SID"),
-                os.getenv("TWILIO_AUTH_TOKEN")
-            )
-            
-            client.messages.create(
-                body=message,
-                from_=os.getenv("TWILIO_WHATSAPP_NUMBER"),
-                to=f"whatsapp:{phone_number}"
-            )
-            
-        except Exception as e:
-            logger.error(f"Error sending WhatsApp message: {str(e)}")
\ No newline at end of file
+        """Queue WhatsApp message for background delivery"""
+        self.dispatcher.enqueue(phone_number, message)
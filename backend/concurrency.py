@@ -0,0 +1,38 @@
+from typing import Dict, List, AsyncIterator
+from contextlib import asynccontextmanager
+import asyncio
+
+class KeyedLock:
+    """Async locks keyed by string, created on demand and dropped once idle
+
+    Waiters on the same key are served in arrival order; different keys never
+    wait on each other.
+    """
+
+    def __init__(self):
+        # key -> [lock, holders and waiters]
+        self._locks: Dict[str, List] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: str) -> bool:
+        """Whether a key is currently held"""
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Hold the lock for a key"""
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._locks[key] = entry
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
@@ -0,0 +1,63 @@
+from typing import Dict, List, Any, Callable, Awaitable
+from string import Formatter
+from models import SessionState
+
+Handler = Callable[..., Awaitable[str]]
+
+class Template:
+    """Response template compiled once at startup
+
+    Static fields are substituted at compile time, leaving a format string
+    with only the per-message fields, or a plain string when there are none.
+    """
+
+    __slots__ = ("_format", "_static_text", "fields")
+
+    def __init__(self, text: str, **static: Any):
+        chunks: List[str] = []
+        fields: List[str] = []
+        for literal, field, _, _ in Formatter().parse(text):
+            chunks.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field in static:
+                chunks.append(str(static[field]).replace("{", "{{").replace("}", "}}"))
+            else:
+                chunks.append("{" + field + "}")
+                fields.append(field)
+
+        compiled = "".join(chunks)
+        self.fields = tuple(fields)
+        self._format = compiled.format
+        self._static_text = compiled.format() if not fields else None
+
+    def render(self, **fields: Any) -> str:
+        """Fill in the dynamic fields"""
+        if self._static_text is not None:
+            return self._static_text
+        return self._format(**fields)
+
+def compile_templates(templates: Dict[str, str], **static: Any) -> Dict[str, Template]:
+    """Compile a table of response templates with shared static fields"""
+    return {name: Template(text, **static) for name, text in templates.items()}
+
+class ConversationEngine:
+    """State machine dispatching each message to the handler registered for the session state"""
+
+    def __init__(self, default_handler: Handler):
+        self.default_handler = default_handler
+        self._handlers: Dict[SessionState, Handler] = {}
+
+    def register(self, state: SessionState, handler: Handler) -> None:
+        """Route messages in a state to a handler"""
+        self._handlers[state] = handler
+
+    def handler_for(self, state: SessionState) -> Handler:
+        """Handler for a state, falling back to the default"""
+        return self._handlers.get(state, self.default_handler)
+
+    async def dispatch(self, state: SessionState, phone_number: str, message: str,
+                       user_session: Any, **context: Any) -> str:
+        """Run the handler for the session's current state"""
+        handler = self.handler_for(state)
+        return await handler(phone_number, message, user_session, **context)
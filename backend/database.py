@@ -1,19 +1,59 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator
+from contextlib import asynccontextmanager
 import os
 from datetime import datetime
 import logging
+import tracing
+from session_store import SessionStore
+from geo import GridIndex
 
 logger = logging.getLogger(__name__)
 
 class Database:
     """Database interface for GrooveHire bot"""
     
-    def __init__(self):
+    def __init__(self, max_sessions: int = None, session_ttl: float = None):
         # In production, you would connect to MongoDB
         # For now, we'll use in-memory storage for demo
-        self.user_sessions = {}
+        self.user_sessions = SessionStore(
+            max_sessions=max_sessions,
+            ttl=session_ttl,
+            on_evict=self._on_session_evicted,
+            # A session waiting for its M-Pesa callback must stay findable by payment reference
+            is_pinned=lambda session: session.get("payment_reference") is not None
+        )
+        # payment_reference -> phone_number, so callbacks avoid scanning sessions
+        self.payment_index = {}
         self.bookings = {}
-        self.providers = self._initialize_sample_providers()
+        self.providers = self._load_providers()
+        self._build_provider_indexes()
+    
+    def _load_providers(self) -> Dict:
+        """Load the provider catalog, keyed by service"""
+        return self._initialize_sample_providers()
+    
+    def _build_provider_indexes(self) -> None:
+        """Build lookup structures over the loaded catalog"""
+        # Provider registry, sessions and bookings refer to providers by id
+        self.providers_by_id = {
+            provider["id"]: provider
+            for providers in self.providers.values()
+            for provider in providers
+        }
+        # (service, area) -> providers, so location filtering is a single lookup
+        self.area_index: Dict[Tuple[str, str], List[Dict]] = {}
+        for service, providers in self.providers.items():
+            for provider in providers:
+                for area in provider.get("areas", []):
+                    self.area_index.setdefault((service, area.lower()), []).append(provider)
+        # service -> spatial index over provider coordinates
+        self.geo_index: Dict[str, GridIndex] = {}
+        for service, providers in self.providers.items():
+            index = GridIndex()
+            for provider in providers:
+                if provider.get("lat") is not None and provider.get("lon") is not None:
+                    index.insert(provider["lat"], provider["lon"], provider)
+            self.geo_index[service] = index
     
     def _initialize_sample_providers(self) -> Dict:
         """Initialize sample providers for demo"""
@@ -26,7 +66,8 @@ class Database:
                     "rating": 4.9,
                     "reviews": 245,
                     "rate": 1200,
-                    "distance": "2.1 km",
+                    "lat": -1.2702,
+                    "lon": 36.804,
                     "areas": ["westlands", "kilimani", "parklands"]
                 },
                 {
@@ -36,7 +77,8 @@ class Database:
                     "rating": 4.8,
                     "reviews": 189,
                     "rate": 1000,
-                    "distance": "3.5 km",
+                    "lat": -1.2851,
+                    "lon": 36.779,
                     "areas": ["westlands", "karen", "lavington"]
                 },
                 {
@@ -46,7 +88,8 @@ class Database:
                     "rating": 4.7,
                     "reviews": 156,
                     "rate": 1500,
-                    "distance": "4.2 km",
+                    "lat": -1.293,
+                    "lon": 36.819,
                     "areas": ["westlands", "upperhill", "cbd"]
                 }
             ],
@@ -58,7 +101,8 @@ class Database:
                     "rating": 4.8,
                     "reviews": 198,
                     "rate": 1300,
-                    "distance": "1.8 km",
+                    "lat": -1.266,
+                    "lon": 36.8075,
                     "areas": ["westlands", "kilimani", "parklands"]
                 },
                 {
@@ -68,7 +112,8 @@ class Database:
                     "rating": 4.9,
                     "reviews": 234,
                     "rate": 1400,
-                    "distance": "2.9 km",
+                    "lat": -1.301,
+                    "lon": 36.748,
                     "areas": ["karen", "lavington", "runda"]
                 }
             ],
@@ -80,7 +125,8 @@ class Database:
                     "rating": 4.6,
                     "reviews": 167,
                     "rate": 800,
-                    "distance": "1.5 km",
+                    "lat": -1.2745,
+                    "lon": 36.8021,
                     "areas": ["westlands", "kilimani", "parklands"]
                 },
                 {
@@ -90,7 +136,8 @@ class Database:
                     "rating": 4.7,
                     "reviews": 203,
                     "rate": 900,
-                    "distance": "3.1 km",
+                    "lat": -1.2945,
+                    "lon": 36.7725,
                     "areas": ["karen", "lavington", "upperhill"]
                 }
             ],
@@ -102,7 +149,8 @@ class Database:
                     "rating": 4.9,
                     "reviews": 312,
                     "rate": 600,
-                    "distance": "2.3 km",
+                    "lat": -1.282,
+                    "lon": 36.795,
                     "areas": ["westlands", "kilimani", "lavington"]
                 },
                 {
@@ -112,7 +160,8 @@ class Database:
                     "rating": 4.8,
                     "reviews": 278,
                     "rate": 700,
-                    "distance": "3.7 km",
+                    "lat": -1.245,
+                    "lon": 36.781,
                     "areas": ["karen", "runda", "muthaiga"]
                 }
             ],
@@ -124,7 +173,8 @@ class Database:
                     "rating": 4.7,
                     "reviews": 189,
                     "rate": 1500,
-                    "distance": "4.1 km",
+                    "lat": -1.2488,
+                    "lon": 36.846,
                     "areas": ["westlands", "parklands", "kasarani"]
                 }
             ],
@@ -136,54 +186,129 @@ class Database:
                     "rating": 4.5,
                     "reviews": 145,
                     "rate": 700,
-                    "distance": "2.8 km",
+                    "lat": -1.288,
+                    "lon": 36.801,
                     "areas": ["westlands", "kilimani", "upperhill"]
                 }
             ]
         }
     
+    @tracing.traced("db.get_user_session")
     async def get_user_session(self, phone_number: str) -> Optional[Dict]:
         """Get user session by phone number"""
         return self.user_sessions.get(phone_number)
     
+    @tracing.traced("db.create_user_session")
     async def create_user_session(self, session: Dict) -> None:
         """Create new user session"""
         phone_number = session["phone_number"]
+        previous = self.user_sessions.get(phone_number)
+        self._reindex_payment(
+            phone_number,
+            previous.get("payment_reference") if previous else None,
+            session.get("payment_reference")
+        )
         self.user_sessions[phone_number] = session
-        logger.info(f"Created session for {phone_number}")
+        logger.debug("Created session for %s", phone_number)
     
+    @tracing.traced("db.update_user_session")
     async def update_user_session(self, phone_number: str, updates: Dict) -> None:
         """Update user session"""
-        if phone_number in self.user_sessions:
-            self.user_sessions[phone_number].update(updates)
-            logger.info(f"Updated session for {phone_number}")
+        session = self.user_sessions.get(phone_number)
+        if session is not None:
+            if "payment_reference" in updates:
+                self._reindex_payment(phone_number, session.get("payment_reference"), updates["payment_reference"])
+            session.update(updates)
+            logger.debug("Updated session for %s", phone_number)
+    
+    def _reindex_payment(self, phone_number: str, old_ref: Optional[str], new_ref: Optional[str]) -> None:
+        """Keep the payment reference index in step with a session change"""
+        if old_ref and self.payment_index.get(old_ref) == phone_number:
+            del self.payment_index[old_ref]
+        if new_ref:
+            self.payment_index[new_ref] = phone_number
     
+    def _on_session_evicted(self, phone_number: str, session: Dict) -> None:
+        """Drop index entries that point at an evicted session"""
+        self._reindex_payment(phone_number, session.get("payment_reference"), None)
+    
+    def session_stats(self) -> Dict:
+        """Resident session count and eviction counters"""
+        return {"resident": len(self.user_sessions), **self.user_sessions.stats}
+    
+    @asynccontextmanager
+    async def conversation_lease(self, phone_number: str) -> AsyncIterator[None]:
+        """Claim a conversation against other worker processes, nothing to claim in memory"""
+        yield
+    
+    @tracing.traced("db.find_user_by_payment_reference")
     async def find_user_by_payment_reference(self, payment_ref: str) -> Optional[Dict]:
         """Find user session by payment reference"""
-        for session in self.user_sessions.values():
-            if session.get("payment_reference") == payment_ref:
-                return session
-        return None
+        phone_number = self.payment_index.get(payment_ref)
+        if phone_number is None:
+            return None
+        return self.user_sessions.get(phone_number)
     
-    async def create_booking(self, booking: Dict) -> None:
-        """Create new booking"""
+    @tracing.traced("db.create_booking")
+    async def create_booking(self, booking: Dict) -> bool:
+        """Create new booking, returning False if one with the same id already exists"""
         booking_id = booking["booking_id"]
-        self.bookings[booking_id] = booking
-        logger.info(f"Created booking {booking_id}")
+        if self.bookings.setdefault(booking_id, booking) is not booking:
+            logger.info("Booking %s already exists", booking_id)
+            return False
+        logger.info("Created booking %s", booking_id)
+        return True
+    
+    @tracing.traced("db.get_provider")
+    async def get_provider(self, provider_id: str) -> Optional[Dict]:
+        """Get provider by id"""
+        return self.providers_by_id.get(provider_id)
+    
+    async def update_provider(self, provider_id: str, updates: Dict) -> None:
+        """Update provider details in the catalog"""
+        if provider_id in self.providers_by_id:
+            self.providers_by_id[provider_id].update(updates)
+            if updates.keys() & {"areas", "lat", "lon"}:
+                self._build_provider_indexes()
+            logger.info("Updated provider %s", provider_id)
     
     async def get_providers_by_service(self, service: str) -> List[Dict]:
         """Get providers by service type"""
         service_key = service.lower()
         return self.providers.get(service_key, [])
     
-    async def filter_providers_by_location(self, providers: List[Dict], location: str) -> List[Dict]:
-        """Filter providers by location"""
-        location_lower = location.lower()
-        filtered = []
-        
-        for provider in providers:
-            if any(area.lower() == location_lower for area in provider.get("areas", [])):
-                filtered.append(provider)
+    @tracing.traced("db.get_providers_by_area")
+    async def get_providers_by_area(self, service: str, location: str) -> List[Dict]:
+        """Get providers for a service who cover an area"""
+        service_key = service.lower()
+        providers = self.area_index.get((service_key, location.lower()))
         
         # If no exact match, return all providers (they can travel)
-        return filtered if filtered else providers
\ No newline at end of file
+        return providers if providers else self.providers.get(service_key, [])
+    
+    @tracing.traced("db.get_nearest_providers")
+    async def get_nearest_providers(self, service: str, lat: float, lon: float, k: int,
+                                    max_km: float = None) -> List[Tuple[float, Dict]]:
+        """Get the k providers of a service nearest to a point, as (distance_km, provider)"""
+        index = self.geo_index.get(service.lower())
+        if index is None:
+            return []
+        return index.nearest(lat, lon, k, max_km)
+    
+    async def close(self) -> None:
+        """Release storage resources"""
+        pass
+
+def create_database() -> Database:
+    """Create the storage backend selected by DATABASE_BACKEND"""
+    backend = os.getenv("DATABASE_BACKEND", "memory").lower()
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if backend == "memory" and workers > 1:
+        # Each worker would hold its own sessions and conversations would split between them
+        raise ValueError("DATABASE_BACKEND=memory cannot be shared by multiple workers, use sqlite")
+    if backend == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase()
+    if backend != "memory":
+        raise ValueError(f"Unknown DATABASE_BACKEND: {backend}")
+    return Database()
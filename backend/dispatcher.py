@@ -0,0 +1,178 @@
+from typing import Dict, List, Optional, Any
+from dataclasses import dataclass
+import asyncio
+import os
+import random
+import time
+import logging
+from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TWILIO_LATENCY = metrics.histogram(
+    "groovehire_twilio_request_duration_seconds",
+    "Twilio message send latency"
+)
+TWILIO_ERRORS = metrics.counter(
+    "groovehire_twilio_errors_total",
+    "Twilio send attempts that failed, by HTTP status or network error",
+    ["status"]
+)
+
+@dataclass
+class OutboundMessage:
+    """WhatsApp message waiting to be sent"""
+    to: str
+    body: str
+    sender: str
+    attempts: int = 0
+
+class RateLimiter:
+    """Spaces sends so a sender never exceeds its messages-per-second cap"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        """Wait for the next free send slot"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class MessageDispatcher:
+    """Outbound WhatsApp dispatcher with a shared Twilio client and a bounded work queue"""
+
+    def __init__(self, client: Client = None, sender: str = None, queue_size: int = None,
+                 workers: int = None, rate: float = None, batch_size: int = None,
+                 max_retries: int = None, retry_backoff: float = None):
+        self._client = client
+        self.sender = sender or os.getenv("TWILIO_WHATSAPP_NUMBER")
+        self.queue_size = queue_size or int(os.getenv("DISPATCH_QUEUE_SIZE", 10000))
+        self.worker_count = workers or int(os.getenv("DISPATCH_WORKERS", 4))
+        # Twilio WhatsApp senders default to 80 messages per second
+        self.rate = rate or float(os.getenv("TWILIO_MPS", 80))
+        self.batch_size = batch_size or int(os.getenv("DISPATCH_BATCH_SIZE", 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("DISPATCH_MAX_RETRIES", 3))
+        self.retry_backoff = retry_backoff or float(os.getenv("DISPATCH_RETRY_BACKOFF", 0.5))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._limiters: Dict[str, RateLimiter] = {}
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    @property
+    def client(self) -> Client:
+        """Long-lived Twilio client reused across sends"""
+        if self._client is None:
+            self._client = Client(
+                os.getenv("TWILIO_ACCOUNT_SID"),
+                os.getenv("TWILIO_AUTH_TOKEN")
+            )
+        return self._client
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of messages waiting to be sent"""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        """Start the worker pool"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.worker_count)
+        ]
+        logger.info("Started message dispatcher with %s workers", self.worker_count)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Flush queued messages and stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Dispatcher stopped with %s unsent messages", self.queue_depth)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, phone_number: str, message: str, sender: str = None) -> bool:
+        """Queue a WhatsApp message for delivery without waiting for it to be sent"""
+        self.start()
+        try:
+            self._queue.put_nowait(OutboundMessage(
+                to=phone_number,
+                body=message,
+                sender=sender or self.sender
+            ))
+            self.stats["queued"] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.error("Outbound queue full, dropping message to %s", phone_number)
+            return False
+
+    def _limiter(self, sender: str) -> RateLimiter:
+        """Get the rate limiter for a sender number"""
+        limiter = self._limiters.get(sender)
+        if limiter is None:
+            limiter = RateLimiter(self.rate)
+            self._limiters[sender] = limiter
+        return limiter
+
+    async def _worker(self) -> None:
+        """Take batches off the queue and send them"""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.gather(*[self._deliver(message) for message in batch])
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        """Send one message, retrying transient failures with backoff"""
+        while True:
+            await self._limiter(message.sender).acquire()
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._send, message)
+                TWILIO_LATENCY.observe(time.perf_counter() - started)
+                self.stats["sent"] += 1
+                return
+            except Exception as e:
+                TWILIO_LATENCY.observe(time.perf_counter() - started)
+                TWILIO_ERRORS.inc(str(e.status) if isinstance(e, TwilioRestException) else "network")
+                message.attempts += 1
+                if not self._is_retryable(e) or message.attempts > self.max_retries:
+                    self.stats["failed"] += 1
+                    logger.error("Error sending WhatsApp message to %s: %s", message.to, e)
+                    return
+                self.stats["retried"] += 1
+                delay = self.retry_backoff * (2 ** (message.attempts - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    def _send(self, message: OutboundMessage) -> Any:
+        """Blocking Twilio call, run off the event loop"""
+        return self.client.messages.create(
+            body=message.body,
+            from_=message.sender,
+            to=f"whatsapp:{message.to}"
+        )
+
+    def _is_retryable(self, error: Exception) -> bool:
+        """Retry rate limits, server errors and network failures"""
+        if isinstance(error, TwilioRestException):
+            return error.status == 429 or error.status >= 500
+        return True
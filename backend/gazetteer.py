@@ -0,0 +1,335 @@
+from typing import Dict, List, Optional, Tuple
+import re
+
+# Nairobi neighbourhoods and wider-Kenya towns, with common alternative spellings
+PLACES: Dict[str, List[str]] = {
+    # Nairobi
+    "westlands": ["westland", "westy"],
+    "karen": [],
+    "kilimani": [],
+    "cbd": ["town", "nairobi cbd", "city centre", "city center", "downtown"],
+    "upperhill": ["upper hill"],
+    "lavington": [],
+    "kileleshwa": [],
+    "parklands": [],
+    "eastleigh": [],
+    "kasarani": [],
+    "runda": [],
+    "muthaiga": [],
+    "gigiri": [],
+    "spring valley": [],
+    "riverside": ["riverside drive"],
+    "hurlingham": [],
+    "langata": ["lang'ata"],
+    "south b": [],
+    "south c": [],
+    "embakasi": [],
+    "donholm": [],
+    "buruburu": ["buru buru", "buru"],
+    "umoja": [],
+    "kayole": [],
+    "komarock": [],
+    "pipeline": [],
+    "utawala": [],
+    "ruai": [],
+    "roysambu": [],
+    "zimmerman": [],
+    "githurai": [],
+    "kahawa": ["kahawa west", "kahawa sukari"],
+    "ruaka": [],
+    "banana": ["banana hill"],
+    "kitisuru": [],
+    "loresho": [],
+    "kangemi": [],
+    "kawangware": [],
+    "dagoretti": [],
+    "riruta": [],
+    "kibera": [],
+    "madaraka": [],
+    "nairobi west": [],
+    "industrial area": [],
+    "mombasa road": [],
+    "syokimau": [],
+    "athi river": ["mlolongo"],
+    "kitengela": [],
+    "rongai": ["ongata rongai"],
+    "kiserian": [],
+    "ngong": ["ngong road"],
+    "karen plains": [],
+    "lower kabete": [],
+    "kabete": [],
+    "kikuyu": [],
+    "ngara": [],
+    "pangani": [],
+    "mathare": [],
+    "huruma": [],
+    "kariobangi": [],
+    "dandora": [],
+    "mwiki": [],
+    "thome": [],
+    "garden estate": [],
+    "ridgeways": [],
+    "mirema": [],
+    "lucky summer": [],
+    "baba dogo": [],
+    "allsops": [],
+    "juja": [],
+    "juja farm": [],
+    "thika": [],
+    "ruiru": [],
+    "tatu city": [],
+    "limuru": [],
+    "kiambu": [],
+    "kinoo": [],
+    "uthiru": [],
+    "muthiga": [],
+    "wangige": [],
+    "fedha": [],
+    "tassia": [],
+    "imara daima": [],
+    "nyayo estate": [],
+    "south lands": [],
+    "jamhuri": [],
+    "woodley": [],
+    "adams arcade": [],
+    "yaya": ["yaya centre"],
+    "valley arcade": [],
+    "sarit": ["sarit centre"],
+    "mountain view": [],
+    "two rivers": [],
+    "village market": [],
+    # Wider Kenya
+    "mombasa": [],
+    "nyali": [],
+    "bamburi": [],
+    "likoni": [],
+    "diani": [],
+    "kilifi": [],
+    "malindi": [],
+    "watamu": [],
+    "lamu": [],
+    "voi": [],
+    "kisumu": [],
+    "kakamega": [],
+    "bungoma": [],
+    "busia": [],
+    "kisii": [],
+    "kericho": [],
+    "bomet": [],
+    "migori": [],
+    "homa bay": [],
+    "nakuru": [],
+    "naivasha": [],
+    "gilgil": [],
+    "nyahururu": [],
+    "eldoret": [],
+    "kitale": [],
+    "kapsabet": [],
+    "iten": [],
+    "nanyuki": [],
+    "nyeri": [],
+    "karatina": [],
+    "muranga": ["murang'a"],
+    "embu": [],
+    "meru": [],
+    "isiolo": [],
+    "machakos": [],
+    "kitui": [],
+    "makueni": [],
+    "kajiado": [],
+    "narok": [],
+    "garissa": [],
+    "wajir": [],
+    "mandera": [],
+    "marsabit": [],
+    "lodwar": [],
+    "kakuma": [],
+}
+
+# Display names that are not plain title case
+DISPLAY_NAMES = {"cbd": "CBD"}
+
+# Shortest text accepted as a prefix or fuzzy match, short words are too ambiguous
+MIN_PREFIX_LENGTH = 4
+MIN_FUZZY_LENGTH = 5
+# Share of the place name a prefix must cover; "park" is a word, not Parklands
+MIN_PREFIX_COVERAGE = 0.6
+# Everyday words that begin place names, never taken as a prefix of one
+PREFIX_STOPWORDS = {
+    "park", "lower", "village", "west", "south", "mountain", "garden", "river", "valley",
+    "spring", "industrial", "lucky", "tatu", "baba",
+}
+
+_MULTIPLE = object()
+
+class _TrieNode:
+    __slots__ = ("children", "place", "unique", "shortest")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Canonical place when a name ends here
+        self.place: Optional[str] = None
+        # Canonical place when every name below this node is the same place
+        self.unique = None
+        # Length of the shortest name below this node
+        self.shortest = 0
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance"""
+    # Shared prefixes and suffixes never add to the distance, trim them before the DP
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+def _deletes(word: str, depth: int) -> set:
+    """Every string reachable from word by removing up to depth characters"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {
+            variant[:i] + variant[i + 1:]
+            for variant in frontier
+            for i in range(len(variant))
+        }
+        variants |= frontier
+    return variants
+
+class DeleteIndex:
+    """Symmetric-delete index for bounded edit-distance lookups
+
+    Two strings within edit distance d share a variant obtained by deleting at
+    most d characters from each, so a lookup is a handful of dict probes plus
+    an exact check of the few candidates they return.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._variants: Dict[str, List[str]] = {}
+
+    def add(self, word: str) -> None:
+        for variant in _deletes(word, self.max_distance):
+            self._variants.setdefault(variant, []).append(word)
+
+    def search(self, word: str, max_distance: int) -> Optional[Tuple[int, str]]:
+        """Closest (distance, name) within max_distance, or None"""
+        best = None
+        checked = set()
+        for variant in _deletes(word, min(max_distance, self.max_distance)):
+            for name in self._variants.get(variant, ()):
+                if name in checked:
+                    continue
+                checked.add(name)
+                distance = edit_distance(word, name)
+                if distance <= max_distance and (best is None or distance < best[0]):
+                    best = (distance, name)
+        return best
+
+class Gazetteer:
+    """Finds a known place in a message by exact, prefix or fuzzy match
+
+    A prefix only counts when it names a single place, covers most of its
+    name and is not an everyday word, so "westl" is Westlands but "near the
+    park" is not Parklands.
+    """
+
+    def __init__(self, places: Dict[str, List[str]] = None):
+        places = PLACES if places is None else places
+        self._root = _TrieNode()
+        self._names: Dict[str, str] = {}
+        self._fuzzy = DeleteIndex()
+
+        for place, aliases in places.items():
+            for name in [place] + aliases:
+                name = self._normalize(name)
+                self._names[name] = place
+                self._insert(name, place)
+                self._fuzzy.add(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _normalize(self, text: str) -> str:
+        return " ".join(re.findall(r"[a-z0-9]+", text.lower().replace("'", "")))
+
+    def _insert(self, name: str, place: str) -> None:
+        node = self._root
+        for char in name:
+            self._mark(node, place, len(name))
+            node = node.children.setdefault(char, _TrieNode())
+        self._mark(node, place, len(name))
+        node.place = place
+
+    def _mark(self, node: _TrieNode, place: str, length: int) -> None:
+        node.unique = place if node.unique in (None, place) else _MULTIPLE
+        node.shortest = min(node.shortest, length) if node.shortest else length
+
+    def display_name(self, place: str) -> str:
+        return DISPLAY_NAMES.get(place, place.title())
+
+    def find(self, message: str) -> Optional[str]:
+        """Display name of the place mentioned in a message, or None"""
+        place = self.lookup(message)
+        return self.display_name(place) if place else None
+
+    def lookup(self, message: str) -> Optional[str]:
+        """Canonical name of the place mentioned in a message, or None"""
+        text = self._normalize(message)
+        if not text:
+            return None
+
+        starts = [0] + [i + 1 for i, char in enumerate(text) if char == " "]
+        prefix_match = None
+
+        # Walk the trie once from each word start; exact matches win straight away
+        for start in starts:
+            node = self._root
+            exact = None
+            i = start
+            while i < len(text) and text[i] in node.children:
+                node = node.children[text[i]]
+                i += 1
+                at_boundary = i == len(text) or text[i] == " "
+                if at_boundary and node.place:
+                    exact = node.place
+                elif (at_boundary and prefix_match is None and node.unique not in (None, _MULTIPLE)
+                        and i - start >= max(MIN_PREFIX_LENGTH, MIN_PREFIX_COVERAGE * node.shortest)
+                        and text[start:i] not in PREFIX_STOPWORDS):
+                    prefix_match = node.unique
+            if exact:
+                return exact
+
+        if prefix_match:
+            return prefix_match
+
+        # Bounded edit distance over single words and adjacent pairs
+        words = text.split(" ")
+        candidates = [(word, 1 if len(word) < 9 else 2) for word in words]
+        candidates += [(f"{a} {b}", 1) for a, b in zip(words, words[1:])]
+        best = None
+        for candidate, max_distance in candidates:
+            if len(candidate) < MIN_FUZZY_LENGTH:
+                continue
+            found = self._fuzzy.search(candidate, max_distance)
+            if found and (best is None or found[0] < best[0]):
+                best = found
+        return self._names[best[1]] if best else None
@@ -0,0 +1,129 @@
+from typing import Dict, List, Optional, Tuple, Any
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+# Approximate centroids of the areas the bot understands
+AREA_CENTROIDS: Dict[str, Tuple[float, float]] = {
+    "westlands": (-1.2676, 36.8108),
+    "karen": (-1.3197, 36.7076),
+    "kilimani": (-1.2906, 36.7832),
+    "cbd": (-1.2864, 36.8172),
+    "upperhill": (-1.2985, 36.8147),
+    "lavington": (-1.2793, 36.7702),
+    "kileleshwa": (-1.2815, 36.7830),
+    "parklands": (-1.2625, 36.8178),
+    "eastleigh": (-1.2747, 36.8494),
+    "kasarani": (-1.2212, 36.8970),
+    "thika": (-1.0333, 37.0693),
+    "ngong": (-1.3617, 36.6553),
+    "runda": (-1.2178, 36.8090),
+    "muthaiga": (-1.2467, 36.8344),
+    "gigiri": (-1.2331, 36.8056),
+    "spring valley": (-1.2473, 36.7908),
+    "riverside": (-1.2699, 36.8012),
+}
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def nearest_area(lat: float, lon: float, max_km: float = 5.0) -> Optional[str]:
+    """Name of the closest known area centroid, if one is within max_km"""
+    best = min(
+        AREA_CENTROIDS.items(),
+        key=lambda item: haversine_km(lat, lon, item[1][0], item[1][1])
+    )
+    if haversine_km(lat, lon, best[1][0], best[1][1]) <= max_km:
+        return best[0]
+    return None
+
+class GridIndex:
+    """Uniform lat/lon grid answering k-nearest queries by searching rings of cells"""
+
+    def __init__(self, cell_km: float = 1.0):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Any]]] = {}
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+
+    def __len__(self) -> int:
+        return sum(len(points) for points in self._cells.values())
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def insert(self, lat: float, lon: float, item: Any) -> None:
+        """Add an item at a coordinate"""
+        row, col = self._cell(lat, lon)
+        self._cells.setdefault((row, col), []).append((lat, lon, item))
+        if self._bounds is None:
+            self._bounds = (row, row, col, col)
+        else:
+            min_row, max_row, min_col, max_col = self._bounds
+            self._bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def _ring(self, row: int, col: int, radius: int) -> List[Tuple[int, int]]:
+        """Cells exactly `radius` steps away from (row, col)"""
+        if radius == 0:
+            return [(row, col)]
+        cells = []
+        for d_col in range(-radius, radius + 1):
+            cells.append((row - radius, col + d_col))
+            cells.append((row + radius, col + d_col))
+        for d_row in range(-radius + 1, radius):
+            cells.append((row + d_row, col - radius))
+            cells.append((row + d_row, col + radius))
+        return cells
+
+    def nearest(self, lat: float, lon: float, k: int, max_km: float = None) -> List[Tuple[float, Any]]:
+        """Up to k (distance_km, item) pairs closest to a point, nearest first"""
+        if self._bounds is None or k <= 0:
+            return []
+
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_radius = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        # Longitude cells narrow away from the equator
+        ring_km = self.cell_km * max(math.cos(math.radians(lat)), 0.01)
+
+        # Equirectangular distance is accurate at city scale and much cheaper than
+        # haversine, so candidates are compared on it and only the winners are refined
+        lon_scale = math.cos(math.radians(lat))
+
+        # Max-heap of the best k seen so far, as (-squared distance, tiebreak, lat, lon, item)
+        best: List[Tuple[float, int, float, float, Any]] = []
+        max_sq = (max_km / KM_PER_DEGREE) ** 2 if max_km is not None else math.inf
+        for radius in range(max_radius + 1):
+            # Anything in this ring or beyond is at least this far away
+            ring_min_km = max(radius - 1, 0) * ring_km
+            if max_km is not None and ring_min_km > max_km:
+                break
+            if len(best) == k and (ring_min_km / KM_PER_DEGREE) ** 2 > -best[0][0]:
+                break
+
+            for cell in self._ring(row, col, radius):
+                for point_lat, point_lon, item in self._cells.get(cell, ()):
+                    d_lat = point_lat - lat
+                    d_lon = (point_lon - lon) * lon_scale
+                    distance_sq = d_lat * d_lat + d_lon * d_lon
+                    if distance_sq > max_sq:
+                        continue
+                    entry = (-distance_sq, id(item), point_lat, point_lon, item)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif distance_sq < -best[0][0]:
+                        heapq.heapreplace(best, entry)
+
+        best.sort(reverse=True)
+        return [
+            (haversine_km(lat, lon, point_lat, point_lon), item)
+            for _, _, point_lat, point_lon, item in best
+        ]
@@ -0,0 +1,60 @@
+from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
+import asyncio
+import os
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class AsyncHTTPClient:
+    """Shared async HTTP client with a keep-alive pool and per-host concurrency limits"""
+
+    def __init__(self, max_connections: int = None, max_per_host: int = None, timeout: float = None):
+        self.max_connections = max_connections or int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+        self.max_per_host = max_per_host or int(os.getenv("HTTP_MAX_PER_HOST", 20))
+        self.timeout = timeout or float(os.getenv("HTTP_TIMEOUT", 30))
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled client on first use"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Get the concurrency limit for the host of a URL"""
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self.max_per_host)
+            self._host_limits[host] = limit
+        return limit
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a request through the shared pool"""
+        async with self._host_limit(url):
+            return await self._get_client().request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a GET request"""
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """Send a POST request"""
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self) -> None:
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("Closed HTTP client pool")
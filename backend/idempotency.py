@@ -0,0 +1,116 @@
+from typing import Any, Awaitable, Callable, Optional
+from collections import OrderedDict
+import asyncio
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyCache:
+    """Bounded, time-expiring cache of results keyed by a request id
+
+    The first request for a key runs the operation; duplicates, including ones
+    arriving while it is still running, get the same result without running it
+    again. Entries are kept in insertion order, so expiry and the size cap
+    always drop from the front.
+
+    On its own the cache only sees requests that reach this process, so it
+    only holds with a single worker. Given a shared store (the SQLite
+    backend), request ids are also recorded there with their results, and a
+    duplicate reaching another worker or arriving after a restart replays the
+    stored result. Results must then be JSON serialisable.
+    """
+
+    def __init__(self, max_entries: int = None, ttl: float = None, store=None,
+                 namespace: str = "", claim_timeout: float = None):
+        self.max_entries = max_entries or int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 100000))
+        self.ttl = ttl or float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 3600))
+        # Shared record of handled ids, with claim_request/complete_request/release_request/request_result
+        self.store = store
+        self.namespace = namespace
+        # A request claimed by a worker that has not finished after this long is taken over
+        self.claim_timeout = claim_timeout or float(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", 60))
+
+        # key -> (stored at, future holding the result)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        self._sweep(time.monotonic())
+        return key in self._entries
+
+    async def run(self, key: Optional[str], operation: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an operation once per key and replay its result for duplicates"""
+        if not key:
+            return await operation()
+
+        now = time.monotonic()
+        self._sweep(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            logger.info("Replaying result for duplicate request %s", key)
+            return await asyncio.shield(entry[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (now, future)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+        try:
+            if self.store is None:
+                self.stats["misses"] += 1
+                result = await operation()
+            else:
+                result = await self._run_shared(key, operation)
+        except BaseException as e:
+            # Failed requests are not remembered, so a retry runs them again
+            if self._entries.get(key, (None, None))[1] is future:
+                del self._entries[key]
+            future.set_exception(e)
+            # Nobody else may be waiting on the future, don't log it as unretrieved
+            future.exception()
+            raise
+        future.set_result(result)
+        return result
+
+    async def _run_shared(self, key: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        """Run an operation unless another worker has, or is, handling the same key"""
+        shared_key = f"{self.namespace}:{key}"
+        delay = 0.01
+        while not await self.store.claim_request(shared_key, self.ttl, self.claim_timeout):
+            stored = await self.store.request_result(shared_key)
+            if stored is not None and stored[0]:
+                self.stats["hits"] += 1
+                logger.info("Replaying stored result for duplicate request %s", key)
+                return stored[1]
+            # Still running in another worker, or released after failing; ask again shortly
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        self.stats["misses"] += 1
+        try:
+            result = await operation()
+        except BaseException:
+            await self.store.release_request(shared_key)
+            raise
+        try:
+            await self.store.complete_request(shared_key, result)
+        except Exception as e:
+            # The operation ran; this process still replays it, others may run it again
+            logger.warning("Could not record result of request %s: %s", key, e)
+        return result
+
+    def _sweep(self, now: float) -> None:
+        """Drop entries older than the TTL from the front of the cache"""
+        while self._entries:
+            key, (stored_at, _) = next(iter(self._entries.items()))
+            if now - stored_at <= self.ttl:
+                return
+            del self._entries[key]
+            self.stats["expired"] += 1
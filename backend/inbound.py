@@ -0,0 +1,88 @@
+from typing import List, Optional, Callable, Awaitable
+from dataclasses import dataclass
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class InboundMessage:
+    """WhatsApp message accepted by the webhook and waiting to be handled"""
+    phone_number: str
+    body: str
+    profile_name: Optional[str] = None
+    message_sid: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+class InboundQueue:
+    """Bounded queue of inbound messages handled by a background worker pool
+
+    Lets the webhook acknowledge Twilio straight away; the handler is
+    responsible for delivering the reply through the outbound API.
+    """
+
+    def __init__(self, handler: Callable[[InboundMessage], Awaitable[None]],
+                 queue_size: int = None, workers: int = None):
+        self.handler = handler
+        self.queue_size = queue_size or int(os.getenv("INBOUND_QUEUE_SIZE", 10000))
+        self.worker_count = workers or int(os.getenv("INBOUND_WORKERS", 32))
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.stats = {"queued": 0, "handled": 0, "failed": 0, "rejected": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of messages waiting for a worker"""
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self) -> None:
+        """Start the worker pool"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.worker_count)
+        ]
+        logger.info("Started inbound queue with %s workers", self.worker_count)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Finish queued messages and stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Inbound queue stopped with %s unhandled messages", self.queue_depth)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def enqueue(self, message: InboundMessage) -> bool:
+        """Queue a message for background handling, False when the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+            self.stats["queued"] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            logger.warning("Inbound queue full, message from %s not queued", message.phone_number)
+            return False
+
+    async def _worker(self) -> None:
+        """Hand queued messages to the handler one at a time"""
+        while True:
+            message = await self._queue.get()
+            try:
+                await self.handler(message)
+                self.stats["handled"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error("Error handling message from %s: %s", message.phone_number, e)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,49 @@
+from typing import Collection, Dict, List, Optional, Tuple
+import re
+
+class IntentMatcher:
+    """Classifies a message against keyword tables with a single compiled regex
+
+    Keywords match whole words, allowing a plural "s" or "es", so "car" does
+    not match "carpet". A keyword ending in "*" is a stem and matches any word
+    starting with it, so "plumb*" matches "plumber" and "plumbing".
+
+    Every category is scored in one pass. Weak keywords, generic words such
+    as "house" or "water", score 1 and every other keyword scores 2, so
+    "house wiring" is electrical work. The highest score wins and ties go to
+    the category mentioned first.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], weak: Collection[str] = ()):
+        weak = {word.lower() for word in weak}
+        terms: Dict[str, str] = {}
+        for intent, words in keywords.items():
+            for word in words:
+                terms.setdefault(word.lower(), intent)
+
+        # Longest first so "car repair" wins over "car"
+        alternatives = sorted(terms, key=len, reverse=True)
+        # Group n of the pattern is alternatives[n - 1]
+        self._groups: List[Optional[Tuple[str, int]]] = [None] + [
+            (terms[word], 1 if word.rstrip("*") in weak else 2)
+            for word in alternatives
+        ]
+        self._pattern = re.compile(
+            r"\b(?:" + "|".join(
+                f"({re.escape(word[:-1])}\\w*)" if word.endswith("*") else f"({re.escape(word)}(?:e?s)?)"
+                for word in alternatives
+            ) + r")\b"
+        )
+
+    def match(self, message: str) -> Optional[str]:
+        """Best matching intent for a message, or None"""
+        scores: Dict[str, int] = {}
+        first_seen: Dict[str, int] = {}
+        for found in self._pattern.finditer(message.lower()):
+            intent, weight = self._groups[found.lastindex]
+            scores[intent] = scores.get(intent, 0) + weight
+            first_seen.setdefault(intent, found.start())
+
+        if not scores:
+            return None
+        return min(scores, key=lambda intent: (-scores[intent], first_seen[intent]))
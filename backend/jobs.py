@@ -0,0 +1,236 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    locked_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_run_at ON jobs (run_at);
+CREATE TABLE IF NOT EXISTS dead_jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+INSERT_JOB = "INSERT INTO jobs (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)"
+# Claimed jobs are leased, so a worker that dies mid-job leaves it for another to pick up
+CLAIM_JOBS = (
+    "UPDATE jobs SET locked_until = ?, attempts = attempts + 1 WHERE id IN ("
+    "SELECT id FROM jobs WHERE run_at <= ? AND locked_until <= ? ORDER BY run_at LIMIT ?"
+    ") RETURNING id, kind, payload, attempts"
+)
+DELETE_JOB = "DELETE FROM jobs WHERE id = ?"
+RETRY_JOB = "UPDATE jobs SET run_at = ?, locked_until = 0, last_error = ? WHERE id = ?"
+BURY_JOB = (
+    "INSERT OR REPLACE INTO dead_jobs (id, kind, payload, attempts, last_error, created_at, failed_at) "
+    "SELECT id, kind, payload, attempts, ?, created_at, ? FROM jobs WHERE id = ?"
+)
+COUNT_JOBS = "SELECT (SELECT COUNT(*) FROM jobs), (SELECT COUNT(*) FROM dead_jobs)"
+
+class JobQueue:
+    """Durable SQLite-backed job queue with retries, backoff and a dead-letter table
+
+    Jobs are committed before enqueue returns and are processed at least once
+    by a pool of workers. A job whose handler raises is retried with
+    exponential backoff and moved to dead_jobs after max_attempts.
+    """
+
+    def __init__(self, path: str = None, workers: int = None, max_attempts: int = None,
+                 retry_backoff: float = None, lease: float = None, poll_interval: float = None):
+        self.path = path or os.getenv("JOBS_PATH", "jobs.db")
+        self.worker_count = workers or int(os.getenv("JOBS_WORKERS", 8))
+        self.max_attempts = max_attempts or int(os.getenv("JOBS_MAX_ATTEMPTS", 5))
+        self.retry_backoff = retry_backoff or float(os.getenv("JOBS_RETRY_BACKOFF", 2.0))
+        # How long a claimed job stays invisible to other workers
+        self.lease = lease or float(os.getenv("JOBS_LEASE_SECONDS", 300))
+        # How often due retries are looked for when nothing new arrives
+        self.poll_interval = poll_interval or float(os.getenv("JOBS_POLL_INTERVAL", 1.0))
+
+        self._handlers: Dict[str, JobHandler] = {}
+        # One thread owns the connection, so every statement runs in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self.stats = {"enqueued": 0, "completed": 0, "retried": 0, "dead": 0}
+
+        self._executor.submit(self._open).result()
+
+    def _open(self) -> None:
+        self._connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.executescript(SCHEMA)
+
+    async def _execute(self, function: Callable, *args: Any) -> Any:
+        """Run a blocking database call on the queue's thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Route jobs of a kind to a handler"""
+        self._handlers[kind] = handler
+
+    async def enqueue(self, kind: str, payload: Dict) -> int:
+        """Persist a job and return its id once committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((kind, json.dumps(payload), future))
+        # Jobs arriving while a commit is running are grouped into the next one
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        job_id = await future
+        self.stats["enqueued"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return job_id
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                try:
+                    job_ids = await self._execute(self._insert_batch, [(kind, payload) for kind, payload, _ in batch])
+                except Exception as e:
+                    logger.error("Error persisting %s jobs: %s", len(batch), e)
+                    for _, _, future in batch:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), job_id in zip(batch, job_ids):
+                    future.set_result(job_id)
+        finally:
+            self._flush_task = None
+
+    def _insert_batch(self, jobs: List[Tuple[str, str]]) -> List[int]:
+        now = time.time()
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            job_ids = [
+                self._connection.execute(INSERT_JOB, (kind, payload, now, now)).lastrowid
+                for kind, payload in jobs
+            ]
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+        return job_ids
+
+    def start(self) -> None:
+        """Start processing jobs"""
+        if self._runner is not None:
+            return
+        self._wake = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+        logger.info("Started job queue with %s workers", self.worker_count)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop claiming jobs and wait for the ones in progress"""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+        if self._running:
+            # Unfinished jobs stay leased and are picked up again after a restart
+            await asyncio.wait(self._running, timeout=timeout)
+
+    async def close(self) -> None:
+        """Stop the workers, commit queued jobs and close the database"""
+        await self.stop()
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._execute(self._connection.close)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self) -> None:
+        """Claim due jobs while workers are free"""
+        while True:
+            self._wake.clear()
+            free = self.worker_count - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await self._execute(self._claim, free)
+                except Exception as e:
+                    logger.error("Error claiming jobs: %s", e)
+            for job in jobs:
+                task = asyncio.create_task(self._process(*job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if len(jobs) < free or free <= 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _claim(self, limit: int) -> List[Tuple[int, str, str, int]]:
+        now = time.time()
+        return self._connection.execute(CLAIM_JOBS, (now + self.lease, now, now, limit)).fetchall()
+
+    async def _process(self, job_id: int, kind: str, payload: str, attempts: int) -> None:
+        """Run one job and record the outcome"""
+        try:
+            handler = self._handlers.get(kind)
+            if handler is None:
+                raise LookupError(f"No handler for job kind {kind}")
+            await handler(json.loads(payload))
+        except Exception as e:
+            await self._fail(job_id, kind, attempts, e)
+        else:
+            await self._execute(self._connection.execute, DELETE_JOB, (job_id,))
+            self.stats["completed"] += 1
+        finally:
+            # A worker is free again
+            self._wake.set()
+
+    async def _fail(self, job_id: int, kind: str, attempts: int, error: Exception) -> None:
+        if attempts >= self.max_attempts:
+            logger.error("Job %s (%s) failed %s times, moving to dead letters: %s", job_id, kind, attempts, error)
+            await self._execute(self._bury, job_id, str(error))
+            self.stats["dead"] += 1
+            return
+        delay = self.retry_backoff * (2 ** (attempts - 1))
+        delay += random.uniform(0, delay / 2)
+        logger.warning("Job %s (%s) failed, retrying in %.1fs: %s", job_id, kind, delay, error)
+        await self._execute(self._connection.execute, RETRY_JOB, (time.time() + delay, str(error), job_id))
+        self.stats["retried"] += 1
+
+    def _bury(self, job_id: int, error: str) -> None:
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            self._connection.execute(BURY_JOB, (error, time.time(), job_id))
+            self._connection.execute(DELETE_JOB, (job_id,))
+        except Exception:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    async def counts(self) -> Dict[str, int]:
+        """Jobs waiting or in progress, and dead letters"""
+        pending, dead = await self._execute(lambda: self._connection.execute(COUNT_JOBS).fetchone())
+        return {"pending": pending, "dead": dead}
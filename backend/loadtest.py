@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Load test for the GrooveHire bot
+
+Simulates concurrent users replaying conversation flows, either straight
+through GrooveHireBot.process_message or over HTTP against
+/webhook/whatsapp, with M-Pesa and Twilio stubbed out. Reports throughput,
+per-state latency percentiles and memory growth, and writes the results as
+JSON so runs can be compared between releases.
+
+    python loadtest.py --users 1000 --mode both --mix booking=70,browse=20,confused=10
+    python loadtest.py --baseline loadtest_results/previous.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import resource
+import socket
+import subprocess
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACloadtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "loadtest")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+import httpx
+from bot_logic import GrooveHireBot
+from database import Database
+from models import SessionState
+
+# Conversation flows as (state the message is sent in, message)
+FLOWS: Dict[str, List[Tuple[SessionState, str]]] = {
+    "booking": [
+        (SessionState.WELCOME, "Hi"),
+        (SessionState.SERVICE_SELECTION, "my kitchen tap is leaking"),
+        (SessionState.LOCATION_REQUEST, "Westlands"),
+        (SessionState.PROVIDER_SELECTION, "1"),
+        (SessionState.BOOKING_DETAILS, "Fix a leaking tap tomorrow morning"),
+        (SessionState.PAYMENT, "PAY"),
+    ],
+    "browse": [
+        (SessionState.WELCOME, "Hello"),
+        (SessionState.SERVICE_SELECTION, "2"),
+        (SessionState.LOCATION_REQUEST, "Kilimani"),
+    ],
+    "confused": [
+        (SessionState.WELCOME, "Habari"),
+        (SessionState.SERVICE_SELECTION, "can you help"),
+        (SessionState.SERVICE_SELECTION, "nataka usafi wa nyumba"),
+        (SessionState.LOCATION_REQUEST, "near the big tree"),
+        (SessionState.LOCATION_REQUEST, "lavingtn"),
+        (SessionState.PROVIDER_SELECTION, "the cheap one"),
+        (SessionState.PROVIDER_SELECTION, "2"),
+        (SessionState.BOOKING_DETAILS, "Deep clean a 3 bedroom house on Saturday"),
+        (SessionState.PAYMENT, "BACK"),
+    ],
+}
+
+DEFAULT_MIX = "booking=60,browse=25,confused=15"
+
+class StubDispatcher:
+    """Counts outbound WhatsApp messages instead of calling Twilio"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def enqueue(self, phone_number: str, message: str, sender: str = None) -> bool:
+        self.sent += 1
+        return True
+
+def stub_payments(bot: GrooveHireBot, latency: float) -> None:
+    """Replace the M-Pesa STK push with a fixed-latency stand-in"""
+    pushes = iter(range(1, sys.maxsize))
+
+    async def initiate_stk_push(phone_number: str, amount: int, reference: str) -> Dict:
+        if latency:
+            await asyncio.sleep(latency)
+        return {"success": True, "checkout_request_id": f"ws_CO_LOAD{next(pushes)}"}
+
+    bot.payment_service.initiate_stk_push = initiate_stk_push
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse flow=weight pairs"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in FLOWS:
+            raise ValueError(f"Unknown flow {name}, choose from {', '.join(FLOWS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def assign_flows(users: int, mix: Dict[str, float], seed: int) -> List[str]:
+    """Pick a flow for every simulated user"""
+    rng = random.Random(seed)
+    names = list(mix)
+    return rng.choices(names, weights=[mix[name] for name in names], k=users)
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+async def replay(flows: List[str], send, think_time: float) -> Tuple[Dict[str, List[float]], int, float]:
+    """Run every user's flow concurrently, timing each message by the state it was sent in"""
+    latencies: Dict[str, List[float]] = {}
+    errors = 0
+
+    async def user(index: int, flow: str) -> None:
+        nonlocal errors
+        phone = f"+2547{index:08d}"
+        for state, message in FLOWS[flow]:
+            started = time.perf_counter()
+            try:
+                await send(phone, message)
+            except Exception:
+                errors += 1
+                return
+            latencies.setdefault(state.name, []).append(time.perf_counter() - started)
+            if think_time:
+                await asyncio.sleep(random.uniform(0, think_time))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i, flow) for i, flow in enumerate(flows)))
+    return latencies, errors, time.perf_counter() - started
+
+def report(name: str, latencies: Dict[str, List[float]], errors: int, elapsed: float,
+           rss_before: int, rss_after: int, sessions: int) -> Dict:
+    """Summarize one run and print it"""
+    everything = [value for values in latencies.values() for value in values]
+    result = {
+        "messages": len(everything),
+        "errors": errors,
+        "duration_s": round(elapsed, 3),
+        "throughput_mps": round(len(everything) / elapsed, 1),
+        "latency": summarize(everything),
+        "states": {
+            state.name: summarize(latencies[state.name])
+            for state in SessionState if state.name in latencies
+        },
+        "memory": {
+            "peak_rss_before_kb": rss_before,
+            "peak_rss_after_kb": rss_after,
+            "growth_kb": rss_after - rss_before,
+            "sessions": sessions,
+            "bytes_per_session": round((rss_after - rss_before) * 1024 / sessions) if sessions else 0,
+        },
+    }
+
+    print(f"\n📈 {name}: {result['messages']:,} messages in {elapsed:.2f}s, "
+          f"{result['throughput_mps']:,.0f} messages/s, {errors} errors")
+    for state, stats in result["states"].items():
+        print(f"   {state:<20} n={stats['count']:<6} p50 {stats['p50_ms']:7.2f} ms"
+              f"   p95 {stats['p95_ms']:7.2f} ms   p99 {stats['p99_ms']:7.2f} ms")
+    memory = result["memory"]
+    print(f"   memory: peak RSS +{memory['growth_kb'] / 1024:.1f} MiB for {sessions:,} sessions")
+    return result
+
+async def run_direct(flows: List[str], options: argparse.Namespace) -> Dict:
+    """Drive GrooveHireBot.process_message in process"""
+    rss_before = peak_rss_kb()
+    db = Database()
+    bot = GrooveHireBot(db, StubDispatcher())
+    stub_payments(bot, options.mpesa_latency)
+
+    async def send(phone: str, message: str) -> None:
+        await bot.process_message(phone, message, "Load User")
+
+    latencies, errors, elapsed = await replay(flows, send, options.think_time)
+    return report("direct", latencies, errors, elapsed, rss_before, peak_rss_kb(), len(db.user_sessions))
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def serve_http(port: int, options: argparse.Namespace, server_stats) -> None:
+    """Run the app with stubbed M-Pesa and Twilio, reporting its memory on shutdown"""
+    import uvicorn
+    import main
+
+    logging.disable(logging.WARNING)
+    main.bot.dispatcher = StubDispatcher()
+    main.FAST_ACK = options.fast_ack
+    stub_payments(main.bot, options.mpesa_latency)
+
+    rss_before = peak_rss_kb()
+    # Returns once terminated
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server_stats.put({"rss_before": rss_before, "rss_after": peak_rss_kb(), "sessions": len(main.db.user_sessions)})
+
+async def run_http(flows: List[str], options: argparse.Namespace) -> Dict:
+    """Drive /webhook/whatsapp on a local uvicorn server"""
+    # The server runs in its own process so the load generator does not compete with it for the GIL
+    port = free_port()
+    server_stats = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve_http, args=(port, options, server_stats))
+    server.start()
+
+    limits = httpx.Limits(max_connections=options.connections, max_keepalive_connections=options.connections)
+    # httpcore rescans its whole wait list per request, keep the backlog in our own queue instead
+    in_flight = asyncio.Semaphore(options.connections)
+    message_ids = iter(range(1, sys.maxsize))
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        while True:
+            try:
+                await client.get("/")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+
+        async def send(phone: str, message: str) -> None:
+            async with in_flight:
+                response = await client.post("/webhook/whatsapp", data={
+                    "From": f"whatsapp:{phone}",
+                    "Body": message,
+                    "ProfileName": "Load User",
+                    "MessageSid": f"SMLOAD{next(message_ids)}",
+                })
+            response.raise_for_status()
+
+        latencies, errors, elapsed = await replay(flows, send, options.think_time)
+
+    server.terminate()
+    stats = await asyncio.to_thread(server_stats.get, timeout=30)
+    server.join()
+    return report("http", latencies, errors, elapsed, stats["rss_before"], stats["rss_after"], stats["sessions"])
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions beyond the tolerance against a baseline results file"""
+    regressions = []
+    for mode, run in results["runs"].items():
+        previous = baseline.get("runs", {}).get(mode)
+        if not previous:
+            continue
+        if run["throughput_mps"] < previous["throughput_mps"] * (1 - tolerance):
+            regressions.append(f"{mode} throughput {previous['throughput_mps']:,.0f} -> {run['throughput_mps']:,.0f} messages/s")
+        for state, stats in run["states"].items():
+            before = previous["states"].get(state)
+            if before and stats["p99_ms"] > before["p99_ms"] * (1 + tolerance):
+                regressions.append(f"{mode} {state} p99 {before['p99_ms']:.2f} -> {stats['p99_ms']:.2f} ms")
+    return regressions
+
+async def run(options: argparse.Namespace) -> Dict:
+    flows = assign_flows(options.users, parse_mix(options.mix), options.seed)
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "config": {
+            "users": options.users,
+            "mix": options.mix,
+            "think_time": options.think_time,
+            "mpesa_latency": options.mpesa_latency,
+            "fast_ack": options.fast_ack,
+            "seed": options.seed,
+        },
+        "runs": {},
+    }
+    if options.mode in ("direct", "both"):
+        results["runs"]["direct"] = await run_direct(flows, options)
+    if options.mode in ("http", "both"):
+        results["runs"]["http"] = await run_http(flows, options)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="GrooveHire load test")
+    parser.add_argument("--users", type=int, default=500, help="concurrent simulated users")
+    parser.add_argument("--mode", choices=["direct", "http", "both"], default="both")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"flow weights, from {', '.join(FLOWS)}")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between a user's messages, seconds")
+    parser.add_argument("--mpesa-latency", type=float, default=0.2, help="stubbed STK push latency, seconds")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP client connection pool size")
+    parser.add_argument("--fast-ack", action="store_true", help="run the webhook in fast-ack mode")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="results file, defaults to loadtest_results/<timestamp>.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression against the baseline")
+    options = parser.parse_args()
+
+    print(f"🚦 Load testing GrooveHire with {options.users:,} users ({options.mix})...")
+    logging.disable(logging.WARNING)
+    results = asyncio.run(run(options))
+    logging.disable(logging.NOTSET)
+
+    output = options.output or os.path.join(
+        "loadtest_results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            regressions = compare(results, json.load(f), options.tolerance)
+        if regressions:
+            print("\n⚠️  Regressions against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+from typing import Dict, List, Optional, TextIO
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+# The webhook logs two INFO records per message; keep 1% of them unless LOG_SAMPLE_RATES says otherwise
+DEFAULT_SAMPLE_RATES = "main=0.01"
+
+def _extra_fields(record: logging.LogRecord) -> Dict:
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES}
+
+class TextFormatter(logging.Formatter):
+    """Plain text with fields passed through extra= appended as key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in extra.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including fields passed through extra="""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RedactionFilter(logging.Filter):
+    """Replace message bodies passed as extra fields with their length"""
+
+    def __init__(self, fields=("body", "reply")):
+        super().__init__()
+        self.fields = tuple(fields)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for field in self.fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                setattr(record, field, f"[redacted {len(str(value))} chars]")
+        return True
+
+class LevelSampler:
+    """Level check for a logger that lets through a fraction of records below WARNING
+
+    Installed as the logger's isEnabledFor, so sampled-out calls return
+    before a LogRecord is created, which is most of the cost of a logging
+    call. Warnings and errors are always kept.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        self.logger = logger
+        self.rate = rate
+
+    def __call__(self, level: int) -> bool:
+        if level < logging.WARNING and random.random() >= self.rate:
+            return False
+        return logging.Logger.isEnabledFor(self.logger, level)
+
+def apply_sampling(rates: Dict[str, float]) -> None:
+    """Sample the named loggers and their existing children, e.g. {"database": 0.01}"""
+    clear_sampling()
+    for name, rate in rates.items():
+        names = [name] + [child for child in logging.root.manager.loggerDict if child.startswith(name + ".")]
+        for logger_name in names:
+            logger = logging.getLogger(logger_name)
+            logger.isEnabledFor = LevelSampler(logger, rate)
+            _sampled_loggers.append(logger)
+
+def clear_sampling() -> None:
+    """Restore the normal level check on sampled loggers"""
+    while _sampled_loggers:
+        del _sampled_loggers.pop().isEnabledFor
+
+class BackgroundQueueHandler(QueueHandler):
+    """Queue records unformatted so formatting happens on the listener thread
+
+    The standard QueueHandler merges the message and arguments before
+    queueing, which is the work lazy formatting is meant to avoid on the
+    event loop. Callers only pass immutable values or values they no longer
+    change, so records can be queued as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "main=0.1,database=0.01" into per-logger rates"""
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+_listener: Optional[QueueListener] = None
+_sampled_loggers: List[logging.Logger] = []
+
+def configure_logging(level: str = None, json_format: bool = None, sample_rates: Dict[str, float] = None,
+                      redact: bool = None, stream: TextIO = None) -> QueueListener:
+    """Route all logging through a queue to a writer thread
+
+    Replaces the root logger's handlers. Records are sampled before they are
+    created; redaction, formatting and the write happen on the listener thread.
+    """
+    global _listener
+    stop_logging()
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "text").lower() == "json"
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES))
+    if redact is None:
+        redact = os.getenv("LOG_REDACT", "true").lower() in ("1", "true", "yes")
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else TextFormatter(TEXT_FORMAT))
+    if redact:
+        output.addFilter(RedactionFilter())
+
+    # None of the formats use the caller, thread or process fields, skip looking them up
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = BackgroundQueueHandler(records)
+    apply_sampling(sample_rates)
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread
+
+    Later records, such as those logged during interpreter exit, are written
+    directly by the output handler.
+    """
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        if isinstance(existing, BackgroundQueueHandler) and existing.queue is _listener.queue:
+            root.removeHandler(existing)
+            for output in _listener.handlers:
+                root.addHandler(output)
+    _listener.stop()
+    _listener = None
+
+atexit.register(stop_logging)
@@ -7,15 +7,27 @@ from dotenv import load_dotenv
 import logging
 from typing import Dict, Any
 import json
+import hmac
+import asyncio
+import threading
 from datetime import datetime
 from bot_logic import GrooveHireBot
-from database import Database
+from database import create_database
+from dispatcher import MessageDispatcher
+from idempotency import IdempotencyCache
+from sqlite_database import SQLiteDatabase
+from inbound import InboundMessage, InboundQueue
+from jobs import JobQueue
+import metrics
+from log_config import configure_logging
+from tracing import tracer
+from profiler import LoopLagMonitor, SamplingProfiler
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records are written from a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="GrooveHire WhatsApp Bot", version="1.0.0")
@@ -27,10 +39,137 @@ twilio_client = Client(
 )
 
 # Initialize database
-db = Database()
+db = create_database()
+
+# Initialize outbound message dispatcher
+dispatcher = MessageDispatcher(client=twilio_client)
 
 # Initialize bot
-bot = GrooveHireBot(db)
+bot = GrooveHireBot(db, dispatcher)
+
+# Twilio retries slow webhooks and M-Pesa may repeat callbacks, handle each id once.
+# With SQLite the ids are recorded in the database, so every worker sees them;
+# the in-memory backend only runs one worker and keeps them in process.
+request_store = db if isinstance(db, SQLiteDatabase) else None
+processed_messages = IdempotencyCache(store=request_store, namespace="message")
+processed_payments = IdempotencyCache(store=request_store, namespace="payment")
+
+# Debug endpoints are disabled unless a token is configured
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+
+def require_debug_token(request: Request) -> None:
+    """Allow a debug request only with the configured X-Debug-Token header"""
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("X-Debug-Token", "")
+    if not hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+# Longest on-demand profile, and one at a time
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 30))
+profile_lock = asyncio.Lock()
+
+# Event loop lag, with the blocking stack captured when the loop stalls
+loop_monitor = LoopLagMonitor()
+
+# Acknowledge webhooks at once and send replies from background workers
+FAST_ACK = os.getenv("WEBHOOK_FAST_ACK", "false").lower() in ("1", "true", "yes")
+
+async def reply_to(message: InboundMessage) -> str:
+    """Run the bot on a queued message and send its reply through the outbound API"""
+    response_text = await bot.process_message(
+        phone_number=message.phone_number,
+        message=message.body,
+        profile_name=message.profile_name,
+        latitude=message.latitude,
+        longitude=message.longitude,
+        raise_errors=True
+    )
+    await bot.send_whatsapp_message(message.phone_number, response_text)
+    return response_text
+
+async def handle_inbound(message: InboundMessage) -> None:
+    """Handle a queued message once per MessageSid"""
+    with tracer.trace("inbound.reply", message_sid=message.message_sid):
+        try:
+            await processed_messages.run(message.message_sid, lambda: reply_to(message))
+        except Exception:
+            # Failures are not remembered, so Twilio's retry of this MessageSid runs it again
+            await bot.send_whatsapp_message(message.phone_number, bot.templates["error"].render())
+
+inbound = InboundQueue(handle_inbound)
+
+# M-Pesa callbacks are persisted and processed in the background with retries
+jobs = JobQueue()
+jobs.register("mpesa_callback", bot.handle_payment_callback)
+
+# Gauges and counters read from component state at scrape time
+metrics.gauge(
+    "groovehire_sessions", "Sessions resident in the session store",
+    function=lambda: len(db.user_sessions)
+)
+metrics.gauge(
+    "groovehire_queue_depth", "Items waiting in each background queue", ["queue"],
+    function=lambda: {
+        ("outbound",): dispatcher.queue_depth,
+        ("inbound",): inbound.queue_depth,
+        ("pending_payments",): len(bot.payment_scheduler)
+    }
+)
+metrics.counter_function(
+    "groovehire_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"],
+    lambda: {
+        ("mpesa_token", "hit"): bot.payment_service.token_stats["hits"],
+        ("mpesa_token", "miss"): bot.payment_service.token_stats["misses"],
+        ("message_dedup", "hit"): processed_messages.stats["hits"],
+        ("message_dedup", "miss"): processed_messages.stats["misses"],
+        ("payment_dedup", "hit"): processed_payments.stats["hits"],
+        ("payment_dedup", "miss"): processed_payments.stats["misses"]
+    }
+)
+metrics.counter_function(
+    "groovehire_session_removals_total", "Sessions dropped from the store", ["reason"],
+    lambda: metrics.stats_samples(db.user_sessions.stats)
+)
+metrics.counter_function(
+    "groovehire_session_updates_total", "Session updates made by handlers and the writes they were merged into",
+    ["stage"], lambda: metrics.stats_samples(bot.session_writes)
+)
+metrics.counter_function(
+    "groovehire_outbound_messages_total", "Outbound WhatsApp messages by outcome", ["outcome"],
+    lambda: metrics.stats_samples(dispatcher.stats)
+)
+metrics.counter_function(
+    "groovehire_jobs_total", "Background jobs by outcome", ["outcome"],
+    lambda: metrics.stats_samples(jobs.stats)
+)
+metrics.counter_function(
+    "groovehire_pending_payments_total", "Pending payment checks by outcome", ["outcome"],
+    lambda: metrics.stats_samples(bot.payment_scheduler.stats)
+)
+
+@app.on_event("startup")
+async def startup():
+    """Start background workers"""
+    loop_monitor.start()
+    dispatcher.start()
+    jobs.start()
+    bot.payment_scheduler.start()
+    if FAST_ACK:
+        inbound.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush queued messages and release pooled outbound connections"""
+    # Inbound messages and jobs produce replies, finish them before the outbound queue
+    await inbound.stop()
+    await jobs.close()
+    await bot.payment_scheduler.stop()
+    await dispatcher.stop()
+    await bot.payment_service.close()
+    await db.close()
+    tracer.close()
+    await loop_monitor.stop()
 
 @app.get("/")
 async def root():
@@ -40,34 +179,59 @@ async def root():
 async def whatsapp_webhook(
     request: Request,
     From: str = Form(...),
-    Body: str = Form(...),
+    Body: str = Form(""),
     ProfileName: str = Form(None),
-    MessageSid: str = Form(None)
+    MessageSid: str = Form(None),
+    Latitude: float = Form(None),
+    Longitude: float = Form(None)
 ):
     """Handle incoming WhatsApp messages"""
     try:
-        logger.info(f"Received message from {From}: {Body}")
+        logger.info("Received message from %s", From, extra={"body": Body})
         
         # Extract phone number (remove whatsapp: prefix)
         phone_number = From.replace("whatsapp:", "")
         
-        # Process message with bot
-        response_text = await bot.process_message(
-            phone_number=phone_number,
-            message=Body,
-            profile_name=ProfileName
-        )
+        if FAST_ACK:
+            message = InboundMessage(
+                phone_number=phone_number,
+                body=Body,
+                profile_name=ProfileName,
+                message_sid=MessageSid,
+                latitude=Latitude,
+                longitude=Longitude
+            )
+            # Retries of a message already handled need nothing, the reply went out
+            if MessageSid not in processed_messages and not inbound.enqueue(message):
+                # Queue full, answer inline rather than lose the message
+                await handle_inbound(message)
+            return PlainTextResponse(str(MessagingResponse()), media_type="application/xml")
+        
+        # Process message with bot, replaying the earlier reply for a retried MessageSid
+        with tracer.trace("webhook.whatsapp", message_sid=MessageSid):
+            try:
+                response_text = await processed_messages.run(MessageSid, lambda: bot.process_message(
+                    phone_number=phone_number,
+                    message=Body,
+                    profile_name=ProfileName,
+                    latitude=Latitude,
+                    longitude=Longitude,
+                    raise_errors=True
+                ))
+            except Exception:
+                # Failures are not remembered, so Twilio's retry of this MessageSid runs it again
+                response_text = bot.templates["error"].render()
         
         # Create Twilio response
         resp = MessagingResponse()
         resp.message(response_text)
         
-        logger.info(f"Sending response to {From}: {response_text}")
+        logger.info("Sending response to %s", From, extra={"reply": response_text})
         
         return PlainTextResponse(str(resp), media_type="application/xml")
         
     except Exception as e:
-        logger.error(f"Error processing WhatsApp message: {str(e)}")
+        logger.error("Error processing WhatsApp message: %s", e)
         
         # Send error response
         resp = MessagingResponse()
@@ -79,24 +243,80 @@ async def mpesa_callback(request: Request):
     """Handle M-Pesa payment callbacks"""
     try:
         data = await request.json()
-        logger.info(f"M-Pesa callback received: {data}")
+        logger.info("M-Pesa callback received", extra={"body": data})
         
-        # Process payment callback
-        await bot.handle_payment_callback(data)
+        # Persist the callback once per CheckoutRequestID and acknowledge straight away
+        await processed_payments.run(
+            data.get("CheckoutRequestID"),
+            lambda: jobs.enqueue("mpesa_callback", data)
+        )
         
         return {"ResultCode": 0, "ResultDesc": "Success"}
         
     except Exception as e:
-        logger.error(f"Error processing M-Pesa callback: {str(e)}")
+        logger.error("Error processing M-Pesa callback: %s", e)
         return {"ResultCode": 1, "ResultDesc": "Error"}
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/traces")
+async def debug_traces(request: Request, limit: int = 50, min_duration_ms: float = 0):
+    """Recently sampled traces, slowest stages first in the summary"""
+    require_debug_token(request)
+    stages = tracer.summary()
+    return {
+        "sample_rate": tracer.sample_rate,
+        "stats": tracer.stats,
+        "stages": dict(sorted(stages.items(), key=lambda item: item[1]["p99_ms"], reverse=True)),
+        "traces": tracer.recent(limit, min_duration_ms)
+    }
+
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = 5.0, format: str = "json"):
+    """Sample the event loop thread for a few seconds
+
+    format=collapsed returns the stacks alone, ready for flamegraph.pl or speedscope.
+    """
+    require_debug_token(request)
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    async with profile_lock:
+        # This handler runs on the event loop thread, which is the one to sample
+        profile = await SamplingProfiler(threading.get_ident()).run(seconds)
+
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return {
+        "seconds": seconds,
+        "mode": profile.mode,
+        "interval_ms": profile.interval * 1000,
+        "samples": profile.samples,
+        "top_functions": profile.top_functions(),
+        "loop_lag": loop_monitor.snapshot(),
+        "collapsed": profile.collapsed()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "service": "GrooveHire WhatsApp Bot"
+        "service": "GrooveHire WhatsApp Bot",
+        "sessions": db.session_stats(),
+        "inbound_queue": {"depth": inbound.queue_depth, **inbound.stats},
+        "jobs": jobs.stats,
+        "pending_payments": {"pending": len(bot.payment_scheduler), **bot.payment_scheduler.stats},
+        "traces": tracer.stats,
+        "event_loop": {key: value for key, value in loop_monitor.snapshot().items() if key != "stalls"},
+        "duplicates": {
+            "messages": processed_messages.stats,
+            "payments": processed_payments.stats
+        }
     }
 
 if __name__ == "__main__":
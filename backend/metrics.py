@@ -0,0 +1,176 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from bisect import bisect_left
+import math
+
+# Latency buckets in seconds, from sub-millisecond handler work to slow M-Pesa calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    """Base for metrics rendered in the Prometheus text format
+
+    Recording only happens on the event loop thread, so updates are plain
+    dict and list operations with no locking.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _labels(self, values: Tuple) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self._values.items():
+            yield self.name, self._labels(labels), value
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a function at scrape time
+
+    A function may return a number, or a dict of label values to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Callable[[], Union[float, Dict[Tuple, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def samples(self) -> Iterable[Sample]:
+        values = self._values
+        if self.function is not None:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        for labels, value in values.items():
+            yield self.name, self._labels(labels), value
+
+class CounterFunction(Gauge):
+    """Counter read from existing stats at scrape time, costing nothing on the hot path"""
+
+    kind = "counter"
+
+class Histogram(Metric):
+    """Bucketed distribution per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts with a final +Inf slot, sum]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        try:
+            series = self._series[labels]
+        except KeyError:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, (counts, total) in self._series.items():
+            label_pairs = self._labels(labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", label_pairs + (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", label_pairs, total
+            yield f"{self.name}_count", label_pairs, cumulative
+
+class Registry:
+    """Collection of metrics rendered together at the scrape endpoint"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        # Re-registering a name replaces it, so a restarted component reports its own state
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (),
+          function: Callable = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, function))
+
+def counter_function(name: str, documentation: str, labelnames: Sequence[str],
+                     function: Callable) -> CounterFunction:
+    return REGISTRY.register(CounterFunction(name, documentation, labelnames, function))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+def stats_samples(stats: Dict[str, float]) -> Dict[Tuple, float]:
+    """Label each entry of a stats dict by its key"""
+    return {(key,): value for key, value in stats.items()}
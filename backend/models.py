@@ -0,0 +1,97 @@
+from typing import Dict, Any
+from enum import IntEnum
+import sys
+import time
+
+class SessionState(IntEnum):
+    """Conversation states, stored as small ints"""
+    WELCOME = 0
+    SERVICE_SELECTION = 1
+    LOCATION_REQUEST = 2
+    PROVIDER_SELECTION = 3
+    BOOKING_DETAILS = 4
+    PAYMENT = 5
+    COMPLETED = 6
+
+# Fields whose values come from a small fixed vocabulary
+_INTERNED_FIELDS = frozenset({"selected_service"})
+
+class SessionRecord:
+    """Compact user session with a fixed set of fields
+
+    Supports the dict-style access (get, [], update) the bot handlers use.
+    Timestamps are epoch seconds.
+    """
+
+    __slots__ = (
+        "phone_number",
+        "profile_name",
+        "state",
+        "created_at",
+        "last_interaction",
+        "selected_service",
+        "location",
+        "latitude",
+        "longitude",
+        "available_provider_ids",
+        "selected_provider_id",
+        "booking_details",
+        "payment_reference",
+    )
+
+    def __init__(self, phone_number: str, profile_name: str = None,
+                 state: SessionState = SessionState.WELCOME, **fields: Any):
+        now = time.time()
+        self.phone_number = phone_number
+        self.profile_name = profile_name
+        self.state = SessionState(state)
+        self.created_at = now
+        self.last_interaction = now
+        self.selected_service = None
+        self.location = None
+        self.latitude = None
+        self.longitude = None
+        self.available_provider_ids = None
+        self.selected_provider_id = None
+        self.booking_details = None
+        self.payment_reference = None
+        self.update(fields)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a field, falling back to default when it is unset"""
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        if key == "state":
+            value = SessionState(value)
+        elif key in _INTERNED_FIELDS and value is not None:
+            value = sys.intern(value)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return getattr(self, key, None) is not None
+
+    def update(self, updates: Dict) -> None:
+        """Apply several field changes"""
+        for key, value in updates.items():
+            self[key] = value
+
+    def to_dict(self) -> Dict:
+        """Plain dict of the set fields"""
+        return {
+            key: getattr(self, key)
+            for key in self.__slots__
+            if getattr(self, key) is not None
+        }
+
+    def __repr__(self) -> str:
+        return f"SessionRecord({self.to_dict()!r})"
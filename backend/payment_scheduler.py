@@ -0,0 +1,180 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PendingPayment:
+    """STK push waiting for its result"""
+    reference: str
+    phone_number: str
+    deadline: float
+    next_check: float
+    # Failed attempts to settle it after it was found paid
+    settle_failures: int = 0
+
+class PaymentScheduler:
+    """Heap of pending STK pushes ordered by their next status check
+
+    Adding or resolving a payment is O(log n). Due payments are queried
+    against M-Pesa in concurrent batches: paid ones are settled, failed ones
+    reported, and ones still pending at their deadline expired. Entries for
+    payments resolved by a callback are left in the heap and skipped when
+    they surface. A paid payment whose settlement fails stays in the heap
+    and is checked and settled again after a backoff, however long that takes.
+    """
+
+    def __init__(self, payment_service: Any,
+                 on_paid: Callable[[str], Awaitable[None]],
+                 on_failed: Callable[[str, Optional[str]], Awaitable[None]],
+                 timeout: float = None, check_after: float = None,
+                 check_interval: float = None, batch_size: int = None,
+                 settle_backoff: float = None):
+        self.payment_service = payment_service
+        self.on_paid = on_paid
+        # Called with the failure reason, or None when the prompt expired
+        self.on_failed = on_failed
+        # The STK prompt lasts 2 minutes, leave the callback some time to arrive
+        self.timeout = timeout or float(os.getenv("PAYMENT_TIMEOUT_SECONDS", 150))
+        # Callbacks usually arrive within seconds, only query the ones that don't
+        self.check_after = check_after or float(os.getenv("PAYMENT_CHECK_AFTER", 30))
+        self.check_interval = check_interval or float(os.getenv("PAYMENT_CHECK_INTERVAL", 30))
+        self.batch_size = batch_size or int(os.getenv("PAYMENT_CHECK_BATCH", 50))
+        # First wait before retrying a failed settlement, doubled each time up to check_interval
+        self.settle_backoff = settle_backoff or float(os.getenv("PAYMENT_SETTLE_BACKOFF", 2.0))
+
+        self._pending: Dict[str, PendingPayment] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._runner: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.stats = {"scheduled": 0, "queried": 0, "paid": 0, "failed": 0, "expired": 0, "settle_retries": 0}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, reference: str) -> bool:
+        return reference in self._pending
+
+    def add(self, reference: str, phone_number: str, now: float = None) -> None:
+        """Track a new STK push"""
+        now = time.monotonic() if now is None else now
+        deadline = now + self.timeout
+        payment = PendingPayment(reference, phone_number, deadline, min(now + self.check_after, deadline))
+        self._pending[reference] = payment
+        self._push(payment)
+        self.stats["scheduled"] += 1
+
+    def discard(self, reference: str) -> Optional[PendingPayment]:
+        """Stop tracking a payment that was resolved elsewhere"""
+        return self._pending.pop(reference, None)
+
+    def _push(self, payment: PendingPayment) -> None:
+        heapq.heappush(self._heap, (payment.next_check, next(self._sequence), payment.reference))
+        # Wake the runner when this check is due before the one it sleeps for
+        if self._wake is not None and self._heap[0][2] == payment.reference:
+            self._wake.set()
+
+    def _pop_due(self, now: float) -> List[PendingPayment]:
+        """Take up to batch_size payments whose check is due"""
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            next_check, _, reference = heapq.heappop(self._heap)
+            payment = self._pending.get(reference)
+            # Skip entries for resolved payments and superseded checks
+            if payment is not None and payment.next_check == next_check:
+                due.append(payment)
+        return due
+
+    async def run_due(self, now: float = None) -> int:
+        """Check every payment that is due, returning how many were checked"""
+        now = time.monotonic() if now is None else now
+        checked = 0
+        while True:
+            batch = self._pop_due(now)
+            if not batch:
+                return checked
+            checked += len(batch)
+            results = await asyncio.gather(*[
+                self.payment_service.query_stk_status(payment.reference)
+                for payment in batch
+            ], return_exceptions=True)
+            self.stats["queried"] += len(batch)
+            for payment, result in zip(batch, results):
+                try:
+                    await self._resolve(payment, result, now)
+                except Exception as e:
+                    logger.error("Error reconciling payment %s: %s", payment.reference, e)
+
+    async def _resolve(self, payment: PendingPayment, result: Any, now: float) -> None:
+        """Act on one status query"""
+        if payment.reference not in self._pending:
+            # A callback settled it while the query was in flight
+            return
+        result_code = result.get("result_code") if isinstance(result, dict) else None
+        if result_code == 0:
+            self.discard(payment.reference)
+            try:
+                await self.on_paid(payment.reference)
+            except Exception as e:
+                # The customer has paid, keep it until the booking is made
+                delay = min(self.settle_backoff * 2 ** payment.settle_failures, self.check_interval)
+                payment.settle_failures += 1
+                payment.next_check = now + delay
+                self._pending[payment.reference] = payment
+                self._push(payment)
+                self.stats["settle_retries"] += 1
+                logger.warning("Settling payment %s failed, retrying in %.0fs: %s",
+                               payment.reference, delay, e)
+                return
+            self.stats["paid"] += 1
+        elif result_code is not None:
+            self.discard(payment.reference)
+            self.stats["failed"] += 1
+            await self.on_failed(payment.reference, result.get("message"))
+        elif now >= payment.deadline:
+            self.discard(payment.reference)
+            self.stats["expired"] += 1
+            await self.on_failed(payment.reference, None)
+        else:
+            payment.next_check = min(now + self.check_interval, payment.deadline)
+            self._push(payment)
+
+    def start(self) -> None:
+        """Start checking payments in the background"""
+        if self._runner is not None:
+            return
+        self._wake = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background checks"""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+        self._wake = None
+
+    async def _run(self) -> None:
+        """Sleep until the earliest check is due, then run every due check"""
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error("Error checking pending payments: %s", e)
+            # Drop resolved entries from the top so the sleep targets a live check
+            while self._heap and self._heap[0][2] not in self._pending:
+                heapq.heappop(self._heap)
+            delay = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
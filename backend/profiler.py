@@ -0,0 +1,209 @@
+from typing import Dict, List, Optional
+from collections import Counter, deque
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics.histogram(
+    "groovehire_event_loop_lag_seconds",
+    "Delay between when an event loop timer was due and when it ran"
+)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+def collapse_stack(frame, max_depth: int = 128) -> str:
+    """Stack of a frame as semicolon-separated labels, outermost first"""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class SamplingProfiler:
+    """Samples the stack of one thread at a fixed interval, costing one stack walk per sample
+
+    When the sampled thread is the main thread, as it is for the event loop
+    under uvicorn, a CPU-time interval timer interrupts it and the signal
+    handler records the running frame. Other threads are sampled from a
+    helper thread through sys._current_frames; that only gets to run when the
+    sampled thread lets go of the GIL, so its samples lean towards I/O waits.
+    Output is in the collapsed-stack format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = None):
+        self.thread_id = thread_id
+        self.interval = interval or float(os.getenv("PROFILE_INTERVAL", 0.005))
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.mode: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._previous_handler = None
+
+    def start(self) -> None:
+        if self.thread_id == threading.main_thread().ident and hasattr(signal, "setitimer"):
+            self.mode = "signal"
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.mode = "thread"
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self.mode == "signal":
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _record(self, frame) -> None:
+        self.stacks[collapse_stack(frame)] += 1
+        self.samples += 1
+
+    def _on_signal(self, signum, frame) -> None:
+        if frame is not None:
+            self._record(frame)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self._record(frame)
+
+    def collapsed(self) -> str:
+        """One "stack count" line per distinct stack, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit: int = 20) -> List[Dict]:
+        """Functions by share of samples they were running (self) or on the stack (total)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(";")
+            own[labels[-1]] += count
+            for label in set(labels):
+                total[label] += count
+        samples = self.samples or 1
+        return [
+            {"function": label, "self": round(own[label] / samples, 4), "total": round(total[label] / samples, 4)}
+            for label, _ in own.most_common(limit)
+        ]
+
+    async def run(self, duration: float) -> "SamplingProfiler":
+        """Profile for a number of seconds without blocking the event loop"""
+        self.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            self.stop()
+        return self
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a periodic timer
+
+    A watchdog thread also checks that the loop keeps ticking. When it has
+    been stuck for longer than the threshold, the loop thread's stack is
+    captured, which points at the blocking call.
+    """
+
+    def __init__(self, interval: float = None, threshold: float = None, history: int = 600):
+        self.interval = interval if interval is not None else float(os.getenv("LOOP_LAG_INTERVAL", 0.1))
+        self.threshold = threshold or float(os.getenv("LOOP_LAG_THRESHOLD", 0.1))
+        self.samples: deque = deque(maxlen=history)
+        # (wall time, seconds stuck so far, stack of the loop thread)
+        self.stalls: deque = deque(maxlen=20)
+        self.stats = {"ticks": 0, "stalls": 0, "max_lag": 0.0}
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self) -> None:
+        """Start measuring on the running loop"""
+        if not self.enabled or self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._stop.set()
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            self.samples.append(lag)
+            self.stats["ticks"] += 1
+            if lag > self.stats["max_lag"]:
+                self.stats["max_lag"] = lag
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported_tick = None
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            stuck = time.monotonic() - last_tick - self.interval
+            # Capture each stall once, while the loop is still blocked in it
+            if stuck > self.threshold and last_tick != reported_tick:
+                reported_tick = last_tick
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = collapse_stack(frame) if frame is not None else ""
+                self.stalls.append((time.time(), round(stuck, 3), stack))
+                self.stats["stalls"] += 1
+                logger.warning("Event loop blocked for over %.0f ms in %s",
+                               stuck * 1000, stack.rsplit(";", 1)[-1])
+
+    def snapshot(self) -> Dict:
+        """Lag percentiles over the recent ticks and the latest stalls"""
+        lags = sorted(self.samples)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(len(lags) * fraction))] * 1000, 3)
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.stats["max_lag"] * 1000, 3),
+            "ticks": self.stats["ticks"],
+            "stalls": [
+                {"at": at, "blocked_ms": round(stuck * 1000, 1), "stack": stack}
+                for at, stuck, stack in self.stalls
+            ]
+        }
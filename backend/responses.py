@@ -0,0 +1,145 @@
+"""
+Bot response templates
+
+Fields in braces are filled per message. Fields passed as static values to
+compile_templates (services_text, service_count) are rendered once at startup.
+"""
+
+RESPONSES = {
+    "welcome": """👋 Hi {name}! Welcome to GrooveHire!
+
+I'm here to help you find trusted local service providers. What service do you need today?
+
+{services_text}
+
+Just reply with the number (1-{service_count}) or tell me what you need help with.""",
+
+    "service_selected": """Great choice! {emoji} You've selected *{service}*.
+
+To find the best providers near you, please share your location or tell me your area (e.g., Westlands, Karen, Kilimani, etc.)
+
+You can also share your live location using WhatsApp's location feature! 📍""",
+
+    "service_unknown": """I didn't quite understand that. Please choose a service:
+
+{services_text}
+
+Reply with the number (1-{service_count}) or describe what you need.""",
+
+    "provider_line": """
+{index}. *{name}*
+   ⭐ {rating}/5 ({reviews} reviews)
+   📍 {distance}
+   💰 KES {rate}/hour
+""",
+
+    "providers_found": """Perfect! I found these top-rated {service} providers near {location}:
+
+{providers_text}
+
+Which provider would you like to book? Reply with 1, 2, or 3.""",
+
+    "providers_not_found": """Sorry, I couldn't find any {service} providers in {location} right now.
+
+Would you like to:
+1. Try a different area
+2. Get notified when providers become available
+3. Browse other services
+
+Reply with 1, 2, or 3.""",
+
+    "location_unknown": """I need your location to find providers near you. Please:
+
+1. Share your live location using WhatsApp
+2. Tell me your area (e.g., "Westlands", "Karen", "CBD")
+3. Give me nearby landmarks
+
+Where are you located? 📍""",
+
+    "provider_unavailable": """Sorry, that provider is no longer available.
+
+Type 'back' to choose a different location.""",
+
+    "provider_selected": """Excellent choice! You've selected:
+
+👨‍🔧 *{name}*
+⭐ {rating}/5 rating
+📍 {distance}
+💰 KES {rate}/hour
+
+Now I need a few details to complete your booking:
+
+1. What's the specific issue or work needed?
+2. When would you like the service? (today, tomorrow, specific date)
+3. Preferred time? (morning, afternoon, evening)
+
+Please describe your needs and preferred timing.""",
+
+    "provider_invalid": """Please select a provider by replying with 1, 2, or 3.
+
+If you'd like to see different providers, type 'back' to choose a different location.""",
+
+    "booking_summary": """Perfect! Here's your booking summary:
+
+🔧 *Service:* {service}
+👨‍🔧 *Provider:* {provider}
+📝 *Details:* {details}
+💰 *Estimated Cost:* KES {estimated_cost} (2 hours minimum)
+
+To confirm your booking, please pay KES 500 as a booking fee. The remaining amount will be paid to the provider after service completion.
+
+Reply 'PAY' to proceed with M-Pesa payment, or 'BACK' to modify details.""",
+
+    "payment_sent": """💳 M-Pesa payment request sent!
+
+Please check your phone for the M-Pesa prompt and enter your PIN to pay KES 500.
+
+Once payment is confirmed, I'll connect you with your provider and send you the booking confirmation.
+
+⏰ The payment prompt expires in 2 minutes.""",
+
+    "payment_failed": """Sorry, there was an issue initiating the payment. Please try again or contact support.
+
+Error: {error}""",
+
+    "payment_error": "Sorry, there was an issue with the payment system. Please try again later.",
+
+    "payment_back": "Please provide your booking details again:",
+
+    "payment_prompt": "Please reply 'PAY' to proceed with payment or 'BACK' to modify your booking details.",
+
+    "payment_expired": """⏰ Your M-Pesa payment prompt expired before we received your payment.
+
+Reply 'PAY' to get a new prompt, or 'BACK' to modify your booking details.""",
+
+    "payment_cancelled": """Your M-Pesa payment didn't go through: {reason}
+
+Reply 'PAY' to try again, or 'BACK' to modify your booking details.""",
+
+    "payment_confirmed": """✅ *Payment Confirmed!*
+
+Your booking has been confirmed:
+
+🆔 Booking ID: {booking_id}
+🔧 Service: {service}
+👨‍🔧 Provider: {provider}
+📞 Provider Contact: {provider_phone}
+
+Your provider will contact you shortly to confirm the appointment time.
+
+Thank you for using GrooveHire! 🎉""",
+
+    "provider_booking_alert": """🔔 *New Booking Alert!*
+
+You have a new booking request:
+
+🆔 Booking ID: {booking_id}
+🔧 Service: {service}
+👤 Client: {client}
+📞 Client Contact: {client_phone}
+📝 Details: {details}
+
+Please contact the client to confirm the appointment time.""",
+
+    "error": "Sorry, I encountered an error. Please try again or type 'start' to begin.",
+}
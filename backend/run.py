@@ -13,9 +13,13 @@ load_dotenv()
 if __name__ == "__main__":
     # Get port from environment or default to 8000
     port = int(os.getenv("PORT", 8000))
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # Workers can only share sessions through the SQLite store
+        os.environ.setdefault("DATABASE_BACKEND", "sqlite")
     
     print("🚀 Starting GrooveHire WhatsApp Bot...")
-    print(f"📱 Server will run on port {port}")
+    print(f"📱 Server will run on port {port} with {workers} worker(s)")
     print("🔗 Webhook URL: http://localhost:{port}/webhook/whatsapp")
     print("💳 M-Pesa Callback URL: http://localhost:{port}/webhook/mpesa")
     
@@ -23,6 +27,8 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        workers=workers,
+        # Reloading runs a single process
+        reload=workers == 1,
         log_level="info"
     )
\ No newline at end of file
@@ -1,9 +1,17 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
 from database import Database
+from http_client import AsyncHTTPClient
+from geo import AREA_CENTROIDS
+import metrics
+import tracing
 import os
-import requests
+import asyncio
+import base64
+import heapq
 import json
+import time
+import uuid
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -13,46 +21,98 @@ class ServiceMatcher:
     
     def __init__(self, database: Database):
         self.db = database
+        # Nearest providers considered before ranking by rating
+        self.candidate_pool = int(os.getenv("MATCH_CANDIDATES", 10))
+        self.max_distance_km = float(os.getenv("MATCH_MAX_DISTANCE_KM", 15))
     
-    async def find_providers(self, service: str, location: str) -> List[Dict]:
-        """Find providers for a service in a location"""
+    @tracing.traced("matcher.find_providers")
+    async def find_providers(self, service: str, location: str, latitude: float = None,
+                             longitude: float = None) -> List[Dict]:
+        """Find providers for a service near a location or map pin"""
         try:
-            # Get providers for the service
-            providers = await self.db.get_providers_by_service(service)
+            if latitude is None or longitude is None:
+                latitude, longitude = AREA_CENTROIDS.get(location.lower(), (None, None))
             
-            # Filter by location
-            filtered_providers = await self.db.filter_providers_by_location(providers, location)
+            if latitude is not None:
+                # Rank the nearest providers by rating, then distance
+                nearest = await self.db.get_nearest_providers(
+                    service, latitude, longitude, self.candidate_pool, self.max_distance_km
+                )
+                if nearest:
+                    top = heapq.nsmallest(3, nearest, key=lambda x: (-x[1]["rating"], x[0]))
+                    return [{**provider, "distance_km": round(distance, 1)} for distance, provider in top]
             
-            # Sort by rating and distance
-            sorted_providers = sorted(
-                filtered_providers,
-                key=lambda x: (-x["rating"], float(x["distance"].split()[0]))
-            )
-            
-            return sorted_providers[:3]  # Return top 3
+            # Unknown area, fall back to providers who list it or can travel
+            providers = await self.db.get_providers_by_area(service, location)
+            top = heapq.nsmallest(3, providers, key=lambda x: (-x["rating"], -x["reviews"]))
+            return [{**provider, "distance_km": None} for provider in top]
             
         except Exception as e:
-            logger.error(f"Error finding providers: {str(e)}")
+            logger.error("Error finding providers: %s", e)
             return []
 
+MPESA_LATENCY = metrics.histogram(
+    "groovehire_mpesa_request_duration_seconds",
+    "M-Pesa API call latency",
+    ["operation"]
+)
+MPESA_ERRORS = metrics.counter(
+    "groovehire_mpesa_errors_total",
+    "M-Pesa API calls that failed or returned a non-200 status",
+    ["operation"]
+)
+
 class PaymentService:
     """Service for handling M-Pesa payments"""
     
-    def __init__(self):
+    def __init__(self, http_client: AsyncHTTPClient = None):
+        self.http = http_client or AsyncHTTPClient()
         self.consumer_key = os.getenv("MPESA_CONSUMER_KEY")
         self.consumer_secret = os.getenv("MPESA_CONSUMER_SECRET")
         self.shortcode = os.getenv("MPESA_SHORTCODE")
         self.passkey = os.getenv("MPESA_PASSKEY")
         
-        # M-Pesa URLs (Sandbox)
-        self.auth_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-        self.stk_push_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
+        # M-Pesa URLs (Sandbox by default)
+        self.base_url = os.getenv("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke")
+        self.auth_url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
+        self.stk_push_url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
+        self.stk_query_url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
+        
+        # OAuth token cache, refreshed this many seconds before expiry
+        self.token_refresh_margin = int(os.getenv("MPESA_TOKEN_REFRESH_MARGIN", 60))
+        self._access_token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_refresh: Optional[asyncio.Future] = None
+        self.token_stats = {"hits": 0, "misses": 0, "refreshes": 0}
     
     async def get_access_token(self) -> Optional[str]:
-        """Get M-Pesa access token"""
+        """Get M-Pesa access token, sharing one in-flight refresh between callers"""
+        if self._access_token and time.monotonic() < self._token_expires_at - self.token_refresh_margin:
+            self.token_stats["hits"] += 1
+            return self._access_token
+        
+        self.token_stats["misses"] += 1
+        if self._token_refresh is None:
+            self._token_refresh = asyncio.ensure_future(self._refresh_access_token())
+            self._token_refresh.add_done_callback(self._clear_token_refresh)
+        
+        # Shield so a cancelled caller does not abort the refresh for everyone else
+        return await asyncio.shield(self._token_refresh)
+    
+    def _clear_token_refresh(self, future: asyncio.Future) -> None:
+        """Allow the next expiry to start a new refresh"""
+        if self._token_refresh is future:
+            self._token_refresh = None
+    
+    def invalidate_access_token(self) -> None:
+        """Drop the cached token so the next call refreshes it"""
+        self._access_token = None
+        self._token_expires_at = 0.0
+    
+    async def _refresh_access_token(self) -> Optional[str]:
+        """Fetch a new M-Pesa access token"""
+        self.token_stats["refreshes"] += 1
         try:
-            import base64
-            
             # Create credentials
             credentials = base64.b64encode(
                 f"{self.consumer_key}:{self.consumer_secret}".encode()
@@ -63,18 +123,22 @@ class PaymentService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.get(self.auth_url, headers=headers)
+            response = await self._call("oauth", self.http.get, self.auth_url, headers=headers)
             
             if response.status_code == 200:
-                return response.json().get("access_token")
+                data = response.json()
+                self._access_token = data.get("access_token")
+                self._token_expires_at = time.monotonic() + float(data.get("expires_in", 3599))
+                return self._access_token
             else:
-                logger.error(f"Failed to get access token: {response.text}")
+                logger.error("Failed to get access token: %s", response.text)
                 return None
                 
         except Exception as e:
-            logger.error(f"Error getting access token: {str(e)}")
+            logger.error("Error getting access token: %s", e)
             return None
     
+    @tracing.traced("mpesa.stk_push")
     async def initiate_stk_push(self, phone_number: str, amount: int, reference: str) -> Dict:
         """Initiate M-Pesa STK Push"""
         try:
@@ -85,8 +149,10 @@ class PaymentService:
                 logger.warning("M-Pesa credentials not configured, simulating payment")
                 return {
                     "success": True,
-                    "checkout_request_id": f"ws_CO_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-                    "message": "Payment request sent (simulated)"
+                    "checkout_request_id": f"ws_CO_SIM_{uuid.uuid4().hex}",
+                    "message": "Payment request sent (simulated)",
+                    # No status to query, only a callback completes it
+                    "simulated": True
                 }
             
             # Get access token
@@ -99,13 +165,7 @@ class PaymentService:
                 }
             
             # Prepare STK Push request
-            import base64
-            from datetime import datetime
-            
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            password = base64.b64encode(
-                f"{self.shortcode}{self.passkey}{timestamp}".encode()
-            ).decode()
+            timestamp, password = self._stk_password()
             
             # Ensure phone number is in correct format
             if phone_number.startswith("254"):
@@ -134,7 +194,7 @@ class PaymentService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(self.stk_push_url, json=payload, headers=headers)
+            response = await self._call("stk_push", self.http.post, self.stk_push_url, json=payload, headers=headers)
             
             if response.status_code == 200:
                 result = response.json()
@@ -144,15 +204,111 @@ class PaymentService:
                     "message": "Payment request sent successfully"
                 }
             else:
-                logger.error(f"STK Push failed: {response.text}")
+                if response.status_code == 401:
+                    # Token was revoked early, fetch a fresh one next time
+                    self.invalidate_access_token()
+                logger.error("STK Push failed: %s", response.text)
                 return {
                     "success": False,
                     "message": f"Payment request failed: {response.text}"
                 }
                 
         except Exception as e:
-            logger.error(f"Error initiating STK Push: {str(e)}")
+            logger.error("Error initiating STK Push: %s", e)
             return {
                 "success": False,
                 "message": f"Payment error: {str(e)}"
-            }
\ No newline at end of file
+            }
+    
+    async def _call(self, operation: str, method, url: str, **kwargs):
+        """Make an M-Pesa API call, recording its latency and failures"""
+        started = time.perf_counter()
+        with tracing.span("mpesa.http", operation=operation) as span:
+            try:
+                response = await method(url, **kwargs)
+            except Exception:
+                MPESA_ERRORS.inc(operation)
+                raise
+            finally:
+                MPESA_LATENCY.observe(time.perf_counter() - started, operation)
+            if span is not None:
+                span.attributes["status"] = response.status_code
+        if response.status_code != 200:
+            MPESA_ERRORS.inc(operation)
+        return response
+    
+    def _stk_password(self) -> Tuple[str, str]:
+        """Timestamp and the matching Lipa Na M-Pesa password"""
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        password = base64.b64encode(
+            f"{self.shortcode}{self.passkey}{timestamp}".encode()
+        ).decode()
+        return timestamp, password
+    
+    @tracing.traced("mpesa.stk_query")
+    async def query_stk_status(self, checkout_request_id: str) -> Dict:
+        """Query the result of an STK Push
+        
+        result_code is 0 when paid, another M-Pesa code when the payment failed
+        or was cancelled, and None while the customer has not responded yet.
+        """
+        try:
+            if not all([self.consumer_key, self.consumer_secret, self.shortcode, self.passkey]):
+                return {
+                    "success": False,
+                    "result_code": None,
+                    "message": "M-Pesa credentials not configured"
+                }
+            
+            access_token = await self.get_access_token()
+            
+            if not access_token:
+                return {
+                    "success": False,
+                    "result_code": None,
+                    "message": "Failed to authenticate with M-Pesa"
+                }
+            
+            timestamp, password = self._stk_password()
+            payload = {
+                "BusinessShortCode": self.shortcode,
+                "Password": password,
+                "Timestamp": timestamp,
+                "CheckoutRequestID": checkout_request_id
+            }
+            
+            headers = {
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            }
+            
+            response = await self._call("stk_query", self.http.post, self.stk_query_url, json=payload, headers=headers)
+            
+            if response.status_code == 200:
+                result = response.json()
+                return {
+                    "success": True,
+                    "result_code": int(result.get("ResultCode")),
+                    "message": result.get("ResultDesc")
+                }
+            else:
+                if response.status_code == 401:
+                    self.invalidate_access_token()
+                # Daraja answers with an error while the transaction is still being processed
+                return {
+                    "success": False,
+                    "result_code": None,
+                    "message": response.text
+                }
+                
+        except Exception as e:
+            logger.error("Error querying STK Push %s: %s", checkout_request_id, e)
+            return {
+                "success": False,
+                "result_code": None,
+                "message": f"Payment query error: {str(e)}"
+            }
+    
+    async def close(self) -> None:
+        """Release pooled HTTP connections"""
+        await self.http.close()
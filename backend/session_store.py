@@ -0,0 +1,111 @@
+from typing import Dict, Optional, Callable, Any
+from collections import OrderedDict
+from datetime import datetime
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SessionStore:
+    """Bounded in-memory session store with idle TTL expiry and LRU eviction
+
+    Sessions for which is_pinned returns True, such as ones waiting for a
+    payment callback, are passed over by LRU eviction; the store grows past
+    max_sessions rather than drop them. They still expire after the TTL.
+    """
+
+    def __init__(self, max_sessions: int = None, ttl: float = None, sweep_batch: int = None,
+                 on_evict: Callable[[str, Dict], None] = None,
+                 is_pinned: Callable[[Dict], bool] = None):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_ENTRIES", 100000))
+        self.ttl = ttl or float(os.getenv("SESSION_TTL_SECONDS", 86400))
+        # Oldest entries checked for expiry on every access
+        self.sweep_batch = sweep_batch or int(os.getenv("SESSION_SWEEP_BATCH", 2))
+        self.on_evict = on_evict
+        self.is_pinned = is_pinned
+
+        self._sessions: "OrderedDict[str, Dict]" = OrderedDict()
+        self.stats = {"expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, phone_number: str) -> bool:
+        return self.get(phone_number) is not None
+
+    def __getitem__(self, phone_number: str) -> Dict:
+        session = self.get(phone_number)
+        if session is None:
+            raise KeyError(phone_number)
+        return session
+
+    def __setitem__(self, phone_number: str, session: Dict) -> None:
+        self.set(phone_number, session)
+
+    def get(self, phone_number: str, default: Any = None) -> Optional[Dict]:
+        """Get a live session and mark it as recently used"""
+        self._sweep()
+        session = self._sessions.get(phone_number)
+        if session is None:
+            return default
+        if self._is_expired(session, time.time()):
+            self._evict(phone_number, "expired")
+            return default
+        self._sessions.move_to_end(phone_number)
+        return session
+
+    def set(self, phone_number: str, session: Dict) -> None:
+        """Store a session, evicting the least recently used one when full"""
+        self._sweep()
+        self._sessions[phone_number] = session
+        self._sessions.move_to_end(phone_number)
+        while len(self._sessions) > self.max_sessions:
+            victim = self._eviction_victim(phone_number)
+            if victim is None:
+                # Everything else is pinned, never evict the session just stored
+                return
+            self._evict(victim, "evicted")
+
+    def _eviction_victim(self, keep: str) -> Optional[str]:
+        """Least recently used session that is not pinned, other than keep"""
+        if self.is_pinned is None:
+            return next(iter(self._sessions))
+        for phone_number, session in self._sessions.items():
+            if phone_number != keep and not self.is_pinned(session):
+                return phone_number
+        return None
+
+    def pop(self, phone_number: str, default: Any = None) -> Optional[Dict]:
+        """Remove a session without counting it as an eviction"""
+        return self._sessions.pop(phone_number, default)
+
+    def _sweep(self) -> None:
+        """Expire a few of the least recently used sessions, amortising cleanup over requests"""
+        now = time.time()
+        for _ in range(self.sweep_batch):
+            if not self._sessions:
+                return
+            oldest = next(iter(self._sessions))
+            if not self._is_expired(self._sessions[oldest], now):
+                return
+            self._evict(oldest, "expired")
+
+    def _is_expired(self, session: Dict, now: float) -> bool:
+        """Check whether a session has been idle for longer than the TTL"""
+        last_seen = self._last_seen(session)
+        return last_seen is not None and now - last_seen > self.ttl
+
+    def _last_seen(self, session: Dict) -> Optional[float]:
+        """Epoch seconds of the session's last interaction"""
+        last_interaction = session.get("last_interaction")
+        if isinstance(last_interaction, str):
+            return datetime.fromisoformat(last_interaction).timestamp()
+        return last_interaction
+
+    def _evict(self, phone_number: str, reason: str) -> None:
+        """Drop a session and notify the owner"""
+        session = self._sessions.pop(phone_number)
+        self.stats[reason] += 1
+        if self.on_evict:
+            self.on_evict(phone_number, session)
@@ -0,0 +1,471 @@
+from typing import Dict, List, Optional, Tuple, AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+import tracing
+from database import Database
+from models import SessionRecord
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = SessionRecord.__slots__
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    phone_number TEXT PRIMARY KEY,
+    profile_name TEXT,
+    state INTEGER NOT NULL,
+    created_at REAL,
+    last_interaction REAL,
+    selected_service TEXT,
+    location TEXT,
+    latitude REAL,
+    longitude REAL,
+    available_provider_ids TEXT,
+    selected_provider_id TEXT,
+    booking_details TEXT,
+    payment_reference TEXT
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS providers (
+    id TEXT PRIMARY KEY,
+    service TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS processed_requests (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    completed INTEGER NOT NULL,
+    result TEXT,
+    stored_at REAL NOT NULL
+);
+"""
+
+# Bumped whenever stored data needs a migration; kept in PRAGMA user_version
+SCHEMA_VERSION = 2
+
+SESSION_INDEXES = """
+CREATE INDEX IF NOT EXISTS sessions_payment_reference ON sessions (payment_reference)
+    WHERE payment_reference IS NOT NULL;
+"""
+
+# Fixed statement text so sqlite3's statement cache reuses the prepared statements
+UPSERT_SESSION = (
+    f"INSERT OR REPLACE INTO sessions ({', '.join(SESSION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in SESSION_COLUMNS)})"
+)
+SELECT_SESSION = f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions WHERE phone_number = ?"
+SELECT_SESSION_BY_PAYMENT = f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions WHERE payment_reference = ?"
+# A retried payment callback must not replace or duplicate its booking
+INSERT_BOOKING = "INSERT OR IGNORE INTO bookings (booking_id, data) VALUES (?, ?)"
+UPSERT_PROVIDER = "INSERT OR REPLACE INTO providers (id, service, data) VALUES (?, ?, ?)"
+SELECT_PROVIDERS = "SELECT service, data FROM providers ORDER BY rowid"
+# Takes a free or expired lease, or renews our own; changes no row while another owner holds it
+ACQUIRE_LEASE = (
+    "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+    "WHERE leases.expires_at < ? OR leases.owner = excluded.owner"
+)
+RENEW_LEASE = "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?"
+RELEASE_LEASE = "DELETE FROM leases WHERE key = ? AND owner = ?"
+# Claims a request id that is new, expired, or left in flight by a worker that died
+CLAIM_REQUEST = (
+    "INSERT INTO processed_requests (key, owner, completed, result, stored_at) VALUES (?, ?, 0, NULL, ?) "
+    "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, completed = 0, result = NULL, stored_at = excluded.stored_at "
+    "WHERE (processed_requests.completed = 1 AND processed_requests.stored_at < ?) "
+    "OR (processed_requests.completed = 0 AND processed_requests.stored_at < ?)"
+)
+COMPLETE_REQUEST = "UPDATE processed_requests SET completed = 1, result = ?, stored_at = ? WHERE key = ? AND owner = ?"
+RELEASE_REQUEST = "DELETE FROM processed_requests WHERE key = ? AND owner = ? AND completed = 0"
+SELECT_REQUEST = "SELECT completed, result FROM processed_requests WHERE key = ?"
+PURGE_REQUESTS = "DELETE FROM processed_requests WHERE stored_at < ?"
+
+# Expired request ids are purged once every this many claims
+REQUEST_PURGE_INTERVAL = 1000
+
+# Longest wait between attempts to take a lease held by another worker
+LEASE_MAX_BACKOFF = 0.05
+
+class SQLiteDatabase(Database):
+    """SQLite (WAL) storage backend behind the Database interface
+
+    Reads run on a small pool of per-thread connections. Writes are queued
+    and committed in batches by a single writer thread. Live sessions are
+    kept in the in-memory SessionStore as a write-through cache.
+
+    In shared mode several worker processes use the same file: sessions are
+    re-read at the start of every message, updates only write the columns
+    they change, and conversations are claimed with a lease row so one
+    worker at a time handles a given phone number.
+    """
+
+    def __init__(self, path: str = None, pool_size: int = None, commit_interval: float = None,
+                 max_sessions: int = None, session_ttl: float = None, shared: bool = None,
+                 lease_ttl: float = None):
+        self.path = path or os.getenv("SQLITE_PATH", "groovehire.db")
+        self.pool_size = pool_size or int(os.getenv("SQLITE_POOL_SIZE", 4))
+        # How long the writer waits to gather more writes into one commit
+        self.commit_interval = commit_interval if commit_interval is not None else float(os.getenv("SQLITE_COMMIT_INTERVAL", 0.002))
+        # Shared by default whenever uvicorn runs more than one worker
+        if shared is None:
+            shared = os.getenv("SQLITE_SHARED", str(int(os.getenv("WEB_CONCURRENCY", 1)) > 1)).lower() in ("1", "true", "yes")
+        self.shared = shared
+        # A lease left by a crashed worker is taken over after this long; live holders renew it
+        self.lease_ttl = lease_ttl or float(os.getenv("SQLITE_LEASE_TTL", 30))
+        self.owner = f"{os.getpid()}:{id(self):x}"
+
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite-read")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-write")
+        self._pending_writes: List[Tuple[str, Tuple, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._request_claims = 0
+
+        self._writer.submit(self._create_schema).result()
+        super().__init__(max_sessions=max_sessions, session_ttl=session_ttl)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection owned by the current pool thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                isolation_level=None,
+                check_same_thread=False,
+                cached_statements=256
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA busy_timeout=5000")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _create_schema(self) -> None:
+        """Create tables on the writer connection and migrate older files"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            # executescript would commit first, so statements run one by one inside the transaction
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+
+            # Add session columns introduced after the table was first created
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(sessions)")}
+            for column in SESSION_COLUMNS:
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE sessions ADD COLUMN {column}")
+            for statement in SESSION_INDEXES.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+
+            if version < 2:
+                self._migrate_providers(connection)
+            if version < SCHEMA_VERSION:
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _migrate_providers(self, connection: sqlite3.Connection) -> None:
+        """Bring providers seeded before coordinates were added up to the current catalog
+
+        Known providers get their coordinates and service areas from the
+        sample catalog; the display distance they used to carry is dropped.
+        Stored edits to other fields are kept.
+        """
+        catalog = {
+            provider["id"]: provider
+            for providers in self._initialize_sample_providers().values()
+            for provider in providers
+        }
+        rows = connection.execute("SELECT id, service, data FROM providers").fetchall()
+        for provider_id, service, data in rows:
+            provider = json.loads(data)
+            provider.pop("distance", None)
+            provider.pop("distance_km", None)
+            sample = catalog.get(provider_id, {})
+            for field in ("lat", "lon", "areas"):
+                if field not in provider and field in sample:
+                    provider[field] = sample[field]
+            connection.execute(UPSERT_PROVIDER, (provider_id, service, json.dumps(provider)))
+        if rows:
+            logger.info("Migrated %s providers to schema version 2", len(rows))
+
+    def _load_providers(self) -> Dict:
+        """Load the catalog from the providers table, seeding it on first run"""
+        return self._writer.submit(self._load_providers_sync).result()
+
+    def _load_providers_sync(self) -> Dict:
+        connection = self._connection()
+        rows = connection.execute(SELECT_PROVIDERS).fetchall()
+        if not rows:
+            catalog = self._initialize_sample_providers()
+            connection.execute("BEGIN")
+            connection.executemany(UPSERT_PROVIDER, [
+                (provider["id"], service, json.dumps(provider))
+                for service, providers in catalog.items()
+                for provider in providers
+            ])
+            connection.execute("COMMIT")
+            return catalog
+
+        catalog: Dict[str, List[Dict]] = {}
+        for service, data in rows:
+            catalog.setdefault(service, []).append(json.loads(data))
+        return catalog
+
+    async def _read(self, sql: str, params: Tuple) -> Optional[Tuple]:
+        """Run a single-row query on the reader pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._read_sync, sql, params)
+
+    def _read_sync(self, sql: str, params: Tuple) -> Optional[Tuple]:
+        return self._connection().execute(sql, params).fetchone()
+
+    async def _write(self, sql: str, params: Tuple) -> int:
+        """Queue a write and wait until the batch holding it is committed, returning its row count"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_writes.append((sql, params, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        """Commit everything queued so far in one transaction"""
+        if self.commit_interval:
+            await asyncio.sleep(self.commit_interval)
+        batch, self._pending_writes = self._pending_writes, []
+        self._flush_task = None
+
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._writer, self._commit_batch, batch)
+        except Exception as e:
+            logger.error("Error committing %s writes: %s", len(batch), e)
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _commit_batch(self, batch: List[Tuple[str, Tuple, asyncio.Future]]) -> List:
+        """Row count of each write, or the exception that write raised"""
+        connection = self._connection()
+        try:
+            return self._commit(connection, [(sql, params) for sql, params, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error("Error committing write: %s", e)
+                return [e]
+            logger.warning("Batch of %s writes failed (%s), retrying them one at a time", len(batch), e)
+
+        # Commit each write on its own so only the failing ones report an error
+        results = []
+        for sql, params, _ in batch:
+            try:
+                results.append(self._commit(connection, [(sql, params)])[0])
+            except Exception as e:
+                logger.error("Error committing write: %s", e)
+                results.append(e)
+        return results
+
+    def _commit(self, connection: sqlite3.Connection, statements: List[Tuple[str, Tuple]]) -> List[int]:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row_counts = [connection.execute(sql, params).rowcount for sql, params in statements]
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return row_counts
+
+    def _session_row(self, session: SessionRecord) -> Tuple:
+        """Flatten a session into column values"""
+        row = []
+        for column in SESSION_COLUMNS:
+            value = getattr(session, column)
+            if column == "available_provider_ids" and value is not None:
+                value = ",".join(value)
+            elif column == "state":
+                value = int(value)
+            row.append(value)
+        return tuple(row)
+
+    def _session_from_row(self, row: Tuple) -> SessionRecord:
+        """Rebuild a session from column values"""
+        fields = dict(zip(SESSION_COLUMNS, row))
+        if fields["available_provider_ids"] is not None:
+            fields["available_provider_ids"] = tuple(fields["available_provider_ids"].split(","))
+        return SessionRecord(**fields)
+
+    @tracing.traced("db.get_user_session")
+    async def get_user_session(self, phone_number: str) -> Optional[SessionRecord]:
+        """Get user session by phone number"""
+        # Other workers may have changed a shared session, so only trust the cache when unshared
+        session = None if self.shared else self.user_sessions.get(phone_number)
+        if session is None:
+            row = await self._read(SELECT_SESSION, (phone_number,))
+            if row is None:
+                return None
+            session = self._session_from_row(row)
+            self.user_sessions[phone_number] = session
+        return session
+
+    @tracing.traced("db.create_user_session")
+    async def create_user_session(self, session: Dict) -> None:
+        """Create new user session"""
+        if not isinstance(session, SessionRecord):
+            session = SessionRecord(**session)
+        phone_number = session.phone_number
+        self.user_sessions[phone_number] = session
+        await self._write(UPSERT_SESSION, self._session_row(session))
+        logger.debug("Created session for %s", phone_number)
+
+    @tracing.traced("db.update_user_session")
+    async def update_user_session(self, phone_number: str, updates: Dict) -> None:
+        """Update user session"""
+        session = self.user_sessions.get(phone_number)
+        if session is None:
+            session = await self.get_user_session(phone_number)
+        if session is not None:
+            session.update(updates)
+            if self.shared:
+                # Write only the changed columns so a stale copy never overwrites another worker's changes
+                row = self._session_row(session)
+                columns = [i for i, column in enumerate(SESSION_COLUMNS) if column in updates]
+                await self._write(
+                    f"UPDATE sessions SET {', '.join(f'{SESSION_COLUMNS[i]} = ?' for i in columns)} WHERE phone_number = ?",
+                    tuple(row[i] for i in columns) + (phone_number,)
+                )
+            else:
+                await self._write(UPSERT_SESSION, self._session_row(session))
+            logger.debug("Updated session for %s", phone_number)
+
+    @asynccontextmanager
+    async def conversation_lease(self, phone_number: str) -> AsyncIterator[None]:
+        """Claim a conversation so no other worker process handles it meanwhile"""
+        if not self.shared:
+            yield
+            return
+
+        backoff = self.commit_interval or 0.001
+        while True:
+            now = time.time()
+            if await self._write(ACQUIRE_LEASE, (phone_number, self.owner, now + self.lease_ttl, now)):
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, LEASE_MAX_BACKOFF)
+        # Keep extending the lease while the conversation is held, however long that takes
+        renewer = asyncio.create_task(self._renew_lease(phone_number))
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await asyncio.gather(renewer, return_exceptions=True)
+            await self._write(RELEASE_LEASE, (phone_number, self.owner))
+
+    async def _renew_lease(self, phone_number: str) -> None:
+        """Push a held lease's expiry back every third of its TTL"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                renewed = await self._write(RENEW_LEASE, (time.time() + self.lease_ttl, phone_number, self.owner))
+            except Exception as e:
+                logger.warning("Could not renew lease on %s: %s", phone_number, e)
+                continue
+            if not renewed:
+                logger.error("Lease on %s expired and was taken by another worker", phone_number)
+                return
+
+    async def claim_request(self, key: str, ttl: float, claim_timeout: float) -> bool:
+        """Record a request id as being handled by this worker, False if another worker has it"""
+        now = time.time()
+        self._request_claims += 1
+        if self._request_claims % REQUEST_PURGE_INTERVAL == 0:
+            await self._write(PURGE_REQUESTS, (now - ttl,))
+        return bool(await self._write(
+            CLAIM_REQUEST, (key, self.owner, now, now - ttl, now - claim_timeout)
+        ))
+
+    async def complete_request(self, key: str, result) -> None:
+        """Store the result of a claimed request for duplicates to replay"""
+        await self._write(COMPLETE_REQUEST, (json.dumps(result), time.time(), key, self.owner))
+
+    async def release_request(self, key: str) -> None:
+        """Give up a claimed request that failed, so a retry handles it again"""
+        await self._write(RELEASE_REQUEST, (key, self.owner))
+
+    async def request_result(self, key: str) -> Optional[Tuple[bool, object]]:
+        """(completed, result) of a recorded request id, or None"""
+        row = await self._read(SELECT_REQUEST, (key,))
+        if row is None:
+            return None
+        completed, result = row
+        return bool(completed), json.loads(result) if completed else None
+
+    @tracing.traced("db.find_user_by_payment_reference")
+    async def find_user_by_payment_reference(self, payment_ref: str) -> Optional[SessionRecord]:
+        """Find user session by payment reference"""
+        row = await self._read(SELECT_SESSION_BY_PAYMENT, (payment_ref,))
+        if row is None:
+            return None
+        return await self.get_user_session(row[0])
+
+    @tracing.traced("db.create_booking")
+    async def create_booking(self, booking: Dict) -> bool:
+        """Create new booking, returning False if one with the same id already exists"""
+        booking_id = booking["booking_id"]
+        if not await self._write(INSERT_BOOKING, (booking_id, json.dumps(booking))):
+            logger.info("Booking %s already exists", booking_id)
+            return False
+        logger.info("Created booking %s", booking_id)
+        return True
+
+    async def update_provider(self, provider_id: str, updates: Dict) -> None:
+        """Update provider details in the catalog"""
+        provider = self.providers_by_id.get(provider_id)
+        if provider is not None:
+            provider.update(updates)
+            if updates.keys() & {"areas", "lat", "lon"}:
+                self._build_provider_indexes()
+            service = next(
+                key for key, providers in self.providers.items()
+                if any(candidate is provider for candidate in providers)
+            )
+            await self._write(UPSERT_PROVIDER, (provider_id, service, json.dumps(provider)))
+            logger.info("Updated provider %s", provider_id)
+
+    async def close(self) -> None:
+        """Commit queued writes and close every pooled connection"""
+        if self._flush_task is not None:
+            await self._flush_task
+        self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Stress test for per-conversation ordering in the GrooveHire bot
+"""
+
+import asyncio
+import logging
+import random
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from models import SessionState
+from sqlite_database import SQLiteDatabase
+
+USERS = 200
+ROUNDS = 5
+
+CONVERSATION = [
+    "Hi",
+    "1",  # Plumbing
+    "Westlands",  # Location
+    "1",  # First provider
+    "Fix a leaking tap tomorrow morning",  # Details
+    "PAY",  # Payment
+]
+
+class SlowDatabase(Database):
+    """In-memory database that yields on every session read and write, like a real backend"""
+
+    async def get_user_session(self, phone_number):
+        await asyncio.sleep(random.uniform(0, 0.002))
+        return await super().get_user_session(phone_number)
+
+    async def update_user_session(self, phone_number, updates):
+        await asyncio.sleep(random.uniform(0, 0.002))
+        return await super().update_user_session(phone_number, updates)
+
+async def run_burst(bot: GrooveHireBot, phones) -> None:
+    """Fire every user's whole conversation at once, interleaved across users"""
+    tasks = [
+        asyncio.create_task(bot.process_message(phone, message, "Test User"))
+        for message in CONVERSATION
+        for phone in phones
+    ]
+    await asyncio.gather(*tasks)
+
+async def test_interleaved_bursts():
+    """Bursts for many users always leave each conversation in its final state"""
+    print(f"\n🔀 {ROUNDS} bursts of {USERS} users x {len(CONVERSATION)} messages")
+
+    for round_number in range(ROUNDS):
+        bot = GrooveHireBot(SlowDatabase())
+        phones = [f"+2547{round_number}{i:07d}" for i in range(USERS)]
+
+        started = time.perf_counter()
+        await run_burst(bot, phones)
+        elapsed = time.perf_counter() - started
+
+        for phone in phones:
+            session = await bot.db.get_user_session(phone)
+            assert session["state"] == SessionState.COMPLETED, (phone, session["state"])
+            assert session["selected_service"] == "Plumbing"
+            assert session["location"] == "Westlands"
+            assert session["selected_provider_id"] is not None
+            assert session["booking_details"] == CONVERSATION[4].lower()
+            assert session["payment_reference"]
+
+        # Idle conversations do not keep their locks around
+        assert len(bot.conversation_locks) == 0
+        print(f"   burst {round_number + 1}: {USERS * len(CONVERSATION):,} messages in {elapsed:.2f}s")
+
+async def test_parallel_across_users():
+    """A slow conversation does not hold up other users"""
+    print("\n⚡ Parallelism across conversations")
+    bot = GrooveHireBot(SlowDatabase())
+    gate = asyncio.Event()
+
+    async def blocked_lookup(phone_number, profile_name=None):
+        await gate.wait()
+        return await GrooveHireBot.get_user_session(bot, phone_number, profile_name)
+
+    # Stall the first user inside its handler
+    original = bot.get_user_session
+    bot.get_user_session = lambda phone, name=None: (
+        blocked_lookup(phone, name) if phone == "+254700000001" else original(phone, name)
+    )
+
+    stalled = asyncio.create_task(bot.process_message("+254700000001", "Hi", "Slow User"))
+    await asyncio.sleep(0)
+    assert bot.conversation_locks.locked("+254700000001")
+
+    reply = await asyncio.wait_for(bot.process_message("+254700000002", "Hi", "Other User"), 1)
+    assert "Welcome to GrooveHire" in reply
+    assert not stalled.done()
+
+    gate.set()
+    await stalled
+    print("   other users proceed while one conversation is busy")
+
+async def test_shared_workers():
+    """Bots sharing one SQLite file serve any message of any conversation"""
+    print("\n🗄️  Two workers sharing a SQLite store")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "shared.db")
+        bots = [GrooveHireBot(SQLiteDatabase(path=path, shared=True)) for _ in range(2)]
+        phones = [f"+25471{i:07d}" for i in range(USERS)]
+
+        # Only one worker at a time holds a conversation
+        async with bots[0].db.conversation_lease(phones[0]):
+            waiting = asyncio.create_task(bots[1].process_message(phones[0], "Hi", "Test User"))
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+        await waiting
+
+        # A conversation held for longer than the lease TTL keeps its lease
+        lease_db = SQLiteDatabase(path=path, shared=True, lease_ttl=0.1)
+        async with lease_db.conversation_lease(phones[0]):
+            await asyncio.sleep(0.3)
+            waiting = asyncio.create_task(bots[1].process_message(phones[0], "Hi", "Test User"))
+            await asyncio.sleep(0.05)
+            assert not waiting.done()
+        await waiting
+        await lease_db.close()
+
+        # Each user waits for the reply, and a load balancer alternates the workers
+        async def converse(i, phone):
+            for step, message in enumerate(CONVERSATION):
+                await bots[(step + i) % 2].process_message(phone, message, "Test User")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(i, phone) for i, phone in enumerate(phones[1:], 1)))
+        elapsed = time.perf_counter() - started
+
+        for i, phone in enumerate(phones[1:], 1):
+            session = await bots[i % 2].db.get_user_session(phone)
+            assert session["state"] == SessionState.COMPLETED, (phone, session["state"])
+            assert session["booking_details"] == CONVERSATION[4].lower()
+            assert session["payment_reference"]
+
+        for bot in bots:
+            await bot.db.close()
+        print(f"   {(USERS - 1) * len(CONVERSATION):,} messages across 2 workers in {elapsed:.2f}s")
+
+async def main():
+    print("🤖 Testing GrooveHire conversation ordering...")
+    logging.disable(logging.WARNING)
+    await test_interleaved_bursts()
+    await test_parallel_across_users()
+    await test_shared_workers()
+    logging.disable(logging.NOTSET)
+    print("\n✅ Concurrency tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for the outbound WhatsApp dispatcher
+"""
+
+import asyncio
+import logging
+import threading
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from twilio.base.exceptions import TwilioRestException
+from dispatcher import MessageDispatcher, RateLimiter
+
+class FakeMessages:
+    """Stands in for client.messages, recording each call and failing on demand"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        # (monotonic time, sender, recipient, body) of every call, failed or not
+        self.calls = []
+        # Raised by the next calls, in order
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def create(self, body, from_, to):
+        with self._lock:
+            self.calls.append((time.monotonic(), from_, to, body))
+            failure = self.failures.pop(0) if self.failures else None
+        if self.latency:
+            time.sleep(self.latency)
+        if failure is not None:
+            raise failure
+        return {"sid": f"SM{len(self.calls)}"}
+
+class FakeTwilioClient:
+    def __init__(self, latency=0.0):
+        self.messages = FakeMessages(latency)
+
+def twilio_error(status):
+    return TwilioRestException(status, "https://api.twilio.com/Messages.json", msg=f"HTTP {status}")
+
+async def test_rate_limit():
+    """Each sender is held to its messages-per-second cap, senders don't share a cap"""
+    print("\n🚦 Rate limiting")
+    limiter = RateLimiter(rate=50)
+    started = time.monotonic()
+    for _ in range(11):
+        await limiter.acquire()
+    # Ten intervals of 20 ms after the first free slot
+    assert time.monotonic() - started >= 0.19
+
+    client = FakeTwilioClient()
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", rate=20, workers=4)
+    for i in range(10):
+        dispatcher.enqueue(f"+2547000000{i:02d}", "hello")
+        dispatcher.enqueue(f"+2547000000{i:02d}", "hello", sender="whatsapp:+2")
+    await dispatcher.stop()
+
+    for sender in ("whatsapp:+1", "whatsapp:+2"):
+        times = [at for at, from_, _, _ in client.messages.calls if from_ == sender]
+        assert len(times) == 10
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert min(gaps) >= 0.04, gaps
+    # Both senders ran side by side, not one after the other
+    elapsed = client.messages.calls[-1][0] - client.messages.calls[0][0]
+    assert elapsed < 0.7, elapsed
+    print(f"   20 messages over 2 senders at 20/s each in {elapsed:.2f}s")
+
+async def test_retries():
+    """429s, 5xx and network errors are retried with growing delays, 4xx are not"""
+    print("\n🔁 Retries with backoff")
+    client = FakeTwilioClient()
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", rate=1000,
+                                   max_retries=3, retry_backoff=0.05)
+    client.messages.failures = [twilio_error(429), twilio_error(503), ConnectionError("reset")]
+    dispatcher.enqueue("+254700000001", "retried")
+    await dispatcher.stop()
+    times = [at for at, _, _, _ in client.messages.calls]
+    assert len(times) == 4
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # 50, 100 and 200 ms plus up to half again of jitter
+    for gap, delay in zip(gaps, (0.05, 0.1, 0.2)):
+        assert delay <= gap < delay * 1.5 + 0.05, gaps
+    assert dispatcher.stats["sent"] == 1 and dispatcher.stats["retried"] == 3
+
+    # A bad request fails straight away
+    client.messages.failures = [twilio_error(400)]
+    dispatcher.enqueue("+254700000002", "invalid")
+    await dispatcher.stop()
+    assert len(client.messages.calls) == 5 and dispatcher.stats["failed"] == 1
+
+    # Retries stop after max_retries
+    client.messages.failures = [twilio_error(500)] * 4
+    dispatcher.enqueue("+254700000003", "gives up")
+    await dispatcher.stop()
+    assert len(client.messages.calls) == 9 and dispatcher.stats["failed"] == 2
+    print(f"   stats: {dispatcher.stats}")
+
+async def test_batching():
+    """A worker sends a batch of queued messages concurrently"""
+    print("\n📦 Batching")
+    client = FakeTwilioClient(latency=0.05)
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", rate=1000,
+                                   workers=1, batch_size=5)
+    started = time.monotonic()
+    for i in range(10):
+        dispatcher.enqueue(f"+2547000001{i:02d}", "batched")
+    await dispatcher.stop()
+    elapsed = time.monotonic() - started
+    assert dispatcher.stats["sent"] == 10
+    # Two batches of concurrent sends on one worker, not ten sends in a row
+    assert elapsed < 0.05 * 5, elapsed
+    print(f"   10 sends of 50 ms on one worker in {elapsed * 1000:.0f} ms")
+
+async def test_queue_full():
+    """Messages beyond the queue size are dropped, not blocked on"""
+    print("\n🪣 Full queue")
+    client = FakeTwilioClient()
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", queue_size=3)
+    accepted = [dispatcher.enqueue("+254700000004", f"message {i}") for i in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert dispatcher.stats["dropped"] == 2
+    await dispatcher.stop()
+    assert [body for _, _, _, body in client.messages.calls] == ["message 0", "message 1", "message 2"]
+
+async def test_stop_flushes():
+    """stop() sends everything already queued before the workers exit"""
+    print("\n🚿 Flush on stop")
+    client = FakeTwilioClient(latency=0.01)
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", rate=200, workers=2)
+    for i in range(20):
+        dispatcher.enqueue("+254700000005", f"message {i}")
+    await dispatcher.stop()
+    assert len(client.messages.calls) == 20 and dispatcher.stats["sent"] == 20
+    assert dispatcher.queue_depth == 0
+
+    # Messages still queued when the timeout runs out are reported, not waited on forever
+    client.messages.latency = 0.2
+    dispatcher = MessageDispatcher(client=client, sender="whatsapp:+1", workers=1, batch_size=1)
+    for i in range(5):
+        dispatcher.enqueue("+254700000005", f"late {i}")
+    await dispatcher.stop(timeout=0.1)
+    assert dispatcher.stats["sent"] < 5
+
+async def main():
+    print("🤖 Testing GrooveHire message dispatcher...")
+    logging.disable(logging.ERROR)
+    await test_rate_limit()
+    await test_retries()
+    await test_batching()
+    await test_queue_full()
+    await test_stop_flushes()
+    logging.disable(logging.NOTSET)
+    print("\n✅ Dispatcher tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
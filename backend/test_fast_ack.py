@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the fast-ack webhook mode
+"""
+
+import logging
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+import main
+from test_support import RecordingDispatcher, slow_stk_push, wait_until
+
+MPESA_LATENCY = 0.5
+
+def test_fast_ack():
+    """Webhooks return empty TwiML at once and replies go out through the dispatcher"""
+    print("\n⚡ Fast-ack webhooks")
+    main.FAST_ACK = True
+    outbound = RecordingDispatcher()
+    main.bot.dispatcher = outbound
+    main.bot.payment_service.initiate_stk_push = slow_stk_push(MPESA_LATENCY)
+    phone = "+254700000077"
+
+    with TestClient(main.app) as client:
+        messages = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]
+        latencies = []
+        for i, body in enumerate(messages):
+            started = time.perf_counter()
+            response = client.post("/webhook/whatsapp", data={
+                "From": f"whatsapp:{phone}", "Body": body, "ProfileName": "Fast User", "MessageSid": f"SMfast{i}"
+            })
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200
+            assert "<Message>" not in response.text
+
+        # Even the PAY step, waiting on M-Pesa, is acknowledged straight away
+        assert max(latencies) < MPESA_LATENCY, latencies
+
+        wait_until(lambda: len(outbound.sent) == len(messages))
+        assert [to for to, _ in outbound.sent] == [phone] * len(messages)
+        assert "Welcome to GrooveHire" in outbound.sent[0][1]
+        assert "M-Pesa payment request sent" in outbound.sent[-1][1]
+
+        # A retried message is not handled or answered again
+        client.post("/webhook/whatsapp", data={
+            "From": f"whatsapp:{phone}", "Body": "PAY", "MessageSid": "SMfast5"
+        })
+        time.sleep(0.1)
+        assert len(outbound.sent) == len(messages)
+        assert main.inbound.stats["handled"] == len(messages)
+
+        # A message that failed is answered with the error and handled again on retry
+        engine_dispatch = main.bot.engine.dispatch
+        async def failing_once(*args, **kwargs):
+            main.bot.engine.dispatch = engine_dispatch
+            raise RuntimeError("handler failed")
+        main.bot.engine.dispatch = failing_once
+        logging.disable(logging.ERROR)
+        for _ in range(2):
+            client.post("/webhook/whatsapp", data={
+                "From": f"whatsapp:{phone}", "Body": "Hi", "MessageSid": "SMfast6"
+            })
+            wait_until(lambda: main.inbound.stats["handled"] == len(messages) + 1 + _)
+        logging.disable(logging.NOTSET)
+        assert outbound.sent[-2][1] == main.bot.templates["error"].render()
+        assert outbound.sent[-1][1] != outbound.sent[-2][1]
+
+    print(f"   slowest ack {max(latencies) * 1000:.1f} ms with {MPESA_LATENCY * 1000:.0f} ms M-Pesa latency")
+
+if __name__ == "__main__":
+    print("🤖 Testing fast-ack webhooks...")
+    test_fast_ack()
+    print("\n✅ Fast-ack tests completed!")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for location extraction with the gazetteer
+"""
+
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from gazetteer import Gazetteer, edit_distance
+from geo import AREA_CENTROIDS
+
+CASES = {
+    "Exact names": {
+        "Westlands": "Westlands",
+        "I live in Karen": "Karen",
+        "we are at south b near the mall": "South B",
+        "village market": "Village Market",
+        "Lower Kabete please": "Lower Kabete",
+        "tatu city": "Tatu City",
+        "mombasa": "Mombasa",
+    },
+    "Aliases": {
+        "town": "CBD",
+        "city centre": "CBD",
+        "upper hill": "Upperhill",
+        "Lang'ata": "Langata",
+        "mlolongo": "Athi River",
+        "kahawa west": "Kahawa",
+    },
+    "Prefixes": {
+        "westl": "Westlands",
+        "kilim": "Kilimani",
+        "kileleshw": "Kileleshwa",
+        "parkland": "Parklands",
+        "lower kab": "Lower Kabete",
+        "buru": "Buruburu",
+    },
+    "Typos": {
+        "im in westlnds": "Westlands",
+        "kilimany": "Kilimani",
+        "kasarni": "Kasarani",
+        "eastliegh": "Eastleigh",
+        "kitengla": "Kitengela",
+    },
+    "No place": {
+        "near the park": None,
+        "my dad baba": None,
+        "around tatu": None,
+        "lower": None,
+        "i am in the village": None,
+        "the west": None,
+        "fix a leaking tap tomorrow morning": None,
+        "my house": None,
+        "hello": None,
+        "": None,
+    },
+}
+
+def test_cases(gazetteer):
+    for label, cases in CASES.items():
+        print(f"\n📍 {label}")
+        for message, expected in cases.items():
+            found = gazetteer.find(message)
+            assert found == expected, (message, found, expected)
+            print(f"   {message!r} -> {found}")
+
+def test_ambiguous_prefix():
+    """A prefix shared by two places matches neither"""
+    print("\n🔀 Ambiguous prefixes")
+    gazetteer = Gazetteer({"kahawa": [], "kahawa sukari": [], "kasarani": [], "kasabuni": []})
+    assert gazetteer.lookup("kasa") is None
+    assert gazetteer.lookup("kasaran") == "kasarani"
+    # A whole name beats a longer place it is a prefix of
+    assert gazetteer.lookup("kahawa suk") == "kahawa"
+
+def test_edit_distance():
+    print("\n📐 Edit distance")
+    assert edit_distance("westlands", "westlands") == 0
+    assert edit_distance("westlnds", "westlands") == 1
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+
+async def test_location_pin():
+    """A shared pin is named the way a typed location would be"""
+    print("\n📌 Location pins")
+    bot = GrooveHireBot(Database())
+    phone = "+254700000088"
+    for message in ("Hi", "1"):
+        await bot.process_message(phone, message)
+    latitude, longitude = AREA_CENTROIDS["cbd"]
+    await bot.process_message(phone, "", latitude=latitude, longitude=longitude)
+    session = await bot.db.get_user_session(phone)
+    assert session["location"] == "CBD", session["location"]
+    print(f"   {latitude}, {longitude} -> {session['location']}")
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire gazetteer...")
+    test_cases(Gazetteer())
+    test_ambiguous_prefix()
+    test_edit_distance()
+    asyncio.run(test_location_pin())
+    print("\n✅ Gazetteer tests completed!")
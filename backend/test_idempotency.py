@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for duplicate webhook handling
+"""
+
+import asyncio
+import logging
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+from idempotency import IdempotencyCache
+from models import SessionState
+from sqlite_database import SQLiteDatabase
+import main
+
+async def test_cache():
+    """Duplicates replay the first result, failures are forgotten, the cache stays bounded"""
+    print("\n🔁 IdempotencyCache")
+    cache = IdempotencyCache(max_entries=3, ttl=60)
+    calls = []
+
+    async def operation(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    # Concurrent duplicates share the in-flight result
+    results = await asyncio.gather(*(cache.run("SM1", lambda: operation("first")) for _ in range(5)))
+    assert results == ["first"] * 5 and calls == ["first"]
+    assert await cache.run("SM1", lambda: operation("second")) == "first"
+    assert cache.stats["hits"] == 5
+
+    # A failed request runs again on retry
+    async def failing():
+        raise RuntimeError("boom")
+    try:
+        await cache.run("SM2", failing)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert "SM2" not in cache
+    assert await cache.run("SM2", lambda: operation("retried")) == "retried"
+
+    # Oldest entries are dropped past the cap
+    for key in ("SM3", "SM4", "SM5"):
+        await cache.run(key, lambda: operation(key))
+    assert len(cache) == 3 and "SM1" not in cache
+    assert cache.stats["evicted"] == 2
+
+    # Expired entries run again
+    cache.ttl = 0
+    await asyncio.sleep(0.001)
+    assert await cache.run("SM5", lambda: operation("fresh")) == "fresh"
+    print(f"   stats: {cache.stats}")
+
+async def test_shared_store(directory):
+    """Workers sharing a SQLite store handle each id once between them"""
+    print("\n🗄️  Shared across workers")
+    path = os.path.join(directory, "requests.db")
+    stores = [SQLiteDatabase(path, shared=True) for _ in range(2)]
+    workers = [IdempotencyCache(ttl=60, store=store, namespace="message") for store in stores]
+    calls = []
+
+    async def operation(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    # The same MessageSid reaches both workers at once
+    results = await asyncio.gather(
+        workers[0].run("SM1", lambda: operation("first")),
+        workers[1].run("SM1", lambda: operation("second"))
+    )
+    assert len(calls) == 1 and results == [calls[0]] * 2
+    # And again later, to the worker that did not handle it
+    other = workers[1] if calls[0] == "first" else workers[0]
+    assert await other.run("SM1", lambda: operation("third")) == calls[0]
+
+    # A failure is released, so the retry runs on the other worker
+    async def failing():
+        raise RuntimeError("boom")
+    try:
+        await workers[0].run("SM2", failing)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert await workers[1].run("SM2", lambda: operation("retried")) == "retried"
+
+    # Namespaces keep message and payment ids apart
+    payments = IdempotencyCache(ttl=60, store=stores[1], namespace="payment")
+    assert await payments.run("SM1", lambda: operation("payment")) == "payment"
+
+    # A worker restarted on the same file still knows the ids
+    await stores[0].close()
+    restarted = IdempotencyCache(ttl=60, store=SQLiteDatabase(path, shared=True), namespace="message")
+    assert await restarted.run("SM1", lambda: operation("after restart")) == calls[0]
+    assert calls == [calls[0], "retried", "payment"]
+
+    # A claim left by a worker that died mid-request is taken over
+    await stores[1].claim_request("message:SM3", 60, 60)
+    restarted.claim_timeout = 0.05
+    await asyncio.sleep(0.1)
+    assert await restarted.run("SM3", lambda: operation("taken over")) == "taken over"
+    print(f"   stats: {[worker.stats for worker in workers]}")
+    await stores[1].close()
+    await restarted.store.close()
+
+def test_webhooks():
+    """Retried webhooks get the same reply without advancing the conversation twice"""
+    print("\n📨 Webhook retries")
+    client = TestClient(main.app)
+    phone = "+254700000099"
+
+    def send(sid, body):
+        response = client.post("/webhook/whatsapp", data={
+            "From": f"whatsapp:{phone}", "Body": body, "ProfileName": "Retry User", "MessageSid": sid
+        })
+        assert response.status_code == 200
+        return response.text
+
+    first = send("SMaaa", "Hi")
+    assert send("SMaaa", "Hi") == first
+    chosen = send("SMbbb", "1")
+    # Twilio retries the same message after a slow reply
+    assert send("SMbbb", "1") == chosen
+    session = asyncio.run(main.db.get_user_session(phone))
+    assert session["state"] == SessionState.LOCATION_REQUEST
+
+    # A message that fails is not remembered, Twilio's retry gets a real reply
+    find_providers = main.bot.service_matcher.find_providers
+    async def failing_once(*args, **kwargs):
+        main.bot.service_matcher.find_providers = find_providers
+        raise RuntimeError("provider index unavailable")
+    main.bot.service_matcher.find_providers = failing_once
+    logging.disable(logging.ERROR)
+    failed = send("SMccc", "Westlands")
+    logging.disable(logging.NOTSET)
+    assert "SMccc" not in main.processed_messages
+    assert main.bot.templates["error"].render() in failed
+    retried = send("SMccc", "Westlands")
+    assert retried != failed and "Mike Johnson" in retried
+    assert send("SMccc", "Westlands") == retried
+    session = asyncio.run(main.db.get_user_session(phone))
+    assert session["state"] == SessionState.PROVIDER_SELECTION
+
+    # A repeated M-Pesa callback is handled once
+    callback = {"CheckoutRequestID": "ws_CO_retry", "ResultCode": 1}
+    for _ in range(3):
+        assert client.post("/webhook/mpesa", json=callback).json()["ResultCode"] == 0
+    assert main.processed_payments.stats == {"hits": 2, "misses": 1, "expired": 0, "evicted": 0}
+    print(f"   message stats: {main.processed_messages.stats}")
+
+async def main_async():
+    print("🤖 Testing duplicate webhook handling...")
+    await test_cache()
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        await test_shared_store(directory)
+    logging.disable(logging.NOTSET)
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
+    test_webhooks()
+    print("\n✅ Idempotency tests completed!")
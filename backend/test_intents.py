@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for service classification
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from intents import IntentMatcher
+
+# Messages the original keyword checks already got right
+BASELINE = {
+    "plumbing": "Plumbing",
+    "i need a plumber": "Plumbing",
+    "my tap is leaking": "Plumbing",
+    "blocked pipes in the kitchen": "Plumbing",
+    "electrician please": "Electrical",
+    "the lights keep flickering": "Electrical",
+    "need someone to clean my house": "Cleaning",
+    "house cleaning on saturday": "Cleaning",
+    "maths tutor for my son": "Tutoring",
+    "teacher for chemistry lessons": "Tutoring",
+    "car repair": "Car Repair",
+    "my car won't start, need a mechanic": "Car Repair",
+    "paint my walls": "Painting",
+    "painter for the living room": "Painting",
+    "hello": None,
+    "": None,
+}
+
+# Word fragments that used to pick the wrong service
+FRAGMENTS = {
+    "carpet cleaning": "Cleaning",
+    "house wiring": "Electrical",
+    "my wallet": None,
+    "taarifa": None,
+    "example": None,
+    "exams next week": "Tutoring",
+}
+
+# Swahili requests
+SWAHILI = {
+    "bomba inavuja": "Plumbing",
+    "taa haziwaki": "Electrical",
+    "usafi wa nyumba": "Cleaning",
+    "nahitaji mwalimu": "Tutoring",
+    "gari imeharibika": "Car Repair",
+    "kupaka rangi ukuta": "Painting",
+}
+
+def classify(bot, message):
+    key = bot.service_intents.match(message)
+    return bot.SERVICES[key]["name"] if key else None
+
+def check(bot, cases, label):
+    print(f"\n🔤 {label}")
+    for message, expected in cases.items():
+        found = classify(bot, message)
+        assert found == expected, (message, found, expected)
+        print(f"   {message!r} -> {found}")
+
+def test_matching_rules():
+    """Whole words, plural endings, stems, weights and ties"""
+    print("\n📏 Matching rules")
+    matcher = IntentMatcher(
+        {"a": ["pipe", "plumb*", "house"], "b": ["wire", "car"]},
+        weak={"house", "car"}
+    )
+    assert matcher.match("pipes") == "a"
+    assert matcher.match("plumbers") == "a"
+    assert matcher.match("pipeline") is None
+    assert matcher.match("unplumbed") is None
+    assert matcher.match("house wire") == "b"
+    # Equal scores go to the first mention
+    assert matcher.match("car house") == "b"
+    assert matcher.match("house car") == "a"
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire service classification...")
+    bot = GrooveHireBot(Database())
+    check(bot, BASELINE, "Messages the baseline classified")
+    check(bot, FRAGMENTS, "Word fragments")
+    check(bot, SWAHILI, "Swahili")
+    test_matching_rules()
+    print("\n✅ Service classification tests completed!")
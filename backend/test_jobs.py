@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test script for the durable job queue
+"""
+
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from jobs import JobQueue
+from sqlite_database import SQLiteDatabase
+from test_support import RecordingDispatcher, stk_push, wait_for
+
+SPIKE_JOBS = 2_000
+
+def fast_queue(path, **options):
+    return JobQueue(path=path, retry_backoff=0.01, poll_interval=0.02, **options)
+
+async def test_durability(directory):
+    """Jobs committed before a restart are processed by the next process"""
+    print("\n💾 Jobs survive a restart")
+    path = os.path.join(directory, "durable.db")
+    queue = fast_queue(path)
+    for i in range(3):
+        await queue.enqueue("note", {"n": i})
+    await queue.close()
+
+    seen = []
+    async def handler(payload):
+        seen.append(payload["n"])
+
+    queue = fast_queue(path)
+    queue.register("note", handler)
+    queue.start()
+    await wait_for(lambda: len(seen) == 3)
+    assert sorted(seen) == [0, 1, 2]
+    assert await queue.counts() == {"pending": 0, "dead": 0}
+    await queue.close()
+
+async def test_retries(directory):
+    """Failing jobs back off and retry, then land in the dead-letter table"""
+    print("\n🔁 Retries and dead letters")
+    queue = fast_queue(os.path.join(directory, "retries.db"), max_attempts=3)
+    attempts = {"flaky": 0, "broken": 0}
+
+    async def flaky(payload):
+        attempts["flaky"] += 1
+        if attempts["flaky"] < 3:
+            raise RuntimeError("temporary failure")
+
+    async def broken(payload):
+        attempts["broken"] += 1
+        raise RuntimeError("permanent failure")
+
+    queue.register("flaky", flaky)
+    queue.register("broken", broken)
+    queue.start()
+    await queue.enqueue("flaky", {})
+    await queue.enqueue("broken", {})
+    await wait_for(lambda: queue.stats["completed"] == 1 and queue.stats["dead"] == 1)
+
+    assert attempts == {"flaky": 3, "broken": 3}
+    assert await queue.counts() == {"pending": 0, "dead": 1}
+    print(f"   stats: {queue.stats}")
+    await queue.close()
+
+async def test_enqueue_spike(directory):
+    """Enqueue latency under a burst of callbacks"""
+    print(f"\n📈 {SPIKE_JOBS:,} callbacks at once")
+    queue = fast_queue(os.path.join(directory, "spike.db"))
+    latencies = []
+
+    async def enqueue(i):
+        started = time.perf_counter()
+        await queue.enqueue("note", {"CheckoutRequestID": f"ws_CO_{i}"})
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(enqueue(i) for i in range(SPIKE_JOBS)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    assert await queue.counts() == {"pending": SPIKE_JOBS, "dead": 0}
+    print(
+        f"   {SPIKE_JOBS / elapsed:,.0f} jobs/s, p50 {statistics.median(latencies):.1f} ms"
+        f"   p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms"
+    )
+    await queue.close()
+
+async def test_payment_callback(directory):
+    """A callback that fails part way is retried and books exactly once"""
+    print("\n💳 M-Pesa callback job")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    phone = "+254700000055"
+    for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+        await bot.process_message(phone, message, "Job User")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+
+    # The first booking write fails
+    create_booking = db.create_booking
+    failures = []
+    async def failing_once(booking):
+        if not failures:
+            failures.append(booking)
+            raise RuntimeError("database unavailable")
+        await create_booking(booking)
+    db.create_booking = failing_once
+
+    queue = fast_queue(os.path.join(directory, "payments.db"))
+    queue.register("mpesa_callback", bot.handle_payment_callback)
+    queue.start()
+    await queue.enqueue("mpesa_callback", {"CheckoutRequestID": reference, "ResultCode": 0})
+    await wait_for(lambda: queue.stats["completed"] == 1)
+
+    assert queue.stats["retried"] == 1
+    assert len(db.bookings) == 1
+    assert (await db.get_user_session(phone))["payment_reference"] is None
+    assert len(bot.dispatcher.sent) == 2
+    await queue.close()
+
+async def test_callback_retry_after_booking(directory):
+    """A callback retried after its booking was stored keeps that single booking"""
+    print("\n🔁 Retry after the booking write")
+    db = SQLiteDatabase(os.path.join(directory, "bookings.db"))
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    bot.payment_service.initiate_stk_push = stk_push
+    phones = ["+254700000056", "+254700000057"]
+    for phone in phones:
+        for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+            await bot.process_message(phone, message, "Job User")
+    references = [(await db.get_user_session(phone))["payment_reference"] for phone in phones]
+
+    # Clearing the payment reference fails once, after the booking is written
+    update_user_session = db.update_user_session
+    failures = []
+    async def failing_once(phone_number, updates):
+        if "payment_reference" in updates and not failures:
+            failures.append(phone_number)
+            raise RuntimeError("database unavailable")
+        await update_user_session(phone_number, updates)
+    db.update_user_session = failing_once
+
+    queue = fast_queue(os.path.join(directory, "retries.db"))
+    queue.register("mpesa_callback", bot.handle_payment_callback)
+    queue.start()
+    for reference in references:
+        await queue.enqueue("mpesa_callback", {"CheckoutRequestID": reference, "ResultCode": 0})
+    await wait_for(lambda: queue.stats["completed"] == 2)
+    await queue.close()
+    await db.close()
+
+    assert queue.stats["retried"] == 1
+    with sqlite3.connect(db.path) as connection:
+        rows = connection.execute("SELECT booking_id, data FROM bookings").fetchall()
+    # Both payments landed in the same second, each still has its own booking
+    assert len(rows) == 2
+    assert sorted(json.loads(data)["payment_reference"] for _, data in rows) == sorted(references)
+    assert len(bot.dispatcher.sent) == 4
+
+async def main():
+    print("🤖 Testing GrooveHire job queue...")
+    logging.disable(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        await test_durability(directory)
+        await test_retries(directory)
+        await test_enqueue_spike(directory)
+        await test_payment_callback(directory)
+        await test_callback_retry_after_booking(directory)
+    logging.disable(logging.NOTSET)
+    print("\n✅ Job queue tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
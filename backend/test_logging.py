@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for the logging pipeline
+"""
+
+import asyncio
+import io
+import json
+import logging
+import threading
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from log_config import configure_logging, stop_logging
+
+class ThreadRecordingStream(io.StringIO):
+    """Remembers which threads wrote to it"""
+
+    def __init__(self):
+        super().__init__()
+        self.writers = set()
+
+    def write(self, text):
+        self.writers.add(threading.get_ident())
+        return super().write(text)
+
+def test_json_and_redaction():
+    """Records are JSON, bodies are redacted and writes happen off the calling thread"""
+    print("\n🧾 JSON records and redaction")
+    stream = ThreadRecordingStream()
+    configure_logging(level="INFO", json_format=True, sample_rates={}, redact=True, stream=stream)
+    logger = logging.getLogger("main")
+    logger.info("Received message from %s", "whatsapp:+254700000001", extra={"body": "my PIN is 1234"})
+    try:
+        raise ValueError("bad callback")
+    except ValueError:
+        logger.exception("Error processing M-Pesa callback")
+    stop_logging()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Received message from whatsapp:+254700000001"
+    assert first["level"] == "INFO" and first["logger"] == "main"
+    assert first["body"] == "[redacted 14 chars]"
+    assert "1234" not in stream.getvalue()
+    assert "ValueError: bad callback" in second["exception"]
+    assert threading.get_ident() not in stream.writers
+
+    stream = io.StringIO()
+    configure_logging(level="INFO", json_format=True, sample_rates={}, redact=False, stream=stream)
+    logger.info("Received message", extra={"body": "hello"})
+    stop_logging()
+    assert json.loads(stream.getvalue())["body"] == "hello"
+
+def test_lazy_formatting():
+    """Arguments of dropped records are never formatted"""
+    print("\n💤 Lazy formatting")
+    formatted = []
+
+    class Expensive:
+        def __str__(self):
+            formatted.append(self)
+            return "expensive"
+
+    stream = io.StringIO()
+    configure_logging(level="WARNING", sample_rates={}, stream=stream)
+    logging.getLogger("database").info("Updated session for %s", Expensive())
+    stop_logging()
+    assert formatted == [] and stream.getvalue() == ""
+
+def test_sampling():
+    """Sampled loggers skip most records below WARNING before creating them"""
+    print("\n🎲 Per-logger sampling")
+    created = []
+    factory = logging.getLogRecordFactory()
+
+    def counting_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        created.append(record.name)
+        return record
+
+    logging.setLogRecordFactory(counting_factory)
+    stream = io.StringIO()
+    configure_logging(level="INFO", sample_rates={"database": 0.1}, stream=stream)
+    for _ in range(2000):
+        logging.getLogger("database").info("Updated session for %s", "+254700000001")
+        logging.getLogger("jobs").info("Job done")
+    logging.getLogger("database").warning("Slow commit")
+    stop_logging()
+    logging.setLogRecordFactory(factory)
+
+    sampled = created.count("database") - 1
+    assert 100 < sampled < 300, sampled
+    assert created.count("jobs") == 2000
+    assert "Slow commit" in stream.getvalue()
+
+    # By default only the webhook's per-message records are sampled
+    os.environ.pop("LOG_SAMPLE_RATES", None)
+    configure_logging(level="INFO", stream=io.StringIO())
+    assert "isEnabledFor" in vars(logging.getLogger("main"))
+    assert "isEnabledFor" not in vars(logging.getLogger("database"))
+    stop_logging()
+
+    # Session writes, several per message, log at DEBUG only
+    stream = io.StringIO()
+    configure_logging(level="INFO", sample_rates={}, stream=stream)
+    bot = GrooveHireBot(Database())
+    for message in ["Hi", "1", "Westlands"]:
+        asyncio.run(bot.process_message("+254700000001", message, "Log User"))
+    stop_logging()
+    assert "session for" not in stream.getvalue()
+
+    # Reconfiguring without rates restores every record
+    configure_logging(level="INFO", sample_rates={}, stream=io.StringIO())
+    assert "isEnabledFor" not in vars(logging.getLogger("database"))
+    stop_logging()
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire logging...")
+    test_json_and_redaction()
+    test_lazy_formatting()
+    test_sampling()
+    logging.basicConfig(level=logging.INFO, force=True)
+    print("\n✅ Logging tests completed!")
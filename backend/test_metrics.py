@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics endpoint
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+import main
+import metrics
+
+def test_text_format():
+    """Counters, gauges and histograms render in the Prometheus text format"""
+    print("\n📝 Text format")
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("requests_total", "Requests", ["path"]))
+    registry.register(metrics.Gauge("depth", "Queue depth", function=lambda: 3))
+    latency = registry.register(metrics.Histogram("latency_seconds", "Latency", ["state"], buckets=[0.1, 1.0]))
+
+    requests.inc("/a")
+    requests.inc("/a")
+    requests.inc('/"b"')
+    for value in [0.05, 0.5, 5.0]:
+        latency.observe(value, "WELCOME")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{path="/a"} 2' in lines
+    assert 'requests_total{path="/\\"b\\""} 1' in lines
+    assert "depth 3" in lines
+    assert 'latency_seconds_bucket{state="WELCOME",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{state="WELCOME",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{state="WELCOME",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{state="WELCOME"} 5.55' in lines
+    assert 'latency_seconds_count{state="WELCOME"} 3' in lines
+
+def test_endpoint():
+    """Webhook traffic shows up per state at /metrics"""
+    print("\n📈 /metrics endpoint")
+    phone = "+254700000088"
+    with TestClient(main.app) as client:
+        for i, body in enumerate(["Hi", "1", "Westlands"]):
+            client.post("/webhook/whatsapp", data={
+                "From": f"whatsapp:{phone}", "Body": body, "MessageSid": f"SMmetrics{i}"
+            })
+        # The retry is answered from the dedup cache
+        client.post("/webhook/whatsapp", data={
+            "From": f"whatsapp:{phone}", "Body": "Westlands", "MessageSid": "SMmetrics2"
+        })
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    for state in ["WELCOME", "SERVICE_SELECTION", "LOCATION_REQUEST"]:
+        assert f'groovehire_message_duration_seconds_count{{state="{state}"}} 1' in lines
+    assert "groovehire_sessions 1" in lines
+    assert 'groovehire_queue_depth{queue="outbound"} 0' in lines
+    assert 'groovehire_cache_requests_total{cache="message_dedup",result="hit"} 1' in lines
+    assert 'groovehire_cache_requests_total{cache="message_dedup",result="miss"} 3' in lines
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire metrics...")
+    test_text_format()
+    test_endpoint()
+    print("\n✅ Metrics tests completed!")
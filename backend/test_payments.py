@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Test script for GrooveHire M-Pesa payments against a local fake Daraja server
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from models import SessionState
+from payment_scheduler import PaymentScheduler
+from services import PaymentService
+from sqlite_database import SQLiteDatabase
+from test_support import RecordingDispatcher, stk_push
+
+# Simulated Safaricom round trip
+DARAJA_LATENCY = 0.2
+
+class FakeDarajaHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the Daraja OAuth, STK Push and STK Push query endpoints"""
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.calls["oauth"] += 1
+        time.sleep(DARAJA_LATENCY)
+        self._send_json({"access_token": "fake-token", "expires_in": "3599"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.startswith("/mpesa/stkpushquery"):
+            self.server.calls["stk_query"] += 1
+            time.sleep(DARAJA_LATENCY)
+            result = self.server.payments.get(payload.get("CheckoutRequestID"))
+            if result is None:
+                # Daraja's answer while the customer has not responded to the prompt
+                self._send_json({
+                    "errorCode": "500.001.1001",
+                    "errorMessage": "The transaction is being processed"
+                }, status=500)
+            else:
+                self._send_json({"ResultCode": str(result[0]), "ResultDesc": result[1]})
+            return
+        self.server.calls["stk_push"] += 1
+        time.sleep(DARAJA_LATENCY)
+        self._send_json({
+            "CheckoutRequestID": f"ws_CO_{payload.get('AccountReference')}",
+            "ResponseCode": "0"
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeDarajaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+def start_fake_daraja():
+    """Start the fake Daraja server on a free local port"""
+    server = FakeDarajaServer(("127.0.0.1", 0), FakeDarajaHandler)
+    server.calls = {"oauth": 0, "stk_push": 0, "stk_query": 0}
+    # CheckoutRequestID -> (ResultCode, ResultDesc) for completed payments
+    server.payments = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["MPESA_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault("MPESA_CONSUMER_KEY", "key")
+    os.environ.setdefault("MPESA_CONSUMER_SECRET", "secret")
+    os.environ.setdefault("MPESA_SHORTCODE", "174379")
+    os.environ.setdefault("MPESA_PASSKEY", "passkey")
+    return server
+
+async def test_stk_push_throughput(server):
+    """Concurrent STK pushes should overlap instead of queueing on the event loop"""
+    print("\n💳 STK Push throughput")
+    payments = PaymentService()
+    pushes = 20
+
+    # Count event loop ticks to prove the loop stays responsive
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    results = await asyncio.gather(*[
+        payments.initiate_stk_push("254700000000", 500, f"BOOKING_{i}")
+        for i in range(pushes)
+    ])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+    await payments.close()
+
+    serial_time = pushes * DARAJA_LATENCY * 2
+    print(f"   {pushes} pushes in {elapsed:.2f}s ({pushes / elapsed:.1f}/s), serial would take {serial_time:.1f}s")
+    print(f"   event loop ticks during pushes: {ticks}")
+    print(f"   server calls: {server.calls}")
+
+    assert all(result["success"] for result in results)
+    assert elapsed < serial_time / 4
+    assert ticks >= int(elapsed / 0.01) // 2
+
+async def test_token_cache(server):
+    """Concurrent payments should share one OAuth call per token lifetime"""
+    print("\n🔑 OAuth token cache")
+    payments = PaymentService()
+    server.calls["oauth"] = 0
+
+    # First burst: every caller misses, but only one refresh goes out
+    await asyncio.gather(*[
+        payments.initiate_stk_push("254700000000", 500, f"TOKEN_{i}")
+        for i in range(10)
+    ])
+    assert server.calls["oauth"] == 1
+    assert payments.token_stats["refreshes"] == 1
+
+    # Second burst: served from cache
+    await asyncio.gather(*[
+        payments.initiate_stk_push("254700000000", 500, f"TOKEN_{i}")
+        for i in range(10)
+    ])
+    assert server.calls["oauth"] == 1
+    assert payments.token_stats["hits"] == 10
+
+    # Token inside the refresh margin is renewed early
+    payments._token_expires_at = time.monotonic() + payments.token_refresh_margin - 1
+    await payments.get_access_token()
+    assert server.calls["oauth"] == 2
+
+    print(f"   token stats: {payments.token_stats}")
+    await payments.close()
+
+async def test_stk_reconciliation(server):
+    """Pending payments are queried in batches once due and resolved by their result"""
+    print("\n🔎 STK status reconciliation")
+    payments = PaymentService()
+    resolved = []
+
+    async def on_paid(reference):
+        resolved.append((reference, "paid"))
+
+    async def on_failed(reference, reason):
+        resolved.append((reference, reason or "expired"))
+
+    scheduler = PaymentScheduler(
+        payments, on_paid, on_failed,
+        timeout=150, check_after=30, check_interval=30, batch_size=2
+    )
+    server.payments["ws_CO_paid"] = (0, "The service request is processed successfully.")
+    server.payments["ws_CO_cancelled"] = (1032, "Request cancelled by user")
+    for reference in ["ws_CO_paid", "ws_CO_cancelled", "ws_CO_pending", "ws_CO_called_back"]:
+        scheduler.add(reference, "+254700000000", now=0)
+    # A callback arrived for this one, it is never queried
+    scheduler.discard("ws_CO_called_back")
+    server.calls["stk_query"] = 0
+    await payments.get_access_token()
+
+    assert await scheduler.run_due(now=10) == 0
+    started = time.perf_counter()
+    assert await scheduler.run_due(now=30) == 3
+    elapsed = time.perf_counter() - started
+    assert sorted(resolved) == [("ws_CO_cancelled", "Request cancelled by user"), ("ws_CO_paid", "paid")]
+    assert len(scheduler) == 1 and server.calls["stk_query"] == 3
+    # Two batches of concurrent queries, not three round trips
+    assert elapsed < DARAJA_LATENCY * 3
+
+    # Still pending at the deadline, the prompt is expired
+    assert await scheduler.run_due(now=150) == 1
+    assert ("ws_CO_pending", "expired") in resolved and len(scheduler) == 0
+    print(f"   {scheduler.stats['queried']} queries, {elapsed:.2f}s for the first round, stats: {scheduler.stats}")
+    await payments.close()
+
+async def test_payment_expiry(server):
+    """An expired prompt returns the session to the payment step, a later query settles it"""
+    print("\n⏰ Payment expiry")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    phone = "+254700000011"
+    for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+        await bot.process_message(phone, message, "Expiry User")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+    assert reference in bot.payment_scheduler
+
+    await bot.payment_scheduler.run_due(now=time.monotonic() + bot.payment_scheduler.timeout)
+    session = await db.get_user_session(phone)
+    assert session["state"] == SessionState.PAYMENT and session["payment_reference"] is None
+    assert "prompt expired" in bot.dispatcher.sent[-1][1]
+
+    # Retry; this time the callback is lost but the status query finds the payment
+    await bot.process_message(phone, "PAY")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+    server.payments[reference] = (0, "The service request is processed successfully.")
+    await bot.payment_scheduler.run_due(now=time.monotonic() + bot.payment_scheduler.check_after)
+    assert len(db.bookings) == 1
+    assert (await db.get_user_session(phone))["payment_reference"] is None
+    assert "Payment Confirmed" in bot.dispatcher.sent[-2][1]
+    await bot.payment_service.close()
+
+async def test_settlement_retry(server):
+    """A paid payment whose settlement fails is settled on a later check"""
+    print("\n🔂 Settlement retry")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    phone = "+254700000013"
+    for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+        await bot.process_message(phone, message, "Retry User")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+    server.payments[reference] = (0, "The service request is processed successfully.")
+    sent_before = len(bot.dispatcher.sent)
+
+    create_booking = db.create_booking
+    failures = []
+    async def failing_once(booking):
+        if not failures:
+            failures.append(booking)
+            raise RuntimeError("database unavailable")
+        return await create_booking(booking)
+    db.create_booking = failing_once
+
+    scheduler = bot.payment_scheduler
+    now = time.monotonic() + scheduler.check_after
+    logging.disable(logging.ERROR)
+    await scheduler.run_due(now=now)
+    logging.disable(logging.WARNING)
+    assert not db.bookings and reference in scheduler
+    assert scheduler.stats["settle_retries"] == 1
+
+    # Past the payment's deadline makes no difference, it has been paid
+    await scheduler.run_due(now=now + scheduler.timeout)
+    assert len(db.bookings) == 1 and reference not in scheduler
+    assert len(bot.dispatcher.sent) - sent_before == 2
+    assert (await db.get_user_session(phone))["payment_reference"] is None
+    print(f"   stats: {scheduler.stats}")
+    await bot.payment_service.close()
+
+async def test_simulated_payments():
+    """Without credentials pushes get unique ids, are not polled, and complete by callback"""
+    print("\n🧪 Simulated payments")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    bot.payment_service.consumer_key = None
+    phones = ["+254700000014", "+254700000015"]
+    for phone in phones:
+        for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+            await bot.process_message(phone, message, "Simulated User")
+    references = [(await db.get_user_session(phone))["payment_reference"] for phone in phones]
+    assert len(set(references)) == 2, references
+    assert len(bot.payment_scheduler) == 0
+
+    for reference in references:
+        await bot.handle_payment_callback({"CheckoutRequestID": reference, "ResultCode": 0})
+    assert len(db.bookings) == 2
+    await bot.payment_service.close()
+
+async def test_settle_and_callback_race(directory):
+    """A status query settling a payment while its callback arrives books it once"""
+    print("\n🏁 Settle and callback together")
+    db = SQLiteDatabase(os.path.join(directory, "race.db"))
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    bot.payment_service.initiate_stk_push = stk_push
+    phone = "+254700000012"
+    for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+        await bot.process_message(phone, message, "Race User")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+    sent_before = len(bot.dispatcher.sent)
+
+    await asyncio.gather(
+        bot.settle_payment(reference),
+        bot.handle_payment_callback({"CheckoutRequestID": reference, "ResultCode": 0})
+    )
+
+    # One confirmation to the customer and one alert to the provider
+    assert len(bot.dispatcher.sent) - sent_before == 2, bot.dispatcher.sent[sent_before:]
+    assert (await db.get_user_session(phone))["payment_reference"] is None
+    await db.close()
+    with sqlite3.connect(db.path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM bookings").fetchone()[0] == 1
+    await bot.payment_service.close()
+
+async def main():
+    print("🤖 Testing GrooveHire payments...")
+    server = start_fake_daraja()
+    try:
+        await test_stk_push_throughput(server)
+        await test_token_cache(server)
+        logging.disable(logging.WARNING)
+        await test_stk_reconciliation(server)
+        await test_payment_expiry(server)
+        await test_settlement_retry(server)
+        await test_simulated_payments()
+        with tempfile.TemporaryDirectory() as directory:
+            await test_settle_and_callback_race(directory)
+        logging.disable(logging.NOTSET)
+    finally:
+        server.shutdown()
+    print("\n✅ Payment tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
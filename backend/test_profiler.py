@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the sampling profiler and event loop lag monitor
+"""
+
+import asyncio
+import logging
+import threading
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+import main
+from bot_logic import GrooveHireBot
+from database import Database
+from profiler import LoopLagMonitor, SamplingProfiler
+
+def blocking_call(seconds):
+    """Stands in for a synchronous HTTP call made from the event loop"""
+    time.sleep(seconds)
+
+async def test_profile_handlers():
+    """Samples of the loop thread show the bot handlers and service calls"""
+    print("\n🔥 Profiling conversations")
+    bot = GrooveHireBot(Database())
+    messages = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning"]
+
+    async def conversations():
+        deadline = time.monotonic() + 0.5
+        i = 0
+        while time.monotonic() < deadline:
+            for message in messages:
+                await bot.process_message(f"+2547{i:08d}", message, "Profile User")
+            i += 1
+            await asyncio.sleep(0)
+
+    profiler = SamplingProfiler(threading.get_ident(), interval=0.002)
+    profiler.start()
+    await conversations()
+    profiler.stop()
+
+    collapsed = profiler.collapsed()
+    lines = collapsed.splitlines()
+    assert profiler.samples > 50, profiler.samples
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == profiler.samples
+    assert "bot_logic:process_message" in collapsed
+    assert "services:find_providers" in collapsed
+    print(f"   {profiler.samples} samples ({profiler.mode}), {len(lines)} distinct stacks")
+
+async def test_loop_lag():
+    """A blocking call shows up as loop lag, with its stack"""
+    print("\n🐢 Event loop lag")
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    blocking_call(0.3)
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+
+    snapshot = monitor.snapshot()
+    assert snapshot["max_ms"] >= 250, snapshot
+    assert monitor.stats["stalls"] == 1
+    stall = snapshot["stalls"][0]
+    assert stall["stack"].endswith("test_profiler:blocking_call"), stall["stack"]
+    print(f"   max lag {snapshot['max_ms']:.0f} ms, stall in {stall['stack'].rsplit(';', 1)[-1]}")
+
+def test_profile_endpoint():
+    """The profile endpoint needs the debug token and returns collapsed stacks"""
+    print("\n🔒 /debug/profile access")
+    with TestClient(main.app) as client:
+        main.DEBUG_TOKEN = None
+        assert client.get("/debug/profile?seconds=0.1").status_code == 404
+
+        main.DEBUG_TOKEN = "debug-secret"
+        headers = {"X-Debug-Token": "debug-secret"}
+        assert client.get("/debug/profile?seconds=0.1").status_code == 403
+
+        response = client.get("/debug/profile?seconds=0.2", headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["samples"] > 0
+        assert "p99_ms" in body["loop_lag"]
+        assert body["collapsed"].strip()
+
+        response = client.get("/debug/profile?seconds=0.2&format=collapsed", headers=headers)
+        assert response.status_code == 200
+        for line in response.text.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert stack and int(count) > 0
+
+        assert "event_loop" in client.get("/health").json()
+
+async def main_async():
+    logging.disable(logging.WARNING)
+    await test_profile_handlers()
+    await test_loop_lag()
+    logging.disable(logging.NOTSET)
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire profiler...")
+    asyncio.run(main_async())
+    test_profile_endpoint()
+    print("\n✅ Profiler tests completed!")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded session store
+"""
+
+import asyncio
+import logging
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from session_store import SessionStore
+
+def session(phone_number, idle=0.0, payment_reference=None):
+    return {
+        "phone_number": phone_number,
+        "last_interaction": time.time() - idle,
+        "payment_reference": payment_reference
+    }
+
+def test_lru_and_ttl():
+    """The least recently used session goes when full, idle ones expire"""
+    print("\n🧹 LRU eviction and TTL expiry")
+    evicted = []
+    store = SessionStore(max_sessions=3, ttl=60, on_evict=lambda phone, _: evicted.append(phone))
+    for phone in ("a", "b", "c"):
+        store[phone] = session(phone)
+    assert store.get("a") is not None
+    store["d"] = session("d")
+    assert evicted == ["b"] and "b" not in store
+    assert store.stats == {"expired": 0, "evicted": 1}
+
+    store["e"] = session("e", idle=120)
+    assert store.get("e") is None
+    assert store.stats["expired"] == 1
+
+def test_pinned_sessions():
+    """Pinned sessions are passed over by eviction but still expire"""
+    print("\n📌 Pinned sessions")
+    store = SessionStore(
+        max_sessions=2, ttl=60,
+        is_pinned=lambda s: s.get("payment_reference") is not None
+    )
+    store["a"] = session("a", payment_reference="ws_CO_a")
+    store["b"] = session("b")
+    store["c"] = session("c")
+    assert "a" in store and "b" not in store and "c" in store
+
+    # With nothing left to evict the store goes over its cap rather than drop a payment
+    store["c"] = session("c", payment_reference="ws_CO_c")
+    store["d"] = session("d", payment_reference="ws_CO_d")
+    assert len(store) == 3 and store.stats["evicted"] == 1
+    store["e"] = session("e")
+    store["f"] = session("f")
+    assert "e" not in store and "f" in store and len(store) == 4
+
+    store["g"] = session("g", idle=120, payment_reference="ws_CO_g")
+    assert store.get("g") is None
+
+async def test_payment_survives_pressure():
+    """A session waiting for its M-Pesa callback is still found after heavy churn"""
+    print("\n💳 Pending payment under memory pressure")
+    db = Database(max_sessions=100)
+    await db.create_user_session(session("+254700000001", payment_reference="ws_CO_pending"))
+    for i in range(1_000):
+        await db.create_user_session(session(f"+2547{i + 10:08d}"))
+    assert len(db.user_sessions) == 100
+    found = await db.find_user_by_payment_reference("ws_CO_pending")
+    assert found is not None and found["phone_number"] == "+254700000001"
+    print(f"   {db.session_stats()}")
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire session store...")
+    logging.disable(logging.INFO)
+    test_lru_and_ttl()
+    test_pinned_sessions()
+    asyncio.run(test_payment_survives_pressure())
+    logging.disable(logging.NOTSET)
+    print("\n✅ Session store tests completed!")
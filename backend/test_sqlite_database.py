@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the SQLite storage backend
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from sqlite_database import SCHEMA_VERSION, SQLiteDatabase
+
+async def test_failed_write_in_batch(directory):
+    """A write that fails only fails its own caller, the rest of its batch commits"""
+    print("\n🧱 Failing write inside a batch")
+    db = SQLiteDatabase(os.path.join(directory, "batch.db"), commit_interval=0.01)
+    bookings = [{"booking_id": f"GH{i}", "service": "plumbing"} for i in range(5)]
+    results = await asyncio.gather(
+        *(db.create_booking(booking) for booking in bookings[:3]),
+        # data is NOT NULL
+        db._write("INSERT INTO bookings (booking_id, data) VALUES (?, ?)", ("GHbad", None)),
+        *(db.create_booking(booking) for booking in bookings[3:]),
+        return_exceptions=True
+    )
+    assert results[:3] == [True] * 3 and results[4:] == [True] * 2, results
+    assert isinstance(results[3], sqlite3.IntegrityError), results[3]
+    await db.close()
+
+    with sqlite3.connect(db.path) as connection:
+        stored = sorted(row[0] for row in connection.execute("SELECT booking_id FROM bookings"))
+    assert stored == [booking["booking_id"] for booking in bookings]
+
+async def test_provider_migration(directory):
+    """Providers seeded by an older version gain coordinates, keeping stored edits"""
+    print("\n🗄️  Provider schema migration")
+    path = os.path.join(directory, "old.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE providers (id TEXT PRIMARY KEY, service TEXT NOT NULL, data TEXT NOT NULL)")
+        for service, providers in Database()._initialize_sample_providers().items():
+            for provider in providers:
+                old = {key: value for key, value in provider.items() if key not in ("lat", "lon")}
+                old["distance"] = "2.1 km"
+                if old["id"] == "p1":
+                    old["rating"] = 5.0
+                connection.execute("INSERT INTO providers VALUES (?, ?, ?)", (old["id"], service, json.dumps(old)))
+
+    db = SQLiteDatabase(path)
+    mike = await db.get_provider("p1")
+    assert mike["rating"] == 5.0
+    assert mike["lat"] == -1.2702 and "distance" not in mike
+    # The spatial index now has every provider
+    nearest = await db.get_nearest_providers("plumbing", -1.2702, 36.804, 3, 15)
+    assert [provider["id"] for _, provider in nearest][0] == "p1"
+    await db.close()
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+    # Opening it again leaves the migrated catalog alone
+    db = SQLiteDatabase(path)
+    await db.update_provider("p1", {"rating": 4.5})
+    await db.close()
+    db = SQLiteDatabase(path)
+    assert (await db.get_provider("p1"))["rating"] == 4.5
+    await db.close()
+
+async def main():
+    print("🤖 Testing GrooveHire SQLite backend...")
+    logging.disable(logging.ERROR)
+    with tempfile.TemporaryDirectory() as directory:
+        await test_failed_write_in_batch(directory)
+        await test_provider_migration(directory)
+    logging.disable(logging.NOTSET)
+    print("\n✅ SQLite backend tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+"""
+Fixtures shared by the test scripts
+"""
+
+import asyncio
+import time
+
+class RecordingDispatcher:
+    """Collects outbound messages instead of calling Twilio"""
+
+    def __init__(self):
+        self.sent = []
+
+    def enqueue(self, phone_number, message, sender=None):
+        self.sent.append((phone_number, message))
+        return True
+
+async def stk_push(phone_number, amount, reference):
+    """Accepted STK push, without calling M-Pesa"""
+    return {"success": True, "checkout_request_id": f"ws_CO_{phone_number}_{reference}"}
+
+def slow_stk_push(latency):
+    """STK push stub that takes as long as an M-Pesa round trip"""
+    async def initiate_stk_push(phone_number, amount, reference):
+        await asyncio.sleep(latency)
+        return await stk_push(phone_number, amount, reference)
+    return initiate_stk_push
+
+async def wait_for(condition, timeout=5.0):
+    """Poll until condition() holds, without blocking the event loop"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def wait_until(condition, timeout=5.0):
+    """Poll until condition() holds, for code running outside the event loop"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script for request tracing
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACtest")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "test")
+os.environ.setdefault("JOBS_PATH", os.path.join(tempfile.mkdtemp(), "jobs.db"))
+
+from fastapi.testclient import TestClient
+import main
+import tracing
+from bot_logic import GrooveHireBot
+from database import Database
+from tracing import Tracer
+from test_support import slow_stk_push
+
+@tracing.traced("stage.lookup")
+async def lookup(delay):
+    await asyncio.sleep(delay)
+    return delay
+
+@tracing.traced("stage.broken")
+async def broken():
+    raise RuntimeError("lookup failed")
+
+async def test_spans():
+    """Spans nest across awaits and concurrent tasks, and record errors"""
+    print("\n🧵 Span propagation")
+    tracer = Tracer(sample_rate=1.0)
+    with tracer.trace("request", source="test"):
+        with tracing.span("stage.parallel"):
+            await asyncio.gather(lookup(0.01), lookup(0.02))
+        try:
+            await broken()
+        except RuntimeError:
+            pass
+
+    # Outside a trace, spans and traced calls do nothing
+    assert await lookup(0) == 0
+    with tracing.span("orphan") as orphan:
+        assert orphan is None
+
+    record = tracer.recent()[0]
+    spans = {span["name"]: span for span in record["spans"]}
+    by_id = {span["id"]: span for span in record["spans"]}
+    assert [span["name"] for span in record["spans"]].count("stage.lookup") == 2
+    for span in record["spans"]:
+        if span["name"] == "stage.lookup":
+            assert by_id[span["parent_id"]]["name"] == "stage.parallel"
+            assert span["duration_ms"] >= 10
+    assert spans["stage.broken"]["error"] == "RuntimeError"
+    assert spans["request"]["attributes"] == {"source": "test"}
+    assert record["duration_ms"] >= spans["stage.parallel"]["duration_ms"] >= 20
+
+async def test_sampling(directory):
+    """Only sampled requests are kept, in a bounded buffer and the export file"""
+    print("\n🎲 Sampling, ring buffer and export")
+    unsampled = Tracer(sample_rate=0)
+    for _ in range(100):
+        with unsampled.trace("request") as root:
+            assert root is None
+            await lookup(0)
+    assert unsampled.stats == {"started": 100, "sampled": 0, "exported": 0, "export_errors": 0}
+
+    path = os.path.join(directory, "traces.jsonl")
+    tracer = Tracer(sample_rate=0.5, buffer_size=10, export_path=path)
+    for _ in range(400):
+        with tracer.trace("request"):
+            await lookup(0)
+    tracer.close()
+
+    sampled = tracer.stats["sampled"]
+    assert 120 < sampled < 280, sampled
+    assert len(tracer.traces) == 10
+    with open(path) as f:
+        exported = [json.loads(line) for line in f]
+    assert len(exported) == sampled == tracer.stats["exported"]
+    assert [span["name"] for span in exported[0]["spans"]] == ["request", "stage.lookup"]
+
+async def test_conversation_stages():
+    """A conversation is broken down into bot, matcher, database and payment stages"""
+    print("\n🗺️  Conversation stages")
+    tracer = Tracer(sample_rate=1.0)
+    bot = GrooveHireBot(Database())
+
+    bot.payment_service.initiate_stk_push = tracing.traced("mpesa.stk_push")(slow_stk_push(0.01))
+
+    for message in ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "PAY"]:
+        with tracer.trace("webhook.whatsapp"):
+            await bot.process_message("+254700000099", message, "Trace User")
+
+    records = list(reversed(tracer.recent()))
+    states = [record["spans"][1]["attributes"]["state"] for record in records]
+    assert states == ["WELCOME", "SERVICE_SELECTION", "LOCATION_REQUEST",
+                      "PROVIDER_SELECTION", "BOOKING_DETAILS", "PAYMENT"]
+    names = {span["name"] for record in records for span in record["spans"]}
+    assert {"bot.process_message", "matcher.find_providers", "db.get_user_session",
+            "db.update_user_session", "mpesa.stk_push"} <= names
+
+    summary = tracer.summary()
+    assert summary["mpesa.stk_push"]["count"] == 1
+    assert summary["mpesa.stk_push"]["p99_ms"] >= 10
+    for name, stage in sorted(summary.items(), key=lambda item: -item[1]["p99_ms"]):
+        print(f"   {name:<28} n={stage['count']:<3} p99 {stage['p99_ms']:7.3f} ms")
+
+def test_debug_endpoint():
+    """Traces are only served with the debug token"""
+    print("\n🔒 /debug/traces access")
+    main.tracer.sample_rate = 1.0
+    with TestClient(main.app) as client:
+        main.DEBUG_TOKEN = None
+        assert client.get("/debug/traces").status_code == 404
+
+        main.DEBUG_TOKEN = "debug-secret"
+        client.post("/webhook/whatsapp", data={
+            "From": "whatsapp:+254700000098", "Body": "Hi", "MessageSid": "SMtrace0"
+        })
+        assert client.get("/debug/traces").status_code == 403
+        assert client.get("/debug/traces", headers={"X-Debug-Token": "wrong"}).status_code == 403
+        response = client.get("/debug/traces", headers={"X-Debug-Token": "debug-secret"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["traces"][0]["spans"][0]["name"] == "webhook.whatsapp"
+    assert "bot.process_message" in body["stages"]
+
+async def main_async():
+    logging.disable(logging.ERROR)
+    await test_spans()
+    with tempfile.TemporaryDirectory() as directory:
+        await test_sampling(directory)
+    await test_conversation_stages()
+    logging.disable(logging.NOTSET)
+
+if __name__ == "__main__":
+    print("🤖 Testing GrooveHire tracing...")
+    asyncio.run(main_async())
+    test_debug_endpoint()
+    print("\n✅ Tracing tests completed!")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for per-message session write coalescing
+"""
+
+import asyncio
+import logging
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot_logic import GrooveHireBot
+from database import Database
+from models import SessionState
+from sqlite_database import SQLiteDatabase
+from test_support import RecordingDispatcher, stk_push
+
+CONVERSATION = ["Hi", "1", "Westlands", "1", "Fix a leaking tap tomorrow morning", "back",
+                "Fix a leaking tap on Friday", "PAY"]
+
+def count_writes(db):
+    """Wrap update_user_session to record each store write"""
+    writes = []
+    update_user_session = db.update_user_session
+
+    async def counting(phone_number, updates):
+        writes.append(dict(updates))
+        await update_user_session(phone_number, updates)
+    db.update_user_session = counting
+    return writes
+
+async def test_one_write_per_message(db, label):
+    """Each message that changes the session costs a single store write"""
+    print(f"\n✍️  Writes per message, {label}")
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    bot.payment_service.initiate_stk_push = stk_push
+    writes = count_writes(db)
+    phone = "+254700000066"
+
+    for message in CONVERSATION:
+        before = len(writes)
+        await bot.process_message(phone, message, "Unit User")
+        assert len(writes) - before == 1, (message, writes[before:])
+
+    # The location step used to make two writes, it is now one with both changes
+    location_write = writes[2]
+    assert location_write["location"] == "Westlands"
+    assert location_write["state"] == SessionState.PROVIDER_SELECTION
+    assert len(location_write["available_provider_ids"]) == 3
+
+    session = await db.get_user_session(phone)
+    assert session["state"] == SessionState.COMPLETED
+    assert session["payment_reference"].startswith("ws_CO_")
+    print(f"   {bot.session_writes['collected']} updates in {bot.session_writes['flushed']} writes")
+    assert bot.session_writes == {"collected": len(CONVERSATION) + 1, "flushed": len(CONVERSATION)}
+    await db.close()
+
+async def test_failed_message_writes_nothing():
+    """Updates made before a handler fails are discarded"""
+    print("\n🧯 Partial updates on failure")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    phone = "+254700000067"
+    for message in ["Hi", "1"]:
+        await bot.process_message(phone, message, "Unit User")
+
+    async def broken_matcher(*args, **kwargs):
+        raise RuntimeError("provider index unavailable")
+    bot.service_matcher.find_providers = broken_matcher
+
+    response = await bot.process_message(phone, "Westlands", "Unit User")
+    assert response == bot.templates["error"].render()
+    session = await db.get_user_session(phone)
+    assert session["state"] == SessionState.LOCATION_REQUEST
+    assert session["location"] is None
+
+async def test_no_partial_view():
+    """Readers never see a session half way through a message"""
+    print("\n👀 Concurrent readers")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    phone = "+254700000068"
+    for message in ["Hi", "1"]:
+        await bot.process_message(phone, message, "Unit User")
+
+    find_providers = bot.service_matcher.find_providers
+    seen = []
+    async def slow_matcher(*args, **kwargs):
+        # The handler already set the location and state; a reader must not see them yet
+        session = await db.get_user_session(phone)
+        seen.append((session["state"], session["location"]))
+        await asyncio.sleep(0.01)
+        return await find_providers(*args, **kwargs)
+    bot.service_matcher.find_providers = slow_matcher
+
+    await bot.process_message(phone, "Westlands", "Unit User")
+    assert seen == [(SessionState.LOCATION_REQUEST, None)]
+    session = await db.get_user_session(phone)
+    assert session["state"] == SessionState.PROVIDER_SELECTION
+    assert session["location"] == "Westlands"
+
+async def test_payment_polled_after_write():
+    """A payment is only handed to the status poller once its reference is stored"""
+    print("\n⏳ Polling after the write")
+    db = Database()
+    bot = GrooveHireBot(db, RecordingDispatcher())
+    bot.payment_service.initiate_stk_push = stk_push
+    phone = "+254700000069"
+    for message in CONVERSATION[:5]:
+        await bot.process_message(phone, message, "Unit User")
+
+    events = []
+    update_user_session = db.update_user_session
+    async def recording_update(phone_number, updates):
+        await update_user_session(phone_number, updates)
+        events.append(("write", updates.get("payment_reference")))
+    db.update_user_session = recording_update
+    add = bot.payment_scheduler.add
+    def recording_add(reference, phone_number, *args, **kwargs):
+        events.append(("poll", reference))
+        add(reference, phone_number, *args, **kwargs)
+    bot.payment_scheduler.add = recording_add
+
+    await bot.process_message(phone, "PAY", "Unit User")
+    reference = (await db.get_user_session(phone))["payment_reference"]
+    assert events == [("write", reference), ("poll", reference)], events
+
+    # Nothing is polled when the write fails
+    bot.payment_scheduler.discard(reference)
+    await bot.process_message(phone, "back", "Unit User")
+    await bot.process_message(phone, "Fix a leaking tap on Friday", "Unit User")
+    async def failing_update(phone_number, updates):
+        raise RuntimeError("database unavailable")
+    db.update_user_session = failing_update
+    await bot.process_message(phone, "PAY", "Unit User")
+    assert len(bot.payment_scheduler) == 0
+
+async def main():
+    print("🤖 Testing GrooveHire session write coalescing...")
+    logging.disable(logging.ERROR)
+    await test_one_write_per_message(Database(), "memory store")
+    with tempfile.TemporaryDirectory() as directory:
+        await test_one_write_per_message(SQLiteDatabase(os.path.join(directory, "unit.db")), "SQLite store")
+    await test_failed_message_writes_nothing()
+    await test_no_partial_view()
+    await test_payment_polled_after_write()
+    logging.disable(logging.NOTSET)
+    print("\n✅ Session write coalescing tests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
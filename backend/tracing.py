@@ -0,0 +1,207 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    """Spans recorded for one sampled request"""
+
+    __slots__ = ("trace_id", "started_at", "spans", "tracer")
+
+    def __init__(self, trace_id: str, tracer: "Tracer"):
+        self.trace_id = trace_id
+        self.started_at = time.time()
+        self.spans: List["Span"] = []
+        self.tracer = tracer
+
+class Span:
+    """Timed stage of a trace"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "started", "duration", "error")
+
+    def __init__(self, trace: Trace, span_id: int, parent_id: Optional[int], name: str, attributes: Dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+# Innermost open span of the running task, None outside a sampled trace.
+# asyncio copies the context into tasks and to_thread calls, so spans opened
+# there nest under the span that started them.
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+@contextmanager
+def _open_span(trace: Trace, parent: Optional[Span], name: str, attributes: Dict) -> Iterator[Span]:
+    span = Span(trace, next(_span_ids), parent.span_id if parent else None, name, attributes)
+    trace.spans.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.duration = time.perf_counter() - span.started
+        _current_span.reset(token)
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a stage of the current trace, doing nothing outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _open_span(parent.trace, parent, name, attributes) as child:
+        yield child
+
+def traced(name: str) -> Callable:
+    """Record each call of a coroutine function as a span of the current trace
+
+    Outside a sampled trace the wrapper hands back the undecorated coroutine,
+    so untraced calls cost one context variable lookup.
+    """
+    def decorator(func: Callable) -> Callable:
+        async def traced_call(args, kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            return traced_call(args, kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the current span, if there is one"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+class Tracer:
+    """Samples requests and keeps their finished traces
+
+    Finished traces go to an in-process ring buffer for the debug endpoint and,
+    when an export path is set, are appended to it as JSON lines.
+    """
+
+    def __init__(self, sample_rate: float = None, buffer_size: int = None, export_path: str = None):
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+        self.buffer_size = buffer_size or int(os.getenv("TRACE_BUFFER_SIZE", 500))
+        self.export_path = export_path or os.getenv("TRACE_EXPORT_PATH") or None
+
+        self.traces: deque = deque(maxlen=self.buffer_size)
+        self._export_file = None
+        self._trace_ids = itertools.count(1)
+        self._prefix = f"{os.getpid():x}-{random.getrandbits(32):08x}"
+        self.stats = {"started": 0, "sampled": 0, "exported": 0, "export_errors": 0}
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        """Start a trace for a request, or a span when one is already open"""
+        parent = _current_span.get()
+        if parent is not None:
+            with _open_span(parent.trace, parent, name, attributes) as child:
+                yield child
+            return
+
+        self.stats["started"] += 1
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield None
+            return
+
+        self.stats["sampled"] += 1
+        trace = Trace(f"{self._prefix}-{next(self._trace_ids):x}", self)
+        try:
+            with _open_span(trace, None, name, attributes) as root:
+                yield root
+        finally:
+            self._finish(trace)
+
+    def _finish(self, trace: Trace) -> None:
+        record = self.to_dict(trace)
+        self.traces.append(record)
+        if self.export_path:
+            self._export(record)
+
+    def _export(self, record: Dict) -> None:
+        try:
+            if self._export_file is None:
+                self._export_file = open(self.export_path, "a", buffering=1)
+            self._export_file.write(json.dumps(record) + "\n")
+            self.stats["exported"] += 1
+        except OSError as e:
+            self.stats["export_errors"] += 1
+            logger.error("Error exporting trace to %s: %s", self.export_path, e)
+
+    @staticmethod
+    def to_dict(trace: Trace) -> Dict:
+        """Plain form of a trace, with span offsets relative to the root"""
+        root_started = trace.spans[0].started
+        return {
+            "trace_id": trace.trace_id,
+            "started_at": trace.started_at,
+            "duration_ms": round((trace.spans[0].duration or 0) * 1000, 3),
+            "spans": [
+                {
+                    "id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "name": span.name,
+                    "offset_ms": round((span.started - root_started) * 1000, 3),
+                    # Spans still open when the root finished, such as detached tasks
+                    "duration_ms": round(span.duration * 1000, 3) if span.duration is not None else None,
+                    "attributes": span.attributes,
+                    "error": span.error
+                }
+                for span in trace.spans
+            ]
+        }
+
+    def recent(self, limit: int = 50, min_duration_ms: float = 0) -> List[Dict]:
+        """Most recent traces first, optionally only the slow ones"""
+        matching = [record for record in reversed(self.traces) if record["duration_ms"] >= min_duration_ms]
+        return matching[:limit]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Latency per span name across the buffered traces"""
+        durations: Dict[str, List[float]] = {}
+        for record in self.traces:
+            for span in record["spans"]:
+                if span["duration_ms"] is not None:
+                    durations.setdefault(span["name"], []).append(span["duration_ms"])
+
+        summary = {}
+        for name, values in durations.items():
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "p50_ms": statistics.median(values),
+                "p99_ms": values[min(len(values) - 1, int(len(values) * 0.99))],
+                "max_ms": values[-1],
+                "total_ms": round(sum(values), 3)
+            }
+        return summary
+
+    def close(self) -> None:
+        """Close the export file"""
+        if self._export_file is not None:
+            self._export_file.close()
+            self._export_file = None
+
+tracer = Tracer()
@@ -0,0 +1,44 @@
+from typing import Any, Callable, Dict, List, Optional
+from contextvars import ContextVar
+
+class SessionUnitOfWork:
+    """Session updates made while handling one message, written together at the end
+
+    Updates to the same session are merged, later values winning, so each
+    session touched gets a single store write. Nothing is written if the
+    message fails part way. Actions that depend on the updates being stored
+    are queued with after_flush and run once they are.
+    """
+
+    def __init__(self):
+        # phone number -> merged updates
+        self.updates: Dict[str, Dict[str, Any]] = {}
+        self.collected = 0
+        self._after_flush: List[Callable[[], None]] = []
+
+    def add(self, phone_number: str, updates: Dict[str, Any]) -> None:
+        pending = self.updates.get(phone_number)
+        if pending is None:
+            self.updates[phone_number] = dict(updates)
+        else:
+            pending.update(updates)
+        self.collected += 1
+
+    def after_flush(self, action: Callable[[], None]) -> None:
+        """Run an action once the updates have been written"""
+        self._after_flush.append(action)
+
+    async def flush(self, database) -> int:
+        """Write the merged updates, returning how many writes were made"""
+        writes = 0
+        while self.updates:
+            phone_number, updates = self.updates.popitem()
+            await database.update_user_session(phone_number, updates)
+            writes += 1
+        actions, self._after_flush = self._after_flush, []
+        for action in actions:
+            action()
+        return writes
+
+# Unit of work of the message being handled by the running task, if any
+current_unit_of_work: ContextVar[Optional[SessionUnitOfWork]] = ContextVar("current_unit_of_work", default=None)